@@ -1,10 +1,15 @@
-from Mood2FoodRecSys.RecSysFunctions import get_user_profile_and_recent_tracks, compute_time_weights, analyze_mood_with_groq, compute_mood_distribution, recommend_food_based_on_mood, fetch_data_from_db, fetch_preferences_from_db
-from fastapi import APIRouter, HTTPException, Depends
+from Mood2FoodRecSys.RecSysFunctions import get_user_profile_and_recent_tracks, compute_time_weights, analyze_mood_with_groq, compute_mood_distribution, recommend_food_based_on_mood, fetch_data_from_db, fetch_preferences_from_db, fetch_popular_surplus, refresh_mood_profile
+from Mood2FoodRecSys import mood_profile
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.auth import current_user
 import asyncio
+import json
 import logging
 import random
+import time
 
 
 router = APIRouter(
@@ -16,52 +21,130 @@ router = APIRouter(
 
 class RecommendationRequest(BaseModel):
     restaurant_id: str
+    # "llm" (Groq) or "local" (embedding ranking, no LLM call for the food step)
+    engine: str = "llm"
 
 
-@router.post("/get_recommendations")
-async def get_recommendations(
-    request: RecommendationRequest,
-    user: dict = Depends(current_user)
-):
+class StageTimer:
+    """Records how long each pipeline stage took, for the Server-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    async def run(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            self.stages[name] = (time.perf_counter() - start) * 1000
+
+    def header(self):
+        stages = {**self.stages, "total": (time.perf_counter() - self.started) * 1000}
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in stages.items())
+
+
+async def _discard(*tasks):
+    # stop work nobody will read and reap it, so errors aren't left unretrieved
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _validate(request: RecommendationRequest):
+    if not request.restaurant_id:
+        raise HTTPException(status_code=400, detail="restaurant_id is required")
+    if request.engine not in ("llm", "local"):
+        raise HTTPException(status_code=400, detail="engine must be 'llm' or 'local'")
+
+
+async def _current_moods(user_id, timer: StageTimer):
+    # a fresh precomputed profile replaces listening history + mood LLM
+    mood_distribution = await timer.run("profile", mood_profile.current, user_id)
+    if mood_distribution:
+        mood_profile.refresh_in_background(user_id, refresh_mood_profile)
+        return mood_distribution
+
+    recent_tracks = await timer.run("history", get_user_profile_and_recent_tracks, user_id=user_id)
+    if not recent_tracks:
+        raise HTTPException(status_code=404, detail="No recent tracks found for user")
+
+    weights = compute_time_weights(recent_tracks)
+    mood_analysis = await timer.run("mood", analyze_mood_with_groq, recent_tracks)
+    mood_profile.fold_in_background(user_id, recent_tracks, mood_analysis)
+    return compute_mood_distribution(mood_analysis, weights)
+
+
+async def _recommendation_stages(request: RecommendationRequest, user_id, timer: StageTimer, fallback: bool = False):
+    """
+    Runs the pipeline and yields each result as soon as it exists:
+    ("fallback", meals) when asked for, ("moods", distribution), then
+    ("recommendations", meals).
+    """
+    restaurant_id = request.restaurant_id
+
+    # Stage graph: menu and preference reads depend on nothing, so they
+    # start right away and overlap listening history -> mood analysis.
+    menu_task = asyncio.create_task(timer.run("menu", fetch_data_from_db, restaurant_id=restaurant_id))
+    prefs_task = asyncio.create_task(timer.run("preferences", fetch_preferences_from_db, user_id=user_id))
+    mood_task = asyncio.create_task(_current_moods(user_id, timer))
+    tasks = [menu_task, prefs_task, mood_task]
+    if fallback:
+        tasks.append(asyncio.create_task(timer.run("fallback", fetch_popular_surplus, restaurant_id)))
+
     try:
-        user_id = user["id"]
-        restaurant_id = request.restaurant_id
-        
-        if not restaurant_id:
-            raise HTTPException(status_code=400, detail="restaurant_id is required")
+        if fallback:
+            yield "fallback", await tasks[-1]
 
-        recent_tracks = await get_user_profile_and_recent_tracks(user_id=user_id)
-        if not recent_tracks:
-            raise HTTPException(status_code=404, detail="No recent tracks found for user")
+        mood_distribution = await mood_task
+        yield "moods", mood_distribution
 
-        weights = compute_time_weights(recent_tracks)
-        
-        mood_analysis, relevant_food_items, preferences = await asyncio.gather(
-            analyze_mood_with_groq(recent_tracks),
-            fetch_data_from_db(restaurant_id=restaurant_id),
-            fetch_preferences_from_db(user_id=user_id)
-        )
-        
+        relevant_food_items, preferences = await asyncio.gather(menu_task, prefs_task)
         # Return empty array instead of 404 if no food items
         if not relevant_food_items:
-            return {"recommended_foods": []}
-            
-        mood_distribution = compute_mood_distribution(mood_analysis, weights)
-        food_recommendations = await recommend_food_based_on_mood(mood_distribution, preferences, relevant_food_items)
+            yield "recommendations", []
+            return
+
+        food_recommendations = await timer.run(
+            "recommend", recommend_food_based_on_mood,
+            mood_distribution, preferences, relevant_food_items,
+            restaurant_id=restaurant_id, engine=request.engine
+        )
+    finally:
+        await _discard(*tasks)
 
-        suggested = food_recommendations.get("Suggested_food", [])
+    suggested = food_recommendations.get("Suggested_food", [])
 
-        # extract just ids
-        recommended_ids = [item["id"] for item in suggested]
+    # extract just ids
+    recommended_ids = [item["id"] for item in suggested]
 
-        # now match back
-        recommended_full_objects = [item for item in relevant_food_items if str(item["id"]) in recommended_ids]
-        
-        # Randomly limit recommendations to either 3 or 4 items
-        limit = random.choice([3, 4])
-        recommended_full_objects = recommended_full_objects[:limit]
-        
-        return {"recommended_foods": recommended_full_objects}
+    # now match back
+    recommended_full_objects = [item for item in relevant_food_items if str(item["id"]) in recommended_ids]
+    
+    # Randomly limit recommendations to either 3 or 4 items
+    limit = random.choice([3, 4])
+    yield "recommendations", recommended_full_objects[:limit]
+
+
+@router.post("/get_recommendations")
+async def get_recommendations(
+    request: RecommendationRequest,
+    user: dict = Depends(current_user),
+    response: Response = None,
+):
+    try:
+        user_id = user["id"]
+        _validate(request)
+
+        timer = StageTimer()
+        recommended = []
+        async for stage, payload in _recommendation_stages(request, user_id, timer):
+            if stage == "recommendations":
+                recommended = payload
+        if response is not None:
+            response.headers["Server-Timing"] = timer.header()
+
+        return {"recommended_foods": recommended}
         
     except HTTPException as http_ex:
         # Re-raise HTTP exceptions with their original status code
@@ -69,4 +152,41 @@ async def get_recommendations(
     except Exception as e:
         # Log unexpected errors and return 500
         logging.error(f"Unexpected error in get_recommendations: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Internal server error while generating recommendations")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error while generating recommendations")
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@router.post("/get_recommendations/stream")
+async def stream_recommendations(request: RecommendationRequest, user: dict = Depends(current_user)):
+    """
+    Server-sent events version of get_recommendations. Emits `fallback`
+    (popular surplus meals, from one DB read), then `moods`, then
+    `recommendations`; a failure mid-stream arrives as an `error` event.
+    """
+    user_id = user["id"]
+    _validate(request)
+
+    async def events():
+        stages = _recommendation_stages(request, user_id, StageTimer(), fallback=True)
+        try:
+            async for stage, payload in stages:
+                if stage == "moods":
+                    yield _sse("moods", {"moods": [[mood, weight] for mood, weight in payload]})
+                else:
+                    yield _sse(stage, {"recommended_foods": payload})
+        except HTTPException as http_ex:
+            yield _sse("error", {"status_code": http_ex.status_code, "detail": http_ex.detail})
+        except Exception as e:
+            logging.error(f"Unexpected error in stream_recommendations: {str(e)}", exc_info=True)
+            yield _sse("error", {"status_code": 500, "detail": "Internal server error while generating recommendations"})
+        finally:
+            await stages.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
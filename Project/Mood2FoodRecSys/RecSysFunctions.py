@@ -1,25 +1,23 @@
-import base64
 from dotenv import load_dotenv
-import os, spotipy, json
+import os
 import numpy as np
-from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
-from datetime import datetime
-from collections import defaultdict
-from groq import AsyncGroq
-from Mood2FoodRecSys.RecSys_Prompts import system_prompt_to_extract_moods, system_prompt_food_rec, generate_user_prompt
+from Mood2FoodRecSys.RecSys_Prompts import system_prompt_to_extract_moods, system_prompt_food_rec, encode_food_prompt, decode_suggestions, MoodAnalysis, FoodSuggestions
+from Mood2FoodRecSys import mood_cache
+from Mood2FoodRecSys.embedding_engine import rank_meals
+from Mood2FoodRecSys import listening_history, llm, mood_profile, spotify_tokens
+from Mood2FoodRecSys.spotify_client import SpotifyClient, SpotifyError
 from database.database import database
 from fastapi import APIRouter, HTTPException
-import requests
 import time
 import logging
+import asyncio
 
 load_dotenv()
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-
-client = AsyncGroq(api_key=GROQ_API_KEY)
+# past this the local ranking engine answers instead of the LLM
+RECSYS_LLM_TIMEOUT_SECONDS = float(os.getenv("RECSYS_LLM_TIMEOUT_SECONDS", "8"))
 
 # async def get_user_profile(access_token: str):
 #     headers = {"Authorization": f"Bearer {access_token}"}
@@ -58,67 +56,9 @@ async def get_spotify_client(user_id: str):
     try:
         if not user_id:
             raise ValueError("user_id is required")
-            
-        access_token_query = """
-            SELECT access_token, refresh_token, expires_at 
-            FROM users_spotify_auth_tokens 
-            WHERE user_id = :user_id
-        """
-        values = {"user_id": user_id}
-
-        access_tokens_response = await database.fetch_one(query=access_token_query, values=values)
-        
-        if not access_tokens_response:
-            raise HTTPException(status_code=404, detail="User Spotify authentication not found")
-
-        access_token = access_tokens_response["access_token"]
-        refresh_token = access_tokens_response["refresh_token"]
-        expires_at = access_tokens_response["expires_at"]
-
-        # check if expired
-        if time.time() >= expires_at:
-            try:
-                # refresh token
-                token_url = "https://accounts.spotify.com/api/token"
-                auth_header = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
-                headers = {"Authorization": f"Basic {auth_header}"}
-                data = {
-                    "grant_type": "refresh_token",
-                    "refresh_token": refresh_token
-                }
 
-                r = requests.post(token_url, headers=headers, data=data, timeout=10)
-                r.raise_for_status()
-                token_info = r.json()
-
-                new_access_token = token_info.get("access_token")
-                new_expires_in = token_info.get("expires_in")
-                
-                if not new_access_token or not new_expires_in:
-                    raise HTTPException(status_code=401, detail="Failed to refresh Spotify token")
-                    
-                new_expires_at = int(time.time()) + new_expires_in
-
-                # update DB
-                update_query = """
-                    UPDATE users_spotify_auth_tokens
-                    SET access_token = :access_token,
-                        expires_at = :expires_at
-                    WHERE user_id = :user_id
-                """
-                await database.execute(query=update_query, values={
-                    "access_token": new_access_token,
-                    "expires_at": new_expires_at,
-                    "user_id": user_id
-                })
-
-                access_token = new_access_token
-            except requests.RequestException as e:
-                logging.error(f"Failed to refresh Spotify token: {str(e)}")
-                raise HTTPException(status_code=401, detail="Failed to refresh Spotify authentication")
-
-        sp = spotipy.Spotify(auth=access_token)
-        return sp
+        access_token = await spotify_tokens.access_token(user_id)
+        return SpotifyClient(access_token)
         
     except HTTPException:
         raise
@@ -130,37 +70,26 @@ async def get_spotify_client(user_id: str):
 
 async def get_user_profile_and_recent_tracks(user_id: str):
     try:
+        songs = await listening_history.recent_tracks(user_id)
+        if songs:
+            # stored history answers now; new plays are pulled from Spotify off the request path
+            listening_history.refresh_in_background(user_id)
+            return songs
+
+        # nothing stored yet: fetch live once and keep it (and its cursor) for next time
         sp = await get_spotify_client(user_id=user_id)
+        recent_tracks_data = await sp.current_user_recently_played(limit=listening_history.SPOTIFY_PAGE_SIZE)
 
-        #Fetch recently listened tracks
-        recent_tracks_data = sp.current_user_recently_played(limit=10)
-        
         if not recent_tracks_data or not recent_tracks_data.get("items"):
             return []
-            
-        songs = []
-        for idx, item in enumerate(recent_tracks_data.get("items", []), start=1):
-            try:
-                track = item["track"]
-                artist_names = ", ".join([artist["name"] for artist in track["artists"]])
-                played_at_utc = datetime.fromisoformat(item["played_at"].replace("Z", "+00:00"))
-                played_at_local = played_at_utc.astimezone()
-                time_stamp = played_at_local.timestamp()
-
-                songs.append({
-                    "index": idx,
-                    "track_name": track["name"],
-                    "artists": artist_names,
-                    "played_at": played_at_local.strftime("%Y-%m-%d %H:%M:%S"),
-                    "time_stamp": time_stamp,
-                })
-            except (KeyError, ValueError) as e:
-                logging.warning(f"Skipping malformed track data: {str(e)}")
-                continue
-    
-        return songs
+
+        plays = listening_history.parse_plays(recent_tracks_data.get("items", []))
+        await listening_history.record(user_id, plays, listening_history.cursor_after(recent_tracks_data.get("cursors")))
+        return listening_history.to_songs(plays[:listening_history.LISTENING_HISTORY_LIMIT])
         
-    except spotipy.SpotifyException as e:
+    except HTTPException:
+        raise
+    except SpotifyError as e:
         logging.error(f"Spotify API error: {str(e)}")
         raise HTTPException(status_code=401, detail="Spotify authentication failed")
     except Exception as e:
@@ -168,28 +97,31 @@ async def get_user_profile_and_recent_tracks(user_id: str):
         raise HTTPException(status_code=500, detail=f"{str(e)}")
 
 
+async def refresh_mood_profile(user_id: str):
+    """Background refresh: pull new plays, label the unseen ones and fold them into the mood profile."""
+    await listening_history.sync(user_id)
+    songs = await listening_history.recent_tracks(user_id)
+    analysis = await analyze_mood_with_groq(songs) if songs else []
+    await mood_profile.fold(user_id, songs, analysis)
+
+
 def compute_time_weights(items_dict: list):
     try:
         if not items_dict:
             return np.array([])
-            
+
+        # one weight per track index; a repeated index keeps its last entry
         if isinstance(items_dict, list):
             items_dict = {i['index']: i for i in items_dict}
 
-        times = [v["time_stamp"] for v in items_dict.values()]
-        if not times:
-            return np.array([])
-            
-        most_recent = max(times)
-        deltas = [(most_recent - t) / 60 for t in times]
-        weights = np.array([1 / (1+d) for d in deltas])
-        
-        total_weight = np.sum(weights)
+        times = np.fromiter((v["time_stamp"] for v in items_dict.values()), dtype=float, count=len(items_dict))
+
+        # 1 / (1 + minutes before the most recent play), normalized
+        weights = 1.0 / (1.0 + (times.max() - times) / 60.0)
+        total_weight = weights.sum()
         if total_weight == 0:
             return np.ones(len(weights)) / len(weights)
-            
-        weights /= total_weight
-        return weights
+        return weights / total_weight
         
     except Exception as e:
         logging.error(f"Error computing time weights: {str(e)}")
@@ -199,74 +131,167 @@ async def analyze_mood_with_groq(items_dict: dict):
     try:
         if not items_dict:
             return []
-            
-        response = await client.chat.completions.create(
-            messages=[
+
+        # same songs as a recent call (or all songs already labelled) -> no LLM call
+        cached = await mood_cache.lookup(items_dict)
+        if cached is not None:
+            return cached
+
+        # only songs without a stored label go to the LLM
+        unseen = mood_cache.unseen(items_dict)
+
+        analysis = await llm.complete_json(
+            "mood_analysis",
+            [
                 {
                     "role": "system",
                     "content": system_prompt_to_extract_moods
                 },
                 {
                     "role": "user",
-                    "content": str(items_dict)
+                    "content": str(unseen)
                 }
             ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.5
+            llm.get_provider(),
+            MoodAnalysis,
         )
+        return await mood_cache.store(items_dict, unseen, analysis)
         
-        content = response.choices[0].message.content
-        if not content:
-            raise ValueError("Empty response from Groq API")
-            
-        return json.loads(content)
-        
-    except json.JSONDecodeError as e:
+    except llm.StructuredOutputError as e:
         logging.error(f"Failed to parse Groq response as JSON: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to parse mood analysis response")
     except Exception as e:
         logging.error(f"Error analyzing mood with Groq: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to analyze mood")
 
+def _mood_incidence(response_json, n_songs: int, vocab: dict):
+    """
+    Sparse song x mood incidence in COO form: parallel arrays of song rows and
+    mood columns, with moods interned (lowercased) into `vocab` in first-seen order.
+    """
+    # raw label -> column, so each distinct spelling is lowercased and interned once
+    ids = {}
+    cols, counts = [], []
+    for song in response_json[:n_songs]:
+        moods = song.get("mood") if isinstance(song, dict) else None
+        before = len(cols)
+        if isinstance(moods, list):
+            for mood in moods:
+                if isinstance(mood, str):
+                    col = ids.get(mood)
+                    if col is None:
+                        col = ids[mood] = vocab.setdefault(mood.lower(), len(vocab))
+                    cols.append(col)
+        counts.append(len(cols) - before)
+    rows = np.repeat(np.arange(len(counts), dtype=np.intp), counts)
+    return rows, np.array(cols, dtype=np.intp)
+
+
+def _ranked(vocab_names: list, totals: np.ndarray, present: np.ndarray):
+    total = totals.sum()
+    if total == 0:
+        return []
+    cols = np.flatnonzero(present)
+    # stable, so ties keep first-seen order
+    cols = cols[np.argsort(-totals[cols], kind="stable")]
+    return [(vocab_names[c], float(totals[c] / total)) for c in cols]
+
+
 def compute_mood_distribution(response_json, weights):
     try:
         if not response_json or len(weights) == 0:
             return []
-            
-        mood_weights = defaultdict(float)
 
-        for i, song in enumerate(response_json):
-            if i >= len(weights):
-                break
-            if "mood" not in song or not isinstance(song["mood"], list):
-                continue
-                
-            for mood in song["mood"]:
-                if isinstance(mood, str):
-                    mood_weights[mood.lower()] += weights[i]
-
-        total = sum(mood_weights.values())
-        if total == 0:
+        weights = np.asarray(weights, dtype=float)
+        vocab = {}
+        rows, cols = _mood_incidence(response_json, len(weights), vocab)
+        if not len(cols):
             return []
 
-        normalized_moods = {m: w / total for m, w in mood_weights.items()}
-        return sorted(normalized_moods.items(), key=lambda x: x[1], reverse=True)
+        # one weighted sum over the incidence matrix: totals[m] = sum of weights of songs tagged m
+        totals = np.bincount(cols, weights=weights[rows], minlength=len(vocab))
+        present = np.bincount(cols, minlength=len(vocab)) > 0
+        return _ranked(list(vocab), totals, present)
         
     except Exception as e:
         logging.error(f"Error computing mood distribution: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to compute mood distribution")
 
 
+def compute_mood_distributions(batch: list):
+    """
+    compute_mood_distribution for many users at once: `batch` is a list of
+    (response_json, weights) pairs, and the result lists one distribution per pair.
+    All users share one mood vocabulary and one user x mood weighted sum.
+    """
+    try:
+        vocab = {}
+        users, rows_all, cols_all, weights_all = [], [], [], []
+        for u, (response_json, weights) in enumerate(batch):
+            if not response_json or len(weights) == 0:
+                continue
+            weights = np.asarray(weights, dtype=float)
+            rows, cols = _mood_incidence(response_json, len(weights), vocab)
+            users.append(np.full(len(cols), u, dtype=np.intp))
+            cols_all.append(cols)
+            weights_all.append(weights[rows])
+
+        n_users, n_moods = len(batch), len(vocab)
+        if not n_moods:
+            return [[] for _ in batch]
+
+        flat = np.concatenate(users) * n_moods + np.concatenate(cols_all)
+        totals = np.bincount(flat, weights=np.concatenate(weights_all), minlength=n_users * n_moods)
+        present = np.bincount(flat, minlength=n_users * n_moods) > 0
+        totals = totals.reshape(n_users, n_moods)
+        present = present.reshape(n_users, n_moods)
+
+        names = list(vocab)
+        return [_ranked(names, totals[u], present[u]) for u in range(n_users)]
+
+    except Exception as e:
+        logging.error(f"Error computing mood distributions: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compute mood distribution")
+
+
 
-async def recommend_food_based_on_mood(top_moods, preference, relevant_food_items):
+async def recommend_food_based_on_mood(top_moods, preference, relevant_food_items, restaurant_id=None, engine="llm"):
     try:
         if not top_moods or not relevant_food_items:
             return {"Suggested_food": []}
-            
-        user_prompt = generate_user_prompt(top_moods, preference, relevant_food_items)
 
-        response_food_rec = await client.chat.completions.create(
-            messages=[
+        if engine == "local":
+            return rank_meals(top_moods, preference, relevant_food_items)
+
+        # users with near-identical moods and the same preferences at the same
+        # restaurant share one LLM answer until the menu changes
+        moods = mood_cache.quantize_moods(top_moods)
+        key = mood_cache.rec_key(restaurant_id, moods, preference, relevant_food_items)
+        llm_call = mood_cache.memoize_recommendation(
+            key, lambda: _recommend_with_groq(moods, preference, relevant_food_items)
+        )
+        try:
+            # shielded so a slow answer still lands in the cache for the next request
+            return await asyncio.wait_for(asyncio.shield(llm_call), timeout=RECSYS_LLM_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logging.warning("Food recommendation LLM timed out; using local ranking")
+            return rank_meals(top_moods, preference, relevant_food_items)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error recommending food: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate food recommendations")
+
+
+async def _recommend_with_groq(top_moods, preference, relevant_food_items):
+    try:
+        # menu items go out as short numbers; the answer is mapped back to ids below
+        user_prompt, aliases = encode_food_prompt(top_moods, preference, relevant_food_items)
+
+        result = await llm.complete_json(
+            "food_recommendation",
+            [
                 {
                     "role": "system",
                     "content": system_prompt_food_rec
@@ -276,18 +301,12 @@ async def recommend_food_based_on_mood(top_moods, preference, relevant_food_item
                     "content": user_prompt
                 }
             ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.5
+            llm.get_provider(),
+            FoodSuggestions,
         )
+        return decode_suggestions(result, aliases)
         
-        content = response_food_rec.choices[0].message.content
-        
-        if not content:
-            raise ValueError("Empty response from Groq API")
-
-        return json.loads(content)
-        
-    except json.JSONDecodeError as e:
+    except llm.StructuredOutputError as e:
         logging.error(f"Failed to parse food recommendation response as JSON: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to parse food recommendation response")
     except Exception as e:
@@ -315,6 +334,37 @@ async def fetch_data_from_db(restaurant_id):
 
 
 
+async def fetch_popular_surplus(restaurant_id, limit: int = 4):
+    """
+    Placeholder picks shown before mood-based ones are ready: in-stock surplus
+    meals first, then by units sold. Best effort; returns [] on failure.
+    """
+    try:
+        query = """
+            SELECT m.*
+            FROM meals m
+            LEFT JOIN (
+                SELECT oi.meal_id, SUM(oi.qty) AS sold
+                FROM order_items oi
+                JOIN meals sm ON sm.id = oi.meal_id
+                WHERE sm.restaurant_id = :restaurant_id
+                GROUP BY oi.meal_id
+            ) p ON p.meal_id = m.id
+            WHERE m.restaurant_id = :restaurant_id
+            ORDER BY (m.surplus_price IS NOT NULL AND COALESCE(m.quantity, 0) > 0) DESC,
+                     COALESCE(p.sold, 0) DESC, m.name
+            LIMIT :limit
+        """
+        rows = await database.fetch_all(query=query, values={"restaurant_id": restaurant_id, "limit": limit})
+        return [dict(r) for r in rows]
+
+    except Exception as e:
+        logging.warning(f"Error fetching fallback meals: {str(e)}")
+        return []
+
+
+
+
 async def fetch_preferences_from_db(user_id):
     try:
         if not user_id:
@@ -1,3 +1,14 @@
+import json
+import logging
+import os
+import numpy as np
+from typing import List, Union
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from Mood2FoodRecSys.embedding_engine import meal_matrix, mood_vector
+
+# prompt size above which the menu is pre-filtered locally before going to the LLM
+PROMPT_TOKEN_BUDGET = int(os.getenv("RECSYS_PROMPT_TOKEN_BUDGET", "4000"))
+
 system_prompt_to_extract_moods = f"""
 You are an intelligent model that classifies both the music genre and the listener’s mood
 based on multiple songs provided together.
@@ -35,94 +46,175 @@ IMPORTANT INSTRUCTIONS:
 """
 
 
-
-
-
-
-
-
-system_prompt_food_rec = f"""
+system_prompt_food_rec = f""" 
 You are an intelligent Food Recommender Agent that recommends food by the moods and the preferences of the user.
 
-You will be given user's idenfiied moods based on its normalized weights. Also, You will be given user's preferences.
+You will be given user's idenfiied moods based on its normalized weights. Also, You will be given user's preferences and you are supposed to suggest food from all the available options.
 
-Input format:
+Input format (JSON):
 {{
-moods: [<list of tuples in (mood, normalized weight) format>],
-food_preference: [],
-other_preferences: []
+"moods": [[mood, normalized weight], ...],
+"food_preference": [],
+"other_preferences": [],
+"shared_tags": [<tags that apply to every available item>],
+"available_items": [{{"i": <item number>, "n": "name of the food item", "t": [<its other tags>]}}]
 }}
 
 Output:
 {{
-Suggested_food: [<list of 10 recommended food based on preferences>]
+"Suggested_food": [<item numbers "i" of up to 10 recommended food items, best first>]
 }}
 
 IMPORTANT INSTRUCTIONS:
+- RETURN ONLY ITEM NUMBERS ("i") FROM available_items.
 - DO NOT ADD ANY OTHER EXPLANATION.
+- DO NOT SUGGEST FOOD OUTSIDE OF THE PROVIDED "available_items" list.
 - ONLY RETURN OUTPUT IN THE SPECIFIED FORMAT.
 - DO NOT ENCLOSE IT IN ``` python .... ``` OR ```json...```.
 - You must respond ONLY with valid JSON. Do not add explanation. Do not add text outside JSON. Do not wrap it in markdown code block.
- """
+"""
 
 
-system_prompt_food_rec = f""" 
-You are an intelligent Food Recommender Agent that recommends food by the moods and the preferences of the user.
+class MoodLabel(BaseModel):
+    """One song of the mood extraction answer; a bare string tag is read as a one-item list."""
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
 
-You will be given user's idenfiied moods based on its normalized weights. Also, You will be given user's preferences and you are supposed to suggest food from all the available options.
+    song_name: str = Field("", alias="song name")
+    genre: List[str] = []
+    mood: List[str] = []
 
-Input format:
-{{
-moods: [<list of tuples in (mood, normalized weight) format>],
-food_preference: [],
-other_preferences: [],
-available_items:[{{"id": "id of the food item", "name": "name of the food item", "tags": <list of tags associated with the food item>}}]
-}}
+    @field_validator("genre", "mood", mode="before")
+    @classmethod
+    def _listify(cls, value):
+        return [value] if isinstance(value, str) else value
 
-Output:
-{{
-Suggested_food: [<list of 10 recommended food based on preferences>]
-}}
 
-IMPORTANT INSTRUCTIONS:
--RETURN FOOD ITEMS IN THE SAME FORMAT AS PROVIDED IN available_items.
-- DO NOT ADD ANY OTHER EXPLANATION.
-- DO NOT SUGGEST FOOD OUTSIDE OF THE PROVIDED "available_items" list.
-- ONLY RETURN OUTPUT IN THE SPECIFIED FORMAT.
-- DO NOT ENCLOSE IT IN ``` python .... ``` OR ```json...```.
-- You must respond ONLY with valid JSON. Do not add explanation. Do not add text outside JSON. Do not wrap it in markdown code block.
-"""
+MoodAnalysis = List[MoodLabel]
 
 
-def generate_user_prompt(top_moods, preference, relevant_food_items):
+class FoodSuggestions(BaseModel):
+    """The food recommender answer: item numbers (or {"i": n} objects) from available_items."""
+    model_config = ConfigDict(extra="allow")
+
+    Suggested_food: List[Union[int, str, dict]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def _tags(raw) -> list:
+    if isinstance(raw, str):
+        raw = [raw]
+    tags = []
+    for tag in raw or []:
+        tag = tag.strip().lower() if isinstance(tag, str) else json.dumps(tag, default=str)
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _prefilter(items: list, entries: list, top_moods, preference, room: int) -> list:
+    """
+    Indices of the items to keep when the menu doesn't fit in `room` tokens:
+    the best matches by local embedding score, back in menu order.
+    """
+    # priced with the widest alias and the separating comma
+    costs = [estimate_tokens(_dumps({"i": len(entries), **e}) + ",") for e in entries]
+    if room < min(costs):
+        return []
     try:
-        if not relevant_food_items:
-            available_items = {}
-        else:
-            available_items = [
-            {
-                "id": item["id"],     # keep id reference
-                "name": item["name"],
-                "tags": item["tags"]
-            }
-            for item in relevant_food_items
-            if "id" in item and "name" in item and "tags" in item
+        scores = meal_matrix(items) @ mood_vector(top_moods, preference)
+        order = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable")
+    except Exception as e:
+        logging.warning(f"Menu pre-filter scoring failed, truncating in menu order: {str(e)}")
+        order = range(len(items))
+    keep, used = [], 0
+    for i in order:
+        if used + costs[i] > room:
+            break
+        keep.append(int(i))
+        used += costs[i]
+    return sorted(keep)
+
+
+def encode_food_prompt(top_moods, preference, relevant_food_items, token_budget: int = None):
+    """
+    Compact JSON prompt for the food recommender, plus the menu items in alias
+    order. Items are sent as {"i": n, "n": name, "t": tags} with n = position + 1
+    instead of their UUIDs, tags shared by every item are sent once, and if the
+    prompt would exceed `token_budget` the menu is pre-filtered by local
+    relevance. Map the answer back with decode_suggestions.
+    """
+    token_budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    try:
+        items = [
+            item for item in relevant_food_items or []
+            if isinstance(item, dict) and "id" in item and "name" in item and "tags" in item
         ]
-        
         food_prefs = preference.get("food_preferences", []) if preference else []
         other_prefs = preference.get("other_preferences", []) if preference else []
 
-        user_prompt = f"""
-            
-            "moods": {top_moods},
-            "food_preference": {food_prefs},
-            "other_preferences": {other_prefs}
-            "available_items": {available_items}
-        """
+        prompt = {
+            "moods": [[str(m), round(float(w), 3)] for m, w in top_moods or []],
+            "food_preference": food_prefs,
+            "other_preferences": other_prefs,
+        }
+        if not items:
+            prompt["available_items"] = {}
+            return _dumps(prompt), []
+
+        tag_lists = [_tags(item["tags"]) for item in items]
+        shared = [t for t in tag_lists[0] if all(t in tags for tags in tag_lists[1:])] if len(items) > 1 else []
+        entries = []
+        for item, tags in zip(items, tag_lists):
+            entry = {"n": item["name"]}
+            rest = [t for t in tags if t not in shared]
+            if rest:
+                entry["t"] = rest
+            entries.append(entry)
+
+        prompt["shared_tags"] = shared
+        room = token_budget - estimate_tokens(_dumps({**prompt, "available_items": []}))
+        if estimate_tokens(_dumps([{"i": n, **e} for n, e in enumerate(entries, start=1)])) > room:
+            keep = _prefilter(items, entries, top_moods, preference, room)
+            items = [items[i] for i in keep]
+            entries = [entries[i] for i in keep]
+
+        prompt["available_items"] = [{"i": n, **e} for n, e in enumerate(entries, start=1)]
+        return _dumps(prompt), items
 
-        return user_prompt
-        
     except Exception as e:
-        import logging
         logging.error(f"Error generating user prompt: {str(e)}")
-        return '"moods": [], "food_preference": [], "other_preferences": [], "available_items": {}'
+        empty = {"moods": [], "food_preference": [], "other_preferences": [], "available_items": []}
+        return _dumps(empty), []
+
+
+def generate_user_prompt(top_moods, preference, relevant_food_items):
+    return encode_food_prompt(top_moods, preference, relevant_food_items)[0]
+
+
+def decode_suggestions(result, aliases: list):
+    """
+    Replaces the item numbers in the model's Suggested_food with the menu
+    items they stand for; numbers that don't match an item are dropped.
+    """
+    if not isinstance(result, dict):
+        return result
+    suggested, seen = [], set()
+    for entry in result.get("Suggested_food") or []:
+        alias = entry.get("i", entry.get("id")) if isinstance(entry, dict) else entry
+        try:
+            idx = int(alias) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= idx < len(aliases) and idx not in seen:
+            seen.add(idx)
+            item = aliases[idx]
+            suggested.append({"id": str(item["id"]), "name": item["name"], "tags": item.get("tags")})
+    return {**result, "Suggested_food": suggested}
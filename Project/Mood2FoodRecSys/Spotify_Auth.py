@@ -3,10 +3,12 @@ import os
 from dotenv import load_dotenv
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi import Request, APIRouter, HTTPException, Depends
-import requests, base64, json, time
+import httpx, json, time
 from urllib.parse import urlencode
 import logging
 from app.auth import current_user
+from Mood2FoodRecSys.spotify_client import request_token
+from Mood2FoodRecSys import spotify_tokens
 
 load_dotenv()
 
@@ -24,6 +26,12 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def _error_description(response) -> str:
+    try:
+        return response.json().get("error_description", "Unknown error")
+    except ValueError:
+        return "Unknown error"
+
 @router.get("/login")
 async def spotify_login(user: dict = Depends(current_user)):
     """
@@ -66,18 +74,11 @@ async def spotify_callback(code: str, state: str):
         if not all([SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI]):
             raise HTTPException(status_code=500, detail="Spotify configuration incomplete")
 
-        token_url = "https://accounts.spotify.com/api/token"
-        auth_header = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
-        headers = {"Authorization": f"Basic {auth_header}"}
-        data = {
+        token_info = await request_token({
             "grant_type": "authorization_code",
             "code": code,
             "redirect_uri": SPOTIFY_REDIRECT_URI,
-        }
-
-        r = requests.post(token_url, headers=headers, data=data, timeout=10)
-        r.raise_for_status()
-        token_info = r.json()
+        })
         
         if "error" in token_info:
             raise HTTPException(status_code=400, detail=f"Spotify error: {token_info.get('error_description', 'Unknown error')}")
@@ -91,25 +92,16 @@ async def spotify_callback(code: str, state: str):
             
         expires_at = int(time.time()) + expires_in if expires_in else None
 
-        # Store tokens in database
+        # Store tokens in database (one row per user)
         user_id = state
-        query_state_exists = "SELECT 1 FROM users_spotify_auth_tokens WHERE user_id = :user_id"
-
-        user_exists = await database.fetch_val(query=query_state_exists, values={"user_id": user_id})
-
-        if user_exists:
-            query = """
-                UPDATE users_spotify_auth_tokens
-                SET access_token = :access_token,
-                    refresh_token = :refresh_token,
-                    expires_at = :expires_at
-                WHERE user_id = :user_id
-            """
-        else:
-            query = """
-                INSERT INTO users_spotify_auth_tokens (user_id, access_token, refresh_token, expires_at)
-                VALUES (:user_id, :access_token, :refresh_token, :expires_at)
-            """
+        query = """
+            INSERT INTO users_spotify_auth_tokens (user_id, access_token, refresh_token, expires_at)
+            VALUES (:user_id, :access_token, :refresh_token, :expires_at)
+            ON CONFLICT (user_id) DO UPDATE
+            SET access_token = EXCLUDED.access_token,
+                refresh_token = EXCLUDED.refresh_token,
+                expires_at = EXCLUDED.expires_at
+        """
 
         await database.execute(query, {
             "user_id": user_id,
@@ -117,6 +109,7 @@ async def spotify_callback(code: str, state: str):
             "refresh_token": refresh_token,
             "expires_at": expires_at
         })
+        spotify_tokens.remember(user_id, access_token, refresh_token, expires_at)
         
         # Redirect to frontend with success indicator
         redirect_url = f"{FRONTEND_URL}/browse?spotify_connected=true"
@@ -124,7 +117,10 @@ async def spotify_callback(code: str, state: str):
         
     except HTTPException as http_ex:
         raise http_ex
-    except requests.RequestException as e:
+    except httpx.HTTPStatusError as e:
+        logging.error(f"Spotify rejected the authorization code: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Spotify error: {_error_description(e.response)}")
+    except httpx.HTTPError as e:
         logging.error(f"Request error in spotify_callback: {str(e)}")
         raise HTTPException(status_code=502, detail="Failed to communicate with Spotify")
     except Exception as e:
@@ -158,17 +154,10 @@ async def refresh_access_token(refresh_token: str):
         if not all([SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET]):
             raise HTTPException(status_code=500, detail="Spotify configuration incomplete")
             
-        token_url = "https://accounts.spotify.com/api/token"
-        auth_header = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
-        headers = {"Authorization": f"Basic {auth_header}"}
-        data = {
+        new_token = await request_token({
             "grant_type": "refresh_token",
             "refresh_token": refresh_token,
-        }
-
-        r = requests.post(token_url, headers=headers, data=data, timeout=10)
-        r.raise_for_status()
-        new_token = r.json()
+        })
         
         if "error" in new_token:
             raise HTTPException(status_code=401, detail=f"Spotify error: {new_token.get('error_description', 'Invalid refresh token')}")
@@ -181,7 +170,10 @@ async def refresh_access_token(refresh_token: str):
         
     except HTTPException:
         raise
-    except requests.RequestException as e:
+    except httpx.HTTPStatusError as e:
+        logging.error(f"Spotify rejected the refresh token: {str(e)}")
+        raise HTTPException(status_code=401, detail=f"Spotify error: {_error_description(e.response)}")
+    except httpx.HTTPError as e:
         logging.error(f"Request error in refresh_access_token: {str(e)}")
         raise HTTPException(status_code=502, detail="Failed to communicate with Spotify")
     except Exception as e:
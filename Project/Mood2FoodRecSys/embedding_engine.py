@@ -0,0 +1,123 @@
+import logging
+import re
+import zlib
+import numpy as np
+from fastapi import HTTPException
+from Mood2FoodRecSys import mood_cache
+
+EMBEDDING_DIM = 512
+TOP_K = 10
+
+# Mood labels rarely share words with menu items, so each mood is expanded
+# with food vocabulary it tends to go with before embedding. Unknown moods
+# still embed through their own n-grams.
+MOOD_FOOD_LEXICON = {
+    "happy": "sweet dessert cake ice cream fruit smoothie celebration pizza",
+    "joyful": "sweet dessert cake fruit smoothie pizza",
+    "upbeat": "fresh fruit smoothie tacos bowl",
+    "excited": "spicy tacos wings burger street food",
+    "energetic": "protein chicken spicy bowl rice wrap",
+    "party": "pizza wings nachos burger fries",
+    "romantic": "pasta wine chocolate dessert steak",
+    "sad": "comfort warm soup noodles chocolate mac cheese",
+    "melancholic": "comfort warm soup tea noodles",
+    "lonely": "comfort warm soup ramen",
+    "nostalgic": "homestyle comfort pie stew mac cheese",
+    "angry": "spicy hot wings chili curry",
+    "aggressive": "spicy hot wings chili",
+    "intense": "spicy chili curry steak",
+    "anxious": "light tea soup rice oatmeal",
+    "stressed": "comfort chocolate warm soup",
+    "calm": "light tea salad sushi rice bowl",
+    "relaxed": "light salad sandwich tea sushi",
+    "chill": "light salad sandwich smoothie",
+    "peaceful": "tea salad light vegetarian",
+    "dreamy": "dessert pastry tea sweet",
+    "focused": "healthy protein salad bowl nuts",
+    "reflective": "tea soup light vegetarian",
+    "confident": "steak burger protein grill",
+    "hopeful": "fresh salad fruit bowl",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _features(text: str):
+    """Word tokens plus boundary-marked character trigrams of each word."""
+    for word in _TOKEN.findall(text.lower()):
+        yield "w:" + word
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            yield "g:" + padded[i:i + 3]
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """L2-normalized hashed n-gram vector. crc32 keeps it stable across processes."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode())
+        # words count double so whole-word matches beat shared trigrams
+        weight = 2.0 if feature.startswith("w:") else 1.0
+        vec[h % dim] += weight if (h >> 31) & 1 else -weight
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def _meal_text(item: dict) -> str:
+    tags = item.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tags]
+    return " ".join([str(item.get("name") or "")] + [str(t) for t in tags])
+
+
+def mood_vector(top_moods, preference=None) -> np.ndarray:
+    """Weighted sum of expanded mood embeddings, nudged toward stated preferences."""
+    vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for mood, weight in top_moods:
+        mood = str(mood).lower()
+        vec += float(weight) * embed(f"{mood} {MOOD_FOOD_LEXICON.get(mood, '')}")
+    prefs = []
+    if preference:
+        prefs = list(preference.get("food_preferences") or []) + list(preference.get("other_preferences") or [])
+    if prefs:
+        vec += 0.5 * embed(" ".join(str(p) for p in prefs))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+# one matrix per menu version, so a restaurant's meals are embedded once
+_matrix_cache = mood_cache.TTLCache(256, mood_cache.REC_CACHE_TTL_SECONDS)
+
+
+def meal_matrix(food_items: list) -> np.ndarray:
+    key = mood_cache.menu_version(food_items)
+    matrix = _matrix_cache.get(key)
+    if matrix is None:
+        matrix = np.vstack([embed(_meal_text(i)) for i in food_items])
+        _matrix_cache.set(key, matrix)
+    return matrix
+
+
+def rank_meals(top_moods, preference, food_items: list, top_k: int = TOP_K):
+    """
+    Scores every meal with one matrix-vector product against the mood vector.
+    Returns the same shape as the LLM recommender: {"Suggested_food": [...]}.
+    """
+    try:
+        items = [i for i in food_items or [] if "id" in i and "name" in i]
+        if not top_moods or not items:
+            return {"Suggested_food": []}
+
+        scores = meal_matrix(items) @ mood_vector(top_moods, preference)
+        # stable sort keeps menu order among ties
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return {
+            "Suggested_food": [
+                {"id": str(items[i]["id"]), "name": items[i]["name"], "tags": items[i].get("tags")}
+                for i in order
+            ]
+        }
+
+    except Exception as e:
+        logging.error(f"Error ranking meals locally: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to generate food recommendations")
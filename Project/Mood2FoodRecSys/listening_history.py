@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from database.database import database
+from Mood2FoodRecSys import spotify_tokens
+from Mood2FoodRecSys.mood_cache import TTLCache
+from Mood2FoodRecSys.spotify_client import SpotifyClient
+
+# how many of the latest plays recommendations are computed from
+LISTENING_HISTORY_LIMIT = int(os.getenv("LISTENING_HISTORY_LIMIT", "50"))
+# minimum gap between Spotify polls for the same user
+LISTENING_HISTORY_SYNC_SECONDS = int(os.getenv("LISTENING_HISTORY_SYNC_SECONDS", "300"))
+# after a failed sync (revoked token, Spotify 429/5xx, DB error) the user isn't polled again for this long
+LISTENING_HISTORY_FAILURE_BACKOFF_SECONDS = int(os.getenv("LISTENING_HISTORY_FAILURE_BACKOFF_SECONDS", "60"))
+LISTENING_HISTORY_RETENTION_DAYS = int(os.getenv("LISTENING_HISTORY_RETENTION_DAYS", "90"))
+LISTENING_HISTORY_PURGE_INTERVAL_SECONDS = int(os.getenv("LISTENING_HISTORY_PURGE_INTERVAL_SECONDS", "3600"))
+LISTENING_HISTORY_MAX_PAGES = int(os.getenv("LISTENING_HISTORY_MAX_PAGES", "5"))
+SPOTIFY_PAGE_SIZE = 50
+
+_recently_synced = TTLCache(10000, LISTENING_HISTORY_SYNC_SECONDS)
+_inflight = {}
+
+
+def parse_plays(items: list) -> list:
+    """Spotify recently-played items -> plays (newest first, as Spotify sends them)."""
+    plays = []
+    for item in items:
+        try:
+            track = item["track"]
+            plays.append({
+                "track_id": track.get("id"),
+                "track_name": track["name"],
+                "artists": ", ".join([artist["name"] for artist in track["artists"]]),
+                "played_at": datetime.fromisoformat(item["played_at"].replace("Z", "+00:00")),
+            })
+        except (KeyError, ValueError, TypeError) as e:
+            logging.warning(f"Skipping malformed track data: {str(e)}")
+            continue
+    return plays
+
+
+def to_songs(plays: list) -> list:
+    """Plays in the shape the mood pipeline expects."""
+    songs = []
+    for idx, play in enumerate(plays, start=1):
+        played_at_local = play["played_at"].astimezone()
+        songs.append({
+            "index": idx,
+            "track_name": play["track_name"],
+            "artists": play["artists"],
+            "played_at": played_at_local.strftime("%Y-%m-%d %H:%M:%S"),
+            "time_stamp": played_at_local.timestamp(),
+        })
+    return songs
+
+
+async def recent_tracks(user_id, limit: int = LISTENING_HISTORY_LIMIT) -> list:
+    """The user's latest stored plays as songs, or [] if none are stored (or the read fails)."""
+    try:
+        rows = await database.fetch_all(
+            query="""
+                SELECT track_name, artists, played_at
+                FROM listening_history
+                WHERE user_id = :user_id
+                ORDER BY played_at DESC
+                LIMIT :limit
+            """,
+            values={"user_id": str(user_id), "limit": limit},
+        )
+    except Exception as e:
+        logging.warning(f"Listening history read failed: {str(e)}")
+        return []
+    return to_songs([dict(row) for row in rows])
+
+
+def cursor_after(cursors) -> int:
+    after = (cursors or {}).get("after")
+    return int(after) if after else None
+
+
+async def record(user_id, plays: list, cursor: int = None):
+    """
+    Appends plays to listening_history and advances the user's `after`
+    cursor (never backwards). Best effort: a failed write only means the
+    next sync fetches the same plays again.
+    """
+    user_id = str(user_id)
+    try:
+        if plays:
+            await database.execute(
+                query="""
+                    INSERT INTO listening_history (user_id, played_at, track_id, track_name, artists)
+                    SELECT CAST(:user_id AS uuid), p, i, n, a
+                    FROM unnest(CAST(:played_at AS timestamptz[]), CAST(:track_ids AS text[]),
+                                CAST(:names AS text[]), CAST(:artists AS text[])) AS t(p, i, n, a)
+                    ON CONFLICT (user_id, played_at) DO NOTHING
+                """,
+                values={
+                    "user_id": user_id,
+                    "played_at": [p["played_at"] for p in plays],
+                    "track_ids": [p["track_id"] for p in plays],
+                    "names": [p["track_name"] for p in plays],
+                    "artists": [p["artists"] for p in plays],
+                },
+            )
+        await database.execute(
+            query="""
+                INSERT INTO listening_history_cursors (user_id, after_ms, synced_at)
+                VALUES (:user_id, :after_ms, now())
+                ON CONFLICT (user_id) DO UPDATE
+                SET after_ms = GREATEST(listening_history_cursors.after_ms, EXCLUDED.after_ms),
+                    synced_at = now()
+            """,
+            values={"user_id": user_id, "after_ms": cursor},
+        )
+    except Exception as e:
+        logging.warning(f"Listening history write failed: {str(e)}")
+    _recently_synced.set(user_id, True)
+
+
+async def sync(user_id) -> int:
+    """Pulls plays newer than the stored cursor from Spotify; returns how many were fetched."""
+    user_id = str(user_id)
+    row = await database.fetch_one(
+        query="SELECT after_ms FROM listening_history_cursors WHERE user_id = :user_id",
+        values={"user_id": user_id},
+    )
+    after = row["after_ms"] if row else None
+    sp = SpotifyClient(await spotify_tokens.access_token(user_id))
+
+    fetched = []
+    for _ in range(LISTENING_HISTORY_MAX_PAGES):
+        page = await sp.current_user_recently_played(limit=SPOTIFY_PAGE_SIZE, after=after)
+        items = page.get("items") or []
+        fetched.extend(parse_plays(items))
+        after = cursor_after(page.get("cursors")) or after
+        if len(items) < SPOTIFY_PAGE_SIZE:
+            break
+    await record(user_id, fetched, after)
+    return len(fetched)
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.warning(f"Background listening history sync failed: {future.exception()}")
+
+
+def _throttle(user_id: str, future: asyncio.Future):
+    # whatever the outcome, so users whose sync keeps failing don't trigger one per request
+    if future.cancelled() or future.exception() is not None:
+        _recently_synced.set(user_id, True, expires_at=time.time() + LISTENING_HISTORY_FAILURE_BACKOFF_SECONDS)
+    else:
+        _recently_synced.set(user_id, True)
+
+
+def refresh_in_background(user_id):
+    """
+    Schedules a sync off the request path, at most once per
+    LISTENING_HISTORY_SYNC_SECONDS per user and never two at a time; after
+    a failure the user is left alone for LISTENING_HISTORY_FAILURE_BACKOFF_SECONDS.
+    """
+    user_id = str(user_id)
+    if user_id in _inflight or _recently_synced.get(user_id):
+        return
+    task = asyncio.ensure_future(sync(user_id))
+    _inflight[user_id] = task
+    task.add_done_callback(lambda _: _inflight.pop(user_id, None))
+    task.add_done_callback(lambda t: _throttle(user_id, t))
+    task.add_done_callback(_log_failure)
+
+
+async def purge_old(batch_size: int = 1000) -> int:
+    """Background job: drops plays older than LISTENING_HISTORY_RETENTION_DAYS, batch by batch."""
+    total = 0
+    while True:
+        rows = await database.fetch_all(
+            query="""
+                DELETE FROM listening_history
+                WHERE (user_id, played_at) IN (
+                    SELECT user_id, played_at FROM listening_history
+                    WHERE played_at < now() - make_interval(days => :days)
+                    LIMIT :batch
+                )
+                RETURNING user_id
+            """,
+            values={"days": LISTENING_HISTORY_RETENTION_DAYS, "batch": batch_size},
+        )
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+
+def clear():
+    _recently_synced.clear()
+    # a background task left pending must not run into the next user of the module
+    for task in _inflight.values():
+        if not task.get_loop().is_closed():
+            task.cancel()
+    _inflight.clear()
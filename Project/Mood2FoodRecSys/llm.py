@@ -0,0 +1,312 @@
+import ast
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from dotenv import load_dotenv
+from pydantic import TypeAdapter
+from Mood2FoodRecSys.RecSys_Prompts import estimate_tokens
+
+load_dotenv()
+
+# "groq" or "stub" (deterministic offline answers, for tests and benchmarks)
+LLM_PROVIDER = os.getenv("RECSYS_LLM_PROVIDER", "groq")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+LLM_MODEL = os.getenv("RECSYS_LLM_MODEL", "llama-3.3-70b-versatile")
+# hard limit on one call, hedge included
+LLM_DEADLINE_SECONDS = float(os.getenv("RECSYS_LLM_DEADLINE_SECONDS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("RECSYS_LLM_MAX_RETRIES", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("RECSYS_LLM_MAX_CONCURRENCY", "8"))
+# send a second identical request if the first hasn't answered by then; 0 = off
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("RECSYS_LLM_HEDGE_AFTER_SECONDS", "0"))
+
+_METRIC_FIELDS = ("calls", "failures", "timeouts", "hedges", "hedge_wins", "repairs", "repair_failures",
+                  "prompt_tokens", "completion_tokens", "total_ms", "max_ms")
+
+_FENCE = re.compile(r"```[A-Za-z]*[ \t]*\n?(.*?)```", re.S)
+
+REPAIR_PROMPT = """
+You fix malformed JSON produced by another model.
+Reply with only the corrected JSON value, matching this JSON schema:
+{schema}
+Keep the original content; do not add explanations or code fences.
+"""
+
+_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+_metrics = {}
+_groq_client = None
+
+
+class StructuredOutputError(ValueError):
+    """The model's answer could not be parsed into the expected schema, even after a repair."""
+
+
+@dataclass
+class Completion:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+def _count(usage, field: str) -> int:
+    value = getattr(usage, field, 0)
+    return value if isinstance(value, int) else 0
+
+
+def groq_client():
+    """The shared AsyncGroq client, built on first use so the stub needs neither groq nor a key."""
+    global _groq_client
+    if _groq_client is None:
+        from groq import AsyncGroq
+        _groq_client = AsyncGroq(api_key=GROQ_API_KEY, timeout=LLM_DEADLINE_SECONDS, max_retries=LLM_MAX_RETRIES)
+    return _groq_client
+
+
+class GroqProvider:
+    """Chat completions from an AsyncGroq (or API-compatible) client; the shared one by default."""
+
+    name = "groq"
+
+    def __init__(self, client=None):
+        self.client = client
+
+    async def complete(self, messages: list, model: str, temperature: float) -> Completion:
+        client = self.client or groq_client()
+        response = await client.chat.completions.create(
+            messages=messages, model=model, temperature=temperature
+        )
+        usage = getattr(response, "usage", None)
+        return Completion(
+            response.choices[0].message.content,
+            _count(usage, "prompt_tokens"),
+            _count(usage, "completion_tokens"),
+        )
+
+
+class StubProvider:
+    """
+    Offline stand-in that answers the mood and food prompts deterministically:
+    moods and genres are picked from a hash of the song name, and the first
+    menu items are suggested. No network, no API key.
+
+    `reply` replaces the generated answer: a fixed text, a function of the
+    messages, or an exception to raise. `delay` is added before answering.
+    """
+
+    name = "stub"
+    MOODS = ("calm", "happy", "energetic", "melancholic", "romantic", "focused", "nostalgic")
+    GENRES = ("synthpop", "indie folk", "trap", "r&b soul", "lo-fi hip hop", "dream pop")
+
+    def __init__(self, reply=None, delay: float = 0):
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+        self.last_messages = None
+
+    def _pick(self, key: str, options: tuple, n: int) -> list:
+        h = int(hashlib.sha256(key.encode()).hexdigest(), 16)
+        return [options[(h >> (8 * k)) % len(options)] for k in range(n)]
+
+    def _moods(self, songs: list) -> list:
+        labels = []
+        for song in songs:
+            name = str(song.get("track_name", song.get("song name", ""))) if isinstance(song, dict) else str(song)
+            labels.append({
+                "song name": name,
+                "genre": self._pick("genre:" + name.lower(), self.GENRES, 1),
+                "mood": list(dict.fromkeys(self._pick("mood:" + name.lower(), self.MOODS, 2))),
+            })
+        return labels
+
+    def _foods(self, prompt: dict) -> dict:
+        items = prompt.get("available_items") or []
+        return {"Suggested_food": [item["i"] for item in items[:10] if isinstance(item, dict)]}
+
+    def _answer(self, messages: list) -> str:
+        user = messages[-1]["content"]
+        try:
+            payload = json.loads(user)
+        except ValueError:
+            # the mood prompt is the repr of a list of track dicts
+            payload = ast.literal_eval(user)
+        answer = self._foods(payload) if isinstance(payload, dict) else self._moods(payload)
+        return json.dumps(answer)
+
+    async def complete(self, messages: list, model: str, temperature: float) -> Completion:
+        self.calls += 1
+        self.last_messages = messages
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if isinstance(self.reply, BaseException):
+            raise self.reply
+        if callable(self.reply):
+            content = self.reply(messages)
+        elif self.reply is not None:
+            content = self.reply
+        else:
+            content = self._answer(messages)
+        return Completion(
+            content,
+            sum(estimate_tokens(m["content"]) for m in messages),
+            estimate_tokens(content),
+        )
+
+
+stub = StubProvider()
+
+
+def get_provider():
+    """The provider picked by RECSYS_LLM_PROVIDER."""
+    return stub if LLM_PROVIDER == "stub" else GroqProvider()
+
+
+def _site(site: str) -> dict:
+    return _metrics.setdefault(site, dict.fromkeys(_METRIC_FIELDS, 0))
+
+
+async def _attempt(provider, messages, model, temperature) -> Completion:
+    async with _semaphore:
+        return await provider.complete(messages, model, temperature)
+
+
+async def _hedged(site, provider, messages, model, temperature, hedge_after) -> Completion:
+    first = asyncio.ensure_future(_attempt(provider, messages, model, temperature))
+    tasks = [first]
+    try:
+        if hedge_after > 0:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            # never hedge into a full semaphore; that is how rate-limit storms start
+            if not done and not _semaphore.locked():
+                _site(site)["hedges"] += 1
+                tasks.append(asyncio.ensure_future(_attempt(provider, messages, model, temperature)))
+
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        _site(site)["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def complete(site: str, messages: list, provider, model: str = None, temperature: float = 0.5,
+                   deadline: float = None, hedge_after: float = None) -> str:
+    """
+    Runs one chat completion and returns its text. `site` names the caller for
+    the metrics. The call holds a slot of the shared concurrency semaphore, is
+    cancelled after `deadline` seconds (asyncio.TimeoutError), and may be
+    hedged with a duplicate request after `hedge_after` seconds.
+    """
+    deadline = LLM_DEADLINE_SECONDS if deadline is None else deadline
+    hedge_after = LLM_HEDGE_AFTER_SECONDS if hedge_after is None else hedge_after
+    metrics = _site(site)
+    metrics["calls"] += 1
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(
+            _hedged(site, provider, messages, model or LLM_MODEL, temperature, hedge_after),
+            timeout=deadline,
+        )
+    except asyncio.TimeoutError:
+        metrics["timeouts"] += 1
+        logging.warning(f"LLM call {site} hit its {deadline}s deadline")
+        raise
+    except Exception:
+        metrics["failures"] += 1
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        metrics["total_ms"] += elapsed_ms
+        metrics["max_ms"] = max(metrics["max_ms"], elapsed_ms)
+    metrics["prompt_tokens"] += result.prompt_tokens
+    metrics["completion_tokens"] += result.completion_tokens
+    return result.content
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def extract_json(content: str):
+    """
+    First JSON value in a model answer: code fences are stripped and any text
+    before the value (or after it) is ignored. Raises ValueError if none.
+    """
+    text = content.strip()
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    decoder = json.JSONDecoder()
+    for start, ch in enumerate(text):
+        if ch in "[{":
+            try:
+                return decoder.raw_decode(text, start)[0]
+            except ValueError:
+                continue
+    raise ValueError("No JSON value in model output")
+
+
+def parse_json(content: str, schema):
+    """
+    Parses a model answer and validates it against `schema` (a pydantic model
+    or type). Returns plain JSON data holding only the fields the model sent.
+    """
+    adapter = _adapter(schema)
+    value = adapter.validate_python(extract_json(content))
+    return adapter.dump_python(value, by_alias=True, exclude_unset=True)
+
+
+async def complete_json(site: str, messages: list, provider, schema, **kwargs):
+    """
+    complete() followed by parse_json(). If the answer doesn't parse, the
+    broken text (not the original prompt) is sent back once with the schema
+    to be fixed; StructuredOutputError if that fails too.
+    """
+    content = await complete(site, messages, provider, **kwargs)
+    if not content or not content.strip():
+        raise ValueError("Empty response from LLM")
+    try:
+        return parse_json(content, schema)
+    except ValueError as e:
+        error = e
+
+    metrics = _site(site)
+    metrics["repairs"] += 1
+    logging.warning(f"LLM call {site} returned unparseable output, asking for a repair: {str(error)}")
+    repair = [
+        {"role": "system", "content": REPAIR_PROMPT.format(schema=json.dumps(_adapter(schema).json_schema()))},
+        {"role": "user", "content": f"Error: {str(error)[:500]}\n\nOutput:\n{content}"},
+    ]
+    try:
+        return parse_json(await complete(f"{site}.repair", repair, provider, temperature=0), schema)
+    except ValueError as e:
+        metrics["repair_failures"] += 1
+        raise StructuredOutputError(f"Unparseable {site} output after repair: {str(e)}") from e
+
+
+def stats() -> dict:
+    """Per call site counters, with latency rounded to ms; exposed via /debug/llm."""
+    return {
+        site: {
+            **{k: v for k, v in m.items() if k not in ("total_ms", "max_ms")},
+            "avg_latency_ms": round(m["total_ms"] / m["calls"], 2) if m["calls"] else 0.0,
+            "max_latency_ms": round(m["max_ms"], 2),
+        }
+        for site, m in _metrics.items()
+    }
+
+
+def clear():
+    _metrics.clear()
@@ -0,0 +1,309 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from database.database import database
+
+MOOD_CACHE_TTL_SECONDS = int(os.getenv("MOOD_CACHE_TTL_SECONDS", "86400"))
+MOOD_CACHE_MAX_ENTRIES = int(os.getenv("MOOD_CACHE_MAX_ENTRIES", "10000"))
+# how often the background job deletes expired mood_cache rows
+MOOD_CACHE_PURGE_INTERVAL_SECONDS = int(os.getenv("MOOD_CACHE_PURGE_INTERVAL_SECONDS", "3600"))
+REC_CACHE_TTL_SECONDS = int(os.getenv("REC_CACHE_TTL_SECONDS", "900"))
+# mood weights are rounded to this step so near-identical users share a key
+REC_MOOD_QUANTUM = float(os.getenv("REC_MOOD_QUANTUM", "0.1"))
+REC_TOP_MOODS = int(os.getenv("REC_TOP_MOODS", "5"))
+
+
+class TTLCache:
+    """Bounded in-process LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        hit = self._data.get(key)
+        if not hit:
+            return None
+        expires_at, value = hit
+        if expires_at <= time.time():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires_at: float = None):
+        self._data[key] = (expires_at or time.time() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        for key in [k for k in self._data if predicate(k)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# whole-history results, keyed by the normalized track list
+set_cache = TTLCache(MOOD_CACHE_MAX_ENTRIES, MOOD_CACHE_TTL_SECONDS)
+# single-song labels, so overlapping histories reuse what was already classified
+track_cache = TTLCache(MOOD_CACHE_MAX_ENTRIES, MOOD_CACHE_TTL_SECONDS)
+# food recommendations, keyed by (restaurant, menu version, preferences, quantized moods)
+rec_cache = TTLCache(MOOD_CACHE_MAX_ENTRIES, REC_CACHE_TTL_SECONDS)
+_rec_inflight = {}
+
+
+def track_key(track: dict) -> str:
+    """Identity of a song for caching: lowercased track name + artists."""
+    name = track.get("track_name")
+    artists = track.get("artists")
+    if name is None:
+        # not a Spotify history row; fall back to its full content
+        return "raw:" + json.dumps(track, sort_keys=True, default=str)
+    if isinstance(artists, list):
+        artists = ", ".join(artists)
+    return f"{str(name).strip().lower()}|{str(artists or '').strip().lower()}"
+
+
+def tracklist_key(tracks: list) -> str:
+    """Content address of a listening history (order kept, play times ignored)."""
+    raw = json.dumps([track_key(t) for t in tracks])
+    return "set:" + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _from_tracks(keys: list):
+    labels = [track_cache.get(k) for k in keys]
+    return None if any(label is None for label in labels) else labels
+
+
+def _json(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+async def _load(set_key: str, keys: list):
+    """
+    Pulls the list entry (mood_analysis_cache, unexpired) and any known track
+    labels (track_moods) into memory. Best effort.
+    """
+    try:
+        set_rows, track_rows = await asyncio.gather(
+            database.fetch_all(
+                query="""
+                    SELECT cache_key, result, extract(epoch from expires_at) AS expires_at
+                    FROM mood_analysis_cache
+                    WHERE cache_key = :key AND expires_at > now()
+                """,
+                values={"key": set_key},
+            ),
+            database.fetch_all(
+                query="SELECT track_key, label FROM track_moods WHERE track_key = ANY(:keys)",
+                values={"keys": keys},
+            ) if keys else asyncio.sleep(0, result=[]),
+        )
+    except Exception as e:
+        logging.warning(f"Mood cache read failed: {str(e)}")
+        return
+    for row in set_rows:
+        set_cache.set(row["cache_key"], _json(row["result"]), float(row["expires_at"]))
+    for row in track_rows:
+        track_cache.set(row["track_key"], _json(row["label"]))
+
+
+async def _persist(set_key: str, result, labels: dict, tracks: dict):
+    try:
+        await database.execute(
+            query="""
+                INSERT INTO mood_analysis_cache (cache_key, result, expires_at)
+                VALUES (:key, CAST(:result AS json), now() + make_interval(secs => :ttl))
+                ON CONFLICT (cache_key) DO UPDATE
+                SET result = EXCLUDED.result, expires_at = EXCLUDED.expires_at
+            """,
+            values={"key": set_key, "result": json.dumps(result), "ttl": MOOD_CACHE_TTL_SECONDS},
+        )
+        if labels:
+            # a song's mood doesn't change, so first label wins and never expires
+            await database.execute(
+                query="""
+                    INSERT INTO track_moods (track_key, track_name, artists, label)
+                    SELECT k, n, a, l::json
+                    FROM unnest(CAST(:keys AS text[]), CAST(:names AS text[]),
+                                CAST(:artists AS text[]), CAST(:labels AS text[])) AS t(k, n, a, l)
+                    ON CONFLICT (track_key) DO NOTHING
+                """,
+                values={
+                    "keys": list(labels),
+                    "names": [tracks[k].get("track_name") for k in labels],
+                    "artists": [tracks[k].get("artists") for k in labels],
+                    "labels": [json.dumps(v) for v in labels.values()],
+                },
+            )
+    except Exception as e:
+        logging.warning(f"Mood cache write failed: {str(e)}")
+
+
+async def lookup(tracks: list):
+    """
+    Cached mood analysis for `tracks`, or None if some songs still need the LLM.
+    Checks the whole-list entry, then per-track labels, in memory first and
+    then in mood_analysis_cache / track_moods.
+    """
+    set_key = tracklist_key(tracks)
+    keys = [track_key(t) for t in tracks]
+
+    cached = set_cache.get(set_key)
+    if cached is None:
+        cached = _from_tracks(keys)
+    if cached is None:
+        await _load(set_key, [k for k in dict.fromkeys(keys) if track_cache.get(k) is None])
+        cached = set_cache.get(set_key)
+        if cached is None:
+            cached = _from_tracks(keys)
+    if cached is not None:
+        set_cache.set(set_key, cached)
+    return cached
+
+
+def unseen(tracks: list) -> list:
+    """Tracks with no known label (one per song), i.e. what the LLM still has to see."""
+    missing = {}
+    for t in tracks:
+        k = track_key(t)
+        if k not in missing and track_cache.get(k) is None:
+            missing[k] = t
+    return list(missing.values())
+
+
+def _align(sent: list, result) -> dict:
+    """Maps the LLM's per-song answers back to track keys."""
+    if not isinstance(result, list):
+        return {}
+    if len(result) == len(sent):
+        return {track_key(t): r for t, r in zip(sent, result) if isinstance(r, dict)}
+    # the model dropped or merged songs; fall back to matching on the name
+    by_name = {str(r.get("song name", "")).strip().lower(): r for r in result if isinstance(r, dict)}
+    return {
+        track_key(t): by_name[str(t.get("track_name", "")).strip().lower()]
+        for t in sent
+        if str(t.get("track_name", "")).strip().lower() in by_name
+    }
+
+
+async def store(tracks: list, sent: list, result):
+    """
+    Records the LLM's answer for the `sent` subset of `tracks` and returns the
+    analysis for the full list, merging in labels that were already known.
+    """
+    labels = _align(sent, result)
+    for k, label in labels.items():
+        track_cache.set(k, label)
+
+    if len(sent) == len(tracks):
+        merged = result
+    else:
+        merged = [
+            track_cache.get(track_key(t)) or {"song name": t.get("track_name"), "genre": [], "mood": []}
+            for t in tracks
+        ]
+    set_key = tracklist_key(tracks)
+    set_cache.set(set_key, merged)
+    await _persist(set_key, merged, labels, {track_key(t): t for t in sent})
+    return merged
+
+
+async def purge_expired(batch_size: int = 1000) -> int:
+    """Background job: deletes expired mood_analysis_cache rows batch by batch."""
+    total = 0
+    while True:
+        rows = await database.fetch_all(
+            query="""
+                DELETE FROM mood_analysis_cache
+                WHERE cache_key IN (
+                    SELECT cache_key FROM mood_analysis_cache
+                    WHERE expires_at <= now()
+                    LIMIT :batch
+                )
+                RETURNING cache_key
+            """,
+            values={"batch": batch_size},
+        )
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+
+
+def quantize_moods(top_moods) -> list:
+    """
+    Canonical form of a mood distribution: the top REC_TOP_MOODS moods with
+    weights rounded to REC_MOOD_QUANTUM and renormalized, sorted by weight.
+    """
+    top = sorted(((str(m).lower(), float(w)) for m, w in top_moods), key=lambda x: (-x[1], x[0]))
+    rounded = [(m, round(w / REC_MOOD_QUANTUM) * REC_MOOD_QUANTUM) for m, w in top[:REC_TOP_MOODS]]
+    rounded = [(m, w) for m, w in rounded if w > 0] or [(m, 1.0) for m, _ in top[:1]]
+    total = sum(w for _, w in rounded)
+    return sorted(((m, round(w / total, 3)) for m, w in rounded), key=lambda x: (-x[1], x[0]))
+
+
+def _digest(value) -> str:
+    raw = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def menu_version(food_items: list) -> str:
+    """Hash of what the recommender sees of a menu; changes whenever a meal does."""
+    return _digest(sorted(
+        [str(i.get("id")), i.get("name"), i.get("tags")] for i in food_items
+    ))
+
+
+def rec_key(restaurant_id, moods: list, preference, food_items: list) -> tuple:
+    prefs = {
+        "food": (preference or {}).get("food_preferences") or [],
+        "other": (preference or {}).get("other_preferences") or [],
+    }
+    return (str(restaurant_id or ""), menu_version(food_items), _digest(prefs), _digest(moods))
+
+
+def _log_failure(future: asyncio.Future):
+    # retrieves the exception, so a compute nobody awaits any more fails quietly
+    if not future.cancelled() and future.exception() is not None:
+        logging.warning(f"Shared recommendation compute failed: {future.exception()}")
+
+
+async def memoize_recommendation(key: tuple, compute):
+    """
+    Returns the cached recommendation for `key`, otherwise awaits `compute()`
+    once and shares it with every concurrent caller asking for the same key.
+    """
+    cached = rec_cache.get(key)
+    if cached is not None:
+        return cached
+    pending = _rec_inflight.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(compute())
+        _rec_inflight[key] = pending
+        pending.add_done_callback(lambda _: _rec_inflight.pop(key, None))
+        pending.add_done_callback(_log_failure)
+    result = await asyncio.shield(pending)
+    rec_cache.set(key, result)
+    return result
+
+
+def invalidate_restaurant(restaurant_id):
+    """Drops cached recommendations for a restaurant after its meals change."""
+    rid = str(restaurant_id)
+    rec_cache.discard_where(lambda key: key[0] == rid)
+
+
+def clear():
+    set_cache.clear()
+    track_cache.clear()
+    rec_cache.clear()
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from database.database import database
+from Mood2FoodRecSys.mood_cache import TTLCache
+
+# a play's pull on the profile halves every this many minutes
+MOOD_PROFILE_HALF_LIFE_MINUTES = float(os.getenv("MOOD_PROFILE_HALF_LIFE_MINUTES", "120"))
+# a profile refreshed within this window is served without Spotify or the mood LLM
+MOOD_PROFILE_FRESH_SECONDS = int(os.getenv("MOOD_PROFILE_FRESH_SECONDS", "900"))
+MOOD_PROFILE_MAX_MOODS = int(os.getenv("MOOD_PROFILE_MAX_MOODS", "20"))
+PROFILE_SOURCE = "profile"
+
+# users refreshed recently enough that serving their profile shouldn't trigger another refresh
+_refreshed = TTLCache(10000, max(MOOD_PROFILE_FRESH_SECONDS // 2, 1))
+_inflight = {}
+
+
+def _decay(seconds: float) -> float:
+    return 0.5 ** (max(seconds, 0) / (MOOD_PROFILE_HALF_LIFE_MINUTES * 60))
+
+
+def fold_songs(masses: dict, as_of: float, songs: list, analysis: list):
+    """
+    Adds the plays in `songs` newer than `as_of` to the decayed mood masses.
+    `analysis[i]` is the mood label of `songs[i]` (as from analyze_mood_with_groq).
+    Returns the new masses and the time they are valid at (the newest play).
+    """
+    new = [
+        (float(song["time_stamp"]), label)
+        for song, label in zip(songs or [], analysis or [])
+        if isinstance(label, dict) and float(song.get("time_stamp") or 0) > as_of
+    ]
+    if not new:
+        return masses, as_of
+
+    latest = max(t for t, _ in new)
+    scale = _decay(latest - as_of)
+    out = defaultdict(float, {m: w * scale for m, w in masses.items()})
+    for t, label in new:
+        moods = label.get("mood")
+        if not isinstance(moods, list):
+            continue
+        for mood in moods:
+            if isinstance(mood, str):
+                out[mood.lower()] += _decay(latest - t)
+
+    top = sorted(out.items(), key=lambda x: x[1], reverse=True)[:MOOD_PROFILE_MAX_MOODS]
+    return {m: w for m, w in top if w > 0}, latest
+
+
+def distribution(masses: dict) -> list:
+    """Masses -> [(mood, weight)] summing to 1, heaviest first (compute_mood_distribution's shape)."""
+    total = sum(masses.values())
+    if total <= 0:
+        return []
+    return sorted(((m, w / total) for m, w in masses.items()), key=lambda x: x[1], reverse=True)
+
+
+def _json(value):
+    return json.loads(value) if isinstance(value, str) else (value or {})
+
+
+async def current(user_id):
+    """The user's mood distribution if the stored profile is fresh, otherwise None."""
+    try:
+        row = await database.fetch_one(
+            query="""
+                SELECT vector
+                FROM moods
+                WHERE user_id = :user_id AND source = :source
+                  AND updated_at > now() - make_interval(secs => :fresh)
+            """,
+            values={"user_id": str(user_id), "source": PROFILE_SOURCE, "fresh": MOOD_PROFILE_FRESH_SECONDS},
+        )
+    except Exception as e:
+        logging.warning(f"Mood profile read failed: {str(e)}")
+        return None
+    if not row:
+        return None
+    return distribution(_json(row["vector"]).get("moods") or {}) or None
+
+
+async def fold(user_id, songs: list, analysis: list):
+    """
+    Folds newly seen plays into the user's profile row and marks it fresh,
+    even when there was nothing new. Best effort.
+    """
+    user_id = str(user_id)
+    try:
+        async with database.transaction():
+            row = await database.fetch_one(
+                query="""
+                    SELECT vector FROM moods
+                    WHERE user_id = :user_id AND source = :source
+                    FOR UPDATE
+                """,
+                values={"user_id": user_id, "source": PROFILE_SOURCE},
+            )
+            vector = _json(row["vector"]) if row else {}
+            masses, as_of = fold_songs(vector.get("moods") or {}, vector.get("as_of") or 0, songs, analysis)
+            await database.execute(
+                query="""
+                    INSERT INTO moods (user_id, label, vector, source, updated_at)
+                    VALUES (:user_id, :label, CAST(:vector AS json), :source, now())
+                    ON CONFLICT (user_id) WHERE source = 'profile' DO UPDATE
+                    SET label = EXCLUDED.label, vector = EXCLUDED.vector, updated_at = now()
+                """,
+                values={
+                    "user_id": user_id,
+                    "label": max(masses, key=masses.get) if masses else None,
+                    "vector": json.dumps({"moods": masses, "as_of": as_of}),
+                    "source": PROFILE_SOURCE,
+                },
+            )
+    except Exception as e:
+        logging.warning(f"Mood profile write failed: {str(e)}")
+        return
+    _refreshed.set(user_id, True)
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.warning(f"Background mood profile update failed: {future.exception()}")
+
+
+def _spawn(user_id: str, coro):
+    task = asyncio.ensure_future(coro)
+    _inflight[user_id] = task
+    task.add_done_callback(lambda _: _inflight.pop(user_id, None))
+    task.add_done_callback(_log_failure)
+
+
+def fold_in_background(user_id, songs: list, analysis: list):
+    """Updates the profile from an analysis the request already paid for, off the request path."""
+    user_id = str(user_id)
+    if user_id not in _inflight:
+        _spawn(user_id, fold(user_id, songs, analysis))
+
+
+def refresh_in_background(user_id, refresh):
+    """
+    Runs `refresh(user_id)` (ingest + label + fold) off the request path, so a
+    profile being served stays fresh. One at a time per user, at most once per
+    half freshness window.
+    """
+    user_id = str(user_id)
+    if user_id in _inflight or _refreshed.get(user_id):
+        return
+    _spawn(user_id, refresh(user_id))
+
+
+def clear():
+    _refreshed.clear()
+    # a background task left pending must not run into the next user of the module
+    for task in _inflight.values():
+        if not task.get_loop().is_closed():
+            task.cancel()
+    _inflight.clear()
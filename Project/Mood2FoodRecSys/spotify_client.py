@@ -0,0 +1,82 @@
+import base64
+import logging
+import os
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
+SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+SPOTIFY_HTTP_TIMEOUT_SECONDS = float(os.getenv("SPOTIFY_HTTP_TIMEOUT_SECONDS", "10"))
+
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+_http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Process-wide pooled client, so Spotify calls reuse connections and never block the loop."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(SPOTIFY_HTTP_TIMEOUT_SECONDS, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class SpotifyError(Exception):
+    """Non-2xx answer from the Spotify Web API."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class SpotifyClient:
+    """Async stand-in for the few spotipy.Spotify calls we use."""
+
+    def __init__(self, access_token: str):
+        self.access_token = access_token
+
+    async def _get(self, path: str, params: dict = None) -> dict:
+        r = await get_http_client().get(
+            f"{SPOTIFY_API_URL}{path}",
+            params={k: v for k, v in (params or {}).items() if v is not None},
+            headers={"Authorization": f"Bearer {self.access_token}"},
+        )
+        if r.status_code >= 400:
+            try:
+                message = r.json().get("error", {}).get("message", r.text)
+            except ValueError:
+                message = r.text
+            raise SpotifyError(r.status_code, message)
+        return r.json() if r.content else {}
+
+    async def current_user_recently_played(self, limit: int = 50, after: int = None, before: int = None) -> dict:
+        return await self._get("/me/player/recently-played", {"limit": limit, "after": after, "before": before})
+
+
+async def request_token(data: dict) -> dict:
+    """
+    POSTs a grant (authorization_code / refresh_token) to the accounts
+    service with our client credentials. Raises httpx.HTTPError on failure.
+    """
+    auth_header = base64.b64encode(f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()).decode()
+    r = await get_http_client().post(
+        SPOTIFY_TOKEN_URL,
+        headers={"Authorization": f"Basic {auth_header}"},
+        data=data,
+    )
+    r.raise_for_status()
+    return r.json()
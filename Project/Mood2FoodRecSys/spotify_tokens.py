@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import time
+import httpx
+from fastapi import HTTPException
+from database.database import database
+from Mood2FoodRecSys.mood_cache import TTLCache
+from Mood2FoodRecSys.spotify_client import request_token
+
+# tokens this close to expires_at are refreshed in the background while still being served
+SPOTIFY_REFRESH_AHEAD_SECONDS = int(float(os.getenv("SPOTIFY_REFRESH_AHEAD_MINUTES", "5")) * 60)
+SPOTIFY_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("SPOTIFY_TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# how long a cached row is trusted before users_spotify_auth_tokens is read again
+SPOTIFY_TOKEN_CACHE_TTL_SECONDS = int(os.getenv("SPOTIFY_TOKEN_CACHE_TTL_SECONDS", "3600"))
+# 0 disables the batch refresh job
+SPOTIFY_TOKEN_REFRESH_INTERVAL_SECONDS = int(os.getenv("SPOTIFY_TOKEN_REFRESH_INTERVAL_SECONDS", "0"))
+SPOTIFY_TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("SPOTIFY_TOKEN_REFRESH_BATCH_SIZE", "100"))
+SPOTIFY_TOKEN_REFRESH_CONCURRENCY = int(os.getenv("SPOTIFY_TOKEN_REFRESH_CONCURRENCY", "10"))
+# a refresh lease older than this is presumed dead and taken over; keep it above the Spotify HTTP timeout
+SPOTIFY_REFRESH_LEASE_SECONDS = int(os.getenv("SPOTIFY_REFRESH_LEASE_SECONDS", "30"))
+_LEASE_POLL_SECONDS = 0.2
+
+# user_id -> {"access_token", "refresh_token", "expires_at"}
+token_cache = TTLCache(SPOTIFY_TOKEN_CACHE_MAX_ENTRIES, SPOTIFY_TOKEN_CACHE_TTL_SECONDS)
+_inflight = {}
+
+
+def remember(user_id, access_token: str, refresh_token: str, expires_at):
+    token_cache.set(str(user_id), {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "expires_at": expires_at,
+    })
+
+
+def forget(user_id):
+    token_cache.discard_where(lambda key: key == str(user_id))
+
+
+async def _load(user_id: str) -> dict:
+    row = await database.fetch_one(
+        query="""
+            SELECT access_token, refresh_token, expires_at
+            FROM users_spotify_auth_tokens
+            WHERE user_id = :user_id
+        """,
+        values={"user_id": user_id},
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="User Spotify authentication not found")
+    remember(user_id, row["access_token"], row["refresh_token"], row["expires_at"])
+    return token_cache.get(user_id)
+
+
+async def _claim(user_id: str):
+    """
+    Takes the refresh lease on the user's row if the token still needs a
+    refresh and nobody else holds a live lease. Returns the row, else None.
+    """
+    return await database.fetch_one(
+        query="""
+            UPDATE users_spotify_auth_tokens
+            SET refreshing_until = now() + make_interval(secs => :lease)
+            WHERE user_id = :user_id
+              AND expires_at <= :horizon
+              AND (refreshing_until IS NULL OR refreshing_until < now())
+            RETURNING access_token, refresh_token, expires_at
+        """,
+        values={
+            "user_id": user_id,
+            "lease": SPOTIFY_REFRESH_LEASE_SECONDS,
+            "horizon": int(time.time()) + SPOTIFY_REFRESH_AHEAD_SECONDS,
+        },
+    )
+
+
+async def _release(user_id: str, refresh_token: str):
+    await database.execute(
+        query="""
+            UPDATE users_spotify_auth_tokens
+            SET refreshing_until = NULL
+            WHERE user_id = :user_id AND refresh_token = :refresh_token
+        """,
+        values={"user_id": user_id, "refresh_token": refresh_token},
+    )
+
+
+async def _refresh(user_id: str, wait: bool = True):
+    """
+    Refreshes the user's token under a short lease on their
+    users_spotify_auth_tokens row, always with the refresh_token stored in
+    the row: another worker may have rotated it, leaving ours (and our cached
+    copy) revoked. The lease is committed before Spotify is called, so no
+    transaction or row lock is held over the HTTP request, and the new token
+    is only written if the row still has the refresh_token we used.
+
+    If another worker holds the lease, we wait for its token (wait=True) or
+    return None (wait=False). A row refreshed in the meantime is adopted.
+    """
+    while True:
+        row = await _claim(user_id)
+        if row:
+            break
+        row = await database.fetch_one(
+            query="""
+                SELECT access_token, refresh_token, expires_at
+                FROM users_spotify_auth_tokens
+                WHERE user_id = :user_id
+            """,
+            values={"user_id": user_id},
+        )
+        if not row:
+            if not wait:
+                return None
+            forget(user_id)
+            raise HTTPException(status_code=404, detail="User Spotify authentication not found")
+        if (row["expires_at"] or 0) - time.time() > SPOTIFY_REFRESH_AHEAD_SECONDS:
+            remember(user_id, row["access_token"], row["refresh_token"], row["expires_at"])
+            return token_cache.get(user_id)
+        if not wait:
+            return None
+        await asyncio.sleep(_LEASE_POLL_SECONDS)
+
+    old_refresh_token = row["refresh_token"]
+    try:
+        token_info = await request_token({
+            "grant_type": "refresh_token",
+            "refresh_token": old_refresh_token,
+        })
+    except httpx.HTTPError as e:
+        logging.error(f"Failed to refresh Spotify token: {str(e)}")
+        forget(user_id)
+        await _release(user_id, old_refresh_token)
+        raise HTTPException(status_code=401, detail="Failed to refresh Spotify authentication")
+
+    access_token = token_info.get("access_token")
+    expires_in = token_info.get("expires_in")
+    if not access_token or not expires_in:
+        forget(user_id)
+        await _release(user_id, old_refresh_token)
+        raise HTTPException(status_code=401, detail="Failed to refresh Spotify token")
+
+    # Spotify may rotate the refresh token; keep the old one otherwise
+    refresh_token = token_info.get("refresh_token") or old_refresh_token
+    expires_at = int(time.time()) + expires_in
+    written = await database.fetch_one(
+        query="""
+            UPDATE users_spotify_auth_tokens
+            SET access_token = :access_token,
+                refresh_token = :refresh_token,
+                expires_at = :expires_at,
+                refreshing_until = NULL
+            WHERE user_id = :user_id AND refresh_token = :old_refresh_token
+            RETURNING user_id
+        """,
+        values={
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "expires_at": expires_at,
+            "user_id": user_id,
+            "old_refresh_token": old_refresh_token,
+        },
+    )
+    if not written:
+        # our lease expired and another worker (or a re-login) replaced the row; theirs wins
+        logging.warning(f"Spotify token for {user_id} changed during refresh; using the stored one")
+        return await _load(user_id)
+    remember(user_id, access_token, refresh_token, expires_at)
+    return token_cache.get(user_id)
+
+
+def _refresh_once(user_id: str) -> asyncio.Future:
+    """One refresh per user at a time in this process; concurrent callers share the pending one."""
+    pending = _inflight.get(user_id)
+    if pending is None:
+        pending = asyncio.ensure_future(_refresh(user_id))
+        _inflight[user_id] = pending
+        pending.add_done_callback(lambda _: _inflight.pop(user_id, None))
+    return pending
+
+
+def _log_failure(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.warning(f"Background Spotify token refresh failed: {future.exception()}")
+
+
+async def access_token(user_id) -> str:
+    """
+    A usable access token for the user, served from memory when possible.
+    Expired tokens are refreshed inline; tokens within
+    SPOTIFY_REFRESH_AHEAD_SECONDS of expiry are returned as-is while a
+    refresh runs in the background.
+    """
+    user_id = str(user_id)
+    token = token_cache.get(user_id) or await _load(user_id)
+    remaining = (token["expires_at"] or 0) - time.time()
+    if remaining <= 0:
+        token = await asyncio.shield(_refresh_once(user_id))
+    elif remaining <= SPOTIFY_REFRESH_AHEAD_SECONDS:
+        _refresh_once(user_id).add_done_callback(_log_failure)
+    return token["access_token"]
+
+
+async def refresh_expiring(batch_size: int = SPOTIFY_TOKEN_REFRESH_BATCH_SIZE) -> int:
+    """
+    Background job: refreshes up to `batch_size` tokens that are still valid
+    but inside the refresh-ahead window, soonest first. Tokens that already
+    expired belong to idle users and are left to the next request.
+    Each row is claimed with a refresh lease, so workers running the job at
+    the same time never refresh the same token; leased rows are skipped.
+    """
+    now = int(time.time())
+    rows = await database.fetch_all(
+        query="""
+            SELECT user_id
+            FROM users_spotify_auth_tokens
+            WHERE expires_at > :now AND expires_at <= :horizon
+              AND (refreshing_until IS NULL OR refreshing_until < now())
+            ORDER BY expires_at
+            LIMIT :batch
+        """,
+        values={"now": now, "horizon": now + SPOTIFY_REFRESH_AHEAD_SECONDS, "batch": batch_size},
+    )
+    semaphore = asyncio.Semaphore(SPOTIFY_TOKEN_REFRESH_CONCURRENCY)
+
+    async def refresh(row):
+        async with semaphore:
+            return await _refresh(str(row["user_id"]), wait=False)
+
+    results = await asyncio.gather(*(refresh(row) for row in rows), return_exceptions=True)
+    return sum(1 for r in results if r is not None and not isinstance(r, BaseException))
+
+
+def clear():
+    token_cache.clear()
@@ -0,0 +1,35 @@
+"""mood_analysis_cache
+
+Revision ID: 1c6f0b83e5d2
+Revises: d4a8c2e61f97
+Create Date: 2026-10-19 17:05:12.640291
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c6f0b83e5d2'
+down_revision: Union[str, Sequence[str], None] = 'd4a8c2e61f97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mood_analysis_cache',
+    sa.Column('cache_key', sa.Text(), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=False),
+    sa.Column('expires_at', sa.TIMESTAMP(), nullable=False),
+    sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index(op.f('ix_mood_analysis_cache_expires_at'), 'mood_analysis_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_mood_analysis_cache_expires_at'), table_name='mood_analysis_cache')
+    op.drop_table('mood_analysis_cache')
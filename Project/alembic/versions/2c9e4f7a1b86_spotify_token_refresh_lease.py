@@ -0,0 +1,29 @@
+"""spotify_token_refresh_lease
+
+Revision ID: 2c9e4f7a1b86
+Revises: 6b2f0e9a41d3
+Create Date: 2026-10-20 10:12:36.904215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2c9e4f7a1b86'
+down_revision: Union[str, Sequence[str], None] = '6b2f0e9a41d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # short lease taken by the worker refreshing a token, so the Spotify call runs outside any transaction
+    op.add_column('users_spotify_auth_tokens', sa.Column('refreshing_until', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users_spotify_auth_tokens', 'refreshing_until')
@@ -0,0 +1,34 @@
+"""spotify_tokens_unique_user
+
+Revision ID: 3e91d7f4a2c6
+Revises: 7a2e59c0d3b8
+Create Date: 2026-10-19 19:10:52.377418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e91d7f4a2c6'
+down_revision: Union[str, Sequence[str], None] = '7a2e59c0d3b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # keep the newest token row per user before the callback starts upserting on user_id
+    op.execute("""
+        delete from users_spotify_auth_tokens t
+        using users_spotify_auth_tokens newer
+        where newer.user_id = t.user_id and newer.id > t.id
+    """)
+    op.create_unique_constraint('uq_users_spotify_auth_tokens_user_id', 'users_spotify_auth_tokens', ['user_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_users_spotify_auth_tokens_user_id', 'users_spotify_auth_tokens', type_='unique')
@@ -0,0 +1,30 @@
+"""drop_meal_allergens_gin
+
+Revision ID: 4e7b2d90c1a5
+Revises: 8a1d5c3f9e27
+Create Date: 2026-10-20 11:32:15.640872
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7b2d90c1a5'
+down_revision: Union[str, Sequence[str], None] = '8a1d5c3f9e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # allergens are only ever excluded (not allergens && ...), which a GIN index can't serve;
+    # the index just slowed down meal writes
+    op.execute("drop index if exists ix_meals_allergens_gin")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_meals_allergens_gin', 'meals', ['allergens'], unique=False, postgresql_using='gin')
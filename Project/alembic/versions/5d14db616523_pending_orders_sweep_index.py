@@ -0,0 +1,35 @@
+"""pending_orders_sweep_index
+
+Revision ID: 5d14db616523
+Revises: 8f5993c1e378
+Create Date: 2026-10-19 09:12:41.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d14db616523'
+down_revision: Union[str, Sequence[str], None] = '8f5993c1e378'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # lets the stale-order sweeper find old pending orders without scanning history
+    op.create_index(
+        'ix_orders_pending_created',
+        'orders',
+        ['created_at'],
+        unique=False,
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_pending_created', table_name='orders', postgresql_where=sa.text("status = 'pending'"))
@@ -0,0 +1,44 @@
+"""listening_history
+
+Revision ID: 5f0c8b2d7e14
+Revises: 3e91d7f4a2c6
+Create Date: 2026-10-19 19:42:06.118907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0c8b2d7e14'
+down_revision: Union[str, Sequence[str], None] = '3e91d7f4a2c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('listening_history',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('played_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('track_id', sa.Text(), nullable=True),
+    sa.Column('track_name', sa.Text(), nullable=False),
+    sa.Column('artists', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'played_at')
+    )
+    op.create_table('listening_history_cursors',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('after_ms', sa.BigInteger(), nullable=True),
+    sa.Column('synced_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('listening_history_cursors')
+    op.drop_table('listening_history')
@@ -0,0 +1,39 @@
+"""meals_unique_name
+
+Revision ID: 6b2f0e9a41d3
+Revises: 9d3f61a7c2e8
+Create Date: 2026-10-19 23:41:07.512934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b2f0e9a41d3'
+down_revision: Union[str, Sequence[str], None] = '9d3f61a7c2e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # older duplicates may be referenced by orders, so they are renamed rather than deleted;
+    # the oldest meal keeps the name that bulk imports upsert on
+    op.execute("""
+        update meals m
+        set name = m.name || ' (' || left(m.id::text, 8) || ')'
+        from (
+            select id, row_number() over (partition by restaurant_id, name order by created_at, id) as n
+            from meals
+        ) d
+        where d.id = m.id and d.n > 1
+    """)
+    op.create_unique_constraint('uq_meals_restaurant_name', 'meals', ['restaurant_id', 'name'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_meals_restaurant_name', 'meals', type_='unique')
@@ -0,0 +1,37 @@
+"""track_moods
+
+Revision ID: 7a2e59c0d3b8
+Revises: 1c6f0b83e5d2
+Create Date: 2026-10-19 17:48:30.215564
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2e59c0d3b8'
+down_revision: Union[str, Sequence[str], None] = '1c6f0b83e5d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('track_moods',
+    sa.Column('track_key', sa.Text(), nullable=False),
+    sa.Column('track_name', sa.Text(), nullable=True),
+    sa.Column('artists', sa.Text(), nullable=True),
+    sa.Column('label', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('track_key')
+    )
+    # per-track labels used to live in the TTL cache table; track_moods owns them now
+    op.execute("delete from mood_analysis_cache where cache_key not like 'set:%'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('track_moods')
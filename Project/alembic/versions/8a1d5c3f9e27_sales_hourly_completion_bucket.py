@@ -0,0 +1,54 @@
+"""sales_hourly_completion_bucket
+
+Revision ID: 8a1d5c3f9e27
+Revises: 2c9e4f7a1b86
+Create Date: 2026-10-20 11:04:58.217630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a1d5c3f9e27'
+down_revision: Union[str, Sequence[str], None] = '2c9e4f7a1b86'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # deleting a meal must not erase the restaurant's sales, so the rollup keeps the name instead of an FK
+    op.drop_constraint('restaurant_sales_hourly_meal_id_fkey', 'restaurant_sales_hourly', type_='foreignkey')
+    op.add_column('restaurant_sales_hourly', sa.Column('meal_name', sa.String(), nullable=True))
+    # rebuild the buckets by completion time (they were seeded by order time)
+    op.execute("delete from restaurant_sales_hourly")
+    op.execute("""
+        insert into restaurant_sales_hourly
+            (restaurant_id, meal_id, bucket_start, meal_name, orders_count, units_sold, revenue, base_value)
+        select o.restaurant_id, oi.meal_id, date_trunc('hour', coalesce(e.completed_at, o.created_at)), m.name,
+               count(distinct o.id), sum(oi.qty), sum(oi.price), sum(m.base_price * oi.qty)
+        from orders o
+        left join (
+            select order_id, max(created_at) as completed_at
+            from order_status_events
+            where status = 'completed'
+            group by order_id
+        ) e on e.order_id = o.id
+        join order_items oi on oi.order_id = o.id
+        join meals m on m.id = oi.meal_id
+        where o.status = 'completed'
+        group by o.restaurant_id, oi.meal_id, date_trunc('hour', coalesce(e.completed_at, o.created_at)), m.name
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("delete from restaurant_sales_hourly s where not exists (select 1 from meals m where m.id = s.meal_id)")
+    op.drop_column('restaurant_sales_hourly', 'meal_name')
+    op.create_foreign_key(
+        'restaurant_sales_hourly_meal_id_fkey', 'restaurant_sales_hourly', 'meals',
+        ['meal_id'], ['id'], ondelete='CASCADE'
+    )
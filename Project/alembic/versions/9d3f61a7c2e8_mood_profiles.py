@@ -0,0 +1,37 @@
+"""mood_profiles
+
+Revision ID: 9d3f61a7c2e8
+Revises: 5f0c8b2d7e14
+Create Date: 2026-10-19 20:14:37.502291
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f61a7c2e8'
+down_revision: Union[str, Sequence[str], None] = '5f0c8b2d7e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('moods', sa.Column('updated_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    # the recommender upserts a single decayed profile row per user
+    op.create_index(
+        'uq_moods_profile_user',
+        'moods',
+        ['user_id'],
+        unique=True,
+        postgresql_where=sa.text("source = 'profile'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_moods_profile_user', table_name='moods', postgresql_where=sa.text("source = 'profile'"))
+    op.drop_column('moods', 'updated_at')
@@ -0,0 +1,44 @@
+"""cart_holds
+
+Revision ID: a3c7e91f2b40
+Revises: 5d14db616523
+Create Date: 2026-10-19 10:02:17.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c7e91f2b40'
+down_revision: Union[str, Sequence[str], None] = '5d14db616523'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('cart_holds',
+    sa.Column('id', sa.UUID(), server_default=sa.text('gen_random_uuid()'), nullable=False),
+    sa.Column('cart_id', sa.UUID(), nullable=False),
+    sa.Column('meal_id', sa.UUID(), nullable=False),
+    sa.Column('qty', sa.Integer(), nullable=False),
+    sa.Column('expires_at', postgresql.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['cart_id'], ['carts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['meal_id'], ['meals.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cart_id', 'meal_id', name='uq_cart_holds_cart_meal')
+    )
+    op.create_index('ix_cart_holds_meal_expires', 'cart_holds', ['meal_id', 'expires_at'], unique=False)
+    op.create_index('ix_cart_holds_expires', 'cart_holds', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cart_holds_expires', table_name='cart_holds')
+    op.drop_index('ix_cart_holds_meal_expires', table_name='cart_holds')
+    op.drop_table('cart_holds')
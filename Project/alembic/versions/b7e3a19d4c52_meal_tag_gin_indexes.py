@@ -0,0 +1,42 @@
+"""meal_tag_gin_indexes
+
+Revision ID: b7e3a19d4c52
+Revises: f2d946b0c7a5
+Create Date: 2026-10-19 15:02:17.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3a19d4c52'
+down_revision: Union[str, Sequence[str], None] = 'f2d946b0c7a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tags/allergens are matched exactly by the catalog filters, so bring
+    # existing rows in line with the lowercase, de-duplicated form the API now writes
+    for col in ('tags', 'allergens'):
+        op.execute(f"""
+            update meals
+            set {col} = (
+                select coalesce(array_agg(distinct lower(btrim(v))), '{{}}')
+                from unnest({col}) as v
+                where btrim(v) <> ''
+            )
+            where {col} is not null
+        """)
+    op.create_index('ix_meals_tags_gin', 'meals', ['tags'], unique=False, postgresql_using='gin')
+    op.create_index('ix_meals_allergens_gin', 'meals', ['allergens'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_meals_allergens_gin', table_name='meals', postgresql_using='gin')
+    op.drop_index('ix_meals_tags_gin', table_name='meals', postgresql_using='gin')
@@ -0,0 +1,53 @@
+"""impact_rollups
+
+Revision ID: c81f4d2a6e93
+Revises: a3c7e91f2b40
+Create Date: 2026-10-19 11:26:53.220871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f4d2a6e93'
+down_revision: Union[str, Sequence[str], None] = 'a3c7e91f2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _impact_columns():
+    return [
+        sa.Column('orders_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('meals_saved', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('food_saved_kg', sa.Numeric(), server_default='0', nullable=False),
+        sa.Column('co2_saved_kg', sa.Numeric(), server_default='0', nullable=False),
+        sa.Column('money_saved', sa.Numeric(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_unique_constraint('uq_sustainability_metrics_order_id', 'sustainability_metrics', ['order_id'])
+    op.create_table('user_impact',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    *_impact_columns(),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('restaurant_impact',
+    sa.Column('restaurant_id', sa.UUID(), nullable=False),
+    *_impact_columns(),
+    sa.ForeignKeyConstraint(['restaurant_id'], ['restaurants.id'], ),
+    sa.PrimaryKeyConstraint('restaurant_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('restaurant_impact')
+    op.drop_table('user_impact')
+    op.drop_constraint('uq_sustainability_metrics_order_id', 'sustainability_metrics', type_='unique')
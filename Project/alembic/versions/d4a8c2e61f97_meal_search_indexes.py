@@ -0,0 +1,33 @@
+"""meal_search_indexes
+
+Revision ID: d4a8c2e61f97
+Revises: b7e3a19d4c52
+Create Date: 2026-10-19 16:20:44.118035
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c2e61f97'
+down_revision: Union[str, Sequence[str], None] = 'b7e3a19d4c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # /catalog/meals/search matches lower(name) like '%q%'; a trigram index
+    # serves that without scanning every meal
+    op.execute("create extension if not exists pg_trgm")
+    op.execute("create index ix_meals_name_trgm on meals using gin (lower(name) gin_trgm_ops)")
+    op.create_index('ix_meals_calories', 'meals', ['calories'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_meals_calories', table_name='meals')
+    op.execute("drop index if exists ix_meals_name_trgm")
@@ -0,0 +1,53 @@
+"""restaurant_sales_hourly
+
+Revision ID: e5b20a7c9d18
+Revises: c81f4d2a6e93
+Create Date: 2026-10-19 12:08:31.447019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b20a7c9d18'
+down_revision: Union[str, Sequence[str], None] = 'c81f4d2a6e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('restaurant_sales_hourly',
+    sa.Column('restaurant_id', sa.UUID(), nullable=False),
+    sa.Column('meal_id', sa.UUID(), nullable=False),
+    sa.Column('bucket_start', sa.TIMESTAMP(), nullable=False),
+    sa.Column('orders_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('units_sold', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('revenue', sa.Numeric(), server_default='0', nullable=False),
+    sa.Column('base_value', sa.Numeric(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['restaurant_id'], ['restaurants.id'], ),
+    sa.ForeignKeyConstraint(['meal_id'], ['meals.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('restaurant_id', 'meal_id', 'bucket_start')
+    )
+    op.create_index('ix_restaurant_sales_hourly_bucket', 'restaurant_sales_hourly', ['restaurant_id', 'bucket_start'], unique=False)
+    # seed the rollup from orders completed before it existed
+    op.execute("""
+        insert into restaurant_sales_hourly
+            (restaurant_id, meal_id, bucket_start, orders_count, units_sold, revenue, base_value)
+        select o.restaurant_id, oi.meal_id, date_trunc('hour', o.created_at),
+               count(distinct o.id), sum(oi.qty), sum(oi.price), sum(m.base_price * oi.qty)
+        from orders o
+        join order_items oi on oi.order_id = o.id
+        join meals m on m.id = oi.meal_id
+        where o.status = 'completed'
+        group by o.restaurant_id, oi.meal_id, date_trunc('hour', o.created_at)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_restaurant_sales_hourly_bucket', table_name='restaurant_sales_hourly')
+    op.drop_table('restaurant_sales_hourly')
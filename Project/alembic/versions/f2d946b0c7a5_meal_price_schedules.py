@@ -0,0 +1,42 @@
+"""meal_price_schedules
+
+Revision ID: f2d946b0c7a5
+Revises: e5b20a7c9d18
+Create Date: 2026-10-19 13:41:09.602554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2d946b0c7a5'
+down_revision: Union[str, Sequence[str], None] = 'e5b20a7c9d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('meal_price_schedules',
+    sa.Column('meal_id', sa.UUID(), nullable=False),
+    sa.Column('start_price', sa.Numeric(), nullable=False),
+    sa.Column('step_percent', sa.Numeric(), nullable=False),
+    sa.Column('step_minutes', sa.Integer(), nullable=False),
+    sa.Column('floor_price', sa.Numeric(), nullable=False),
+    sa.Column('starts_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('ends_at', postgresql.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.CheckConstraint('step_minutes > 0', name='ck_meal_price_schedules_step_minutes'),
+    sa.CheckConstraint('step_percent > 0 and step_percent <= 100', name='ck_meal_price_schedules_step_percent'),
+    sa.ForeignKeyConstraint(['meal_id'], ['meals.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('meal_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('meal_price_schedules')
@@ -0,0 +1,36 @@
+# app/analytics.py
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+
+
+async def record_order_sales(db: AsyncSession, order_id: str):
+    """
+    Adds a completed order's items to the restaurant_sales_hourly rollup
+    (one row per restaurant, meal and UTC hour of completion), on the
+    caller's transaction. Owner analytics read only these buckets. The meal
+    name is copied in so the history outlives the meal.
+    """
+    q = text("""
+        insert into restaurant_sales_hourly as s
+            (restaurant_id, meal_id, bucket_start, meal_name, orders_count, units_sold, revenue, base_value)
+        select o.restaurant_id,
+               oi.meal_id,
+               date_trunc('hour', now() at time zone 'utc'),
+               m.name,
+               count(distinct o.id),
+               sum(oi.qty),
+               sum(oi.price),
+               sum(m.base_price * oi.qty)
+        from orders o
+        join order_items oi on oi.order_id = o.id
+        join meals m on m.id = oi.meal_id
+        where o.id = :oid
+        group by o.restaurant_id, oi.meal_id, m.name
+        on conflict (restaurant_id, meal_id, bucket_start) do update set
+            meal_name = excluded.meal_name,
+            orders_count = s.orders_count + excluded.orders_count,
+            units_sold = s.units_sold + excluded.units_sold,
+            revenue = s.revenue + excluded.revenue,
+            base_value = s.base_value + excluded.base_value
+    """)
+    await db.execute(q, {"oid": order_id})
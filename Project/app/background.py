@@ -0,0 +1,102 @@
+# app/background.py
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class PeriodicJob:
+    """
+    Runs an async callable every `interval` seconds on the event loop.
+
+    The callable returns how many rows it processed in that pass; we keep
+    a few counters (runs, errors, last batch size, last duration) so the
+    sweepers can be observed via /debug/jobs.
+    """
+
+    def __init__(self, name: str, fn: Callable[[], Awaitable[int]], interval: float):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.runs = 0
+        self.errors = 0
+        self.total_processed = 0
+        self.last_batch_size = 0
+        self.last_duration_ms = 0.0
+        self.last_run_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        start = time.perf_counter()
+        processed = 0
+        try:
+            processed = int(await self.fn() or 0)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Background job {self.name} failed: {str(e)}", exc_info=True)
+        finally:
+            self.runs += 1
+            self.last_duration_ms = (time.perf_counter() - start) * 1000
+            self.last_run_at = time.time()
+        self.last_batch_size = processed
+        self.total_processed += processed
+        if processed:
+            logging.info(
+                f"Background job {self.name} processed {processed} rows in {self.last_duration_ms:.1f} ms"
+            )
+        return processed
+
+    async def _loop(self):
+        while True:
+            await self.run_once()
+            # jitter so several uvicorn workers don't sweep in lock-step
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop(), name=f"job:{self.name}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "running": self._task is not None and not self._task.done(),
+            "runs": self.runs,
+            "errors": self.errors,
+            "total_processed": self.total_processed,
+            "last_batch_size": self.last_batch_size,
+            "last_duration_ms": round(self.last_duration_ms, 2),
+            "last_run_at": self.last_run_at,
+        }
+
+
+_jobs: Dict[str, PeriodicJob] = {}
+
+
+def register_job(name: str, fn: Callable[[], Awaitable[int]], interval: float) -> PeriodicJob:
+    job = PeriodicJob(name, fn, interval)
+    _jobs[name] = job
+    return job
+
+
+def start_jobs():
+    for job in _jobs.values():
+        job.start()
+
+
+async def stop_jobs():
+    for job in _jobs.values():
+        await job.stop()
+
+
+def job_stats() -> Dict[str, dict]:
+    return {name: job.stats() for name, job in _jobs.items()}
@@ -27,6 +27,29 @@ class Settings(BaseSettings):
     AWS_REGION: str = "auto"
     S3_BUCKET_NAME: Optional[str] = None
 
+    # Background jobs (sweepers started from the FastAPI startup hook)
+    BACKGROUND_JOBS_ENABLED: bool = True
+    PENDING_ORDER_TTL_MINUTES: int = 30
+    ORDER_SWEEP_INTERVAL_SECONDS: int = 60
+    ORDER_SWEEP_BATCH_SIZE: int = 100
+
+    # Cart soft reservations ("holds") on surplus meals
+    CART_HOLDS_ENABLED: bool = False
+    CART_HOLD_MINUTES: int = 10
+    CART_HOLD_SWEEP_INTERVAL_SECONDS: int = 60
+    CART_HOLD_SWEEP_BATCH_SIZE: int = 500
+
+    # Scheduled surplus price drops (materialized into meals.surplus_price)
+    PRICE_SCHEDULE_INTERVAL_SECONDS: int = 60
+    PRICE_SCHEDULE_BATCH_SIZE: int = 500
+
+    # Owner role/restaurant lookups are cached per user for this long
+    OWNER_CONTEXT_TTL_SECONDS: int = 60
+
+    # Sustainability estimates (per rescued surplus portion)
+    MEAL_PORTION_KG: float = 0.4
+    CO2_KG_PER_FOOD_KG: float = 2.5
+
     # Derived (not read from env)
     ASYNC_DATABASE_URL: Optional[str] = None  # computed from DATABASE_URL
 
@@ -0,0 +1,93 @@
+# app/impact.py
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from .config import settings
+
+IMPACT_FIELDS = ("orders_count", "meals_saved", "food_saved_kg", "co2_saved_kg", "money_saved")
+
+
+async def record_order_impact(db: AsyncSession, order_id: str):
+    """
+    Writes the per-order sustainability_metrics row for a completed order and
+    folds it into the user_impact / restaurant_impact rollups, all in one
+    statement on the caller's transaction (caller commits).
+
+    Only surplus items count as rescued food. Weight is estimated per portion
+    (MEAL_PORTION_KG), CO2 from weight (CO2_KG_PER_FOOD_KG), and money saved is
+    what the customer didn't pay versus base_price.
+    The insert is a no-op if metrics already exist for the order, so the
+    rollups are never double counted.
+    """
+    q = text("""
+        with per_order as (
+            select o.id as order_id,
+                   o.user_id,
+                   o.restaurant_id,
+                   coalesce(sum(oi.qty) filter (where m.surplus_price is not null), 0) as meals_saved,
+                   coalesce(sum(greatest(m.base_price * oi.qty - oi.price, 0))
+                            filter (where m.surplus_price is not null), 0) as money_saved
+            from orders o
+            join order_items oi on oi.order_id = o.id
+            join meals m on m.id = oi.meal_id
+            where o.id = :oid
+            group by o.id, o.user_id, o.restaurant_id
+        ),
+        metric as (
+            insert into sustainability_metrics (order_id, food_saved_kg, co2_saved_kg, money_saved)
+            select order_id,
+                   meals_saved * :portion_kg,
+                   meals_saved * :portion_kg * :co2_factor,
+                   money_saved
+            from per_order
+            on conflict (order_id) do nothing
+            returning order_id, food_saved_kg, co2_saved_kg, money_saved
+        ),
+        delta as (
+            select p.user_id, p.restaurant_id, p.meals_saved,
+                   mt.food_saved_kg, mt.co2_saved_kg, mt.money_saved
+            from metric mt
+            join per_order p on p.order_id = mt.order_id
+        ),
+        user_upd as (
+            insert into user_impact as ui
+                (user_id, orders_count, meals_saved, food_saved_kg, co2_saved_kg, money_saved, updated_at)
+            select user_id, 1, meals_saved, food_saved_kg, co2_saved_kg, money_saved, now()
+            from delta
+            on conflict (user_id) do update set
+                orders_count = ui.orders_count + 1,
+                meals_saved = ui.meals_saved + excluded.meals_saved,
+                food_saved_kg = ui.food_saved_kg + excluded.food_saved_kg,
+                co2_saved_kg = ui.co2_saved_kg + excluded.co2_saved_kg,
+                money_saved = ui.money_saved + excluded.money_saved,
+                updated_at = now()
+        )
+        insert into restaurant_impact as ri
+            (restaurant_id, orders_count, meals_saved, food_saved_kg, co2_saved_kg, money_saved, updated_at)
+        select restaurant_id, 1, meals_saved, food_saved_kg, co2_saved_kg, money_saved, now()
+        from delta
+        on conflict (restaurant_id) do update set
+            orders_count = ri.orders_count + 1,
+            meals_saved = ri.meals_saved + excluded.meals_saved,
+            food_saved_kg = ri.food_saved_kg + excluded.food_saved_kg,
+            co2_saved_kg = ri.co2_saved_kg + excluded.co2_saved_kg,
+            money_saved = ri.money_saved + excluded.money_saved,
+            updated_at = now()
+    """)
+    await db.execute(q, {
+        "oid": order_id,
+        "portion_kg": settings.MEAL_PORTION_KG,
+        "co2_factor": settings.CO2_KG_PER_FOOD_KG,
+    })
+
+
+async def get_user_impact(db: AsyncSession, user_id: str) -> dict:
+    """Reads the precomputed rollup row for a user (zeros if they have none yet)."""
+    q = text("""
+        select orders_count, meals_saved, food_saved_kg, co2_saved_kg, money_saved, updated_at
+        from user_impact
+        where user_id = :uid
+    """)
+    row = (await db.execute(q, {"uid": user_id})).mappings().first()
+    if not row:
+        return {**{f: 0 for f in IMPACT_FIELDS}, "updated_at": None}
+    return dict(row)
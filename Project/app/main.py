@@ -1,23 +1,42 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
+from .background import register_job, start_jobs, stop_jobs
+from .pricing import sweep_scheduled_prices
 from .routers import meals, catalog, orders, debug_auth, auth_routes, me, address, cart, s3
 from .owner_meals import router as owner_meals_router
 from .owner_meals import restaurant
+from .owner_meals import analytics as owner_analytics
 import sys
 from Mood2FoodRecSys.Spotify_Auth import router as spotify_router
 from Mood2FoodRecSys.RecSys import router as recsys_router
+from Mood2FoodRecSys import listening_history, mood_cache, spotify_tokens
+from Mood2FoodRecSys.spotify_client import close_http_client
 from database.database import database
 
 app = FastAPI(title="VibeDish API", version="0.1.0")
 
+# Background sweepers
+register_job("expire_pending_orders", orders.sweep_stale_orders, settings.ORDER_SWEEP_INTERVAL_SECONDS)
+register_job("materialize_price_schedules", sweep_scheduled_prices, settings.PRICE_SCHEDULE_INTERVAL_SECONDS)
+register_job("purge_mood_cache", mood_cache.purge_expired, mood_cache.MOOD_CACHE_PURGE_INTERVAL_SECONDS)
+register_job("purge_listening_history", listening_history.purge_old, listening_history.LISTENING_HISTORY_PURGE_INTERVAL_SECONDS)
+if spotify_tokens.SPOTIFY_TOKEN_REFRESH_INTERVAL_SECONDS:
+    register_job("refresh_spotify_tokens", spotify_tokens.refresh_expiring, spotify_tokens.SPOTIFY_TOKEN_REFRESH_INTERVAL_SECONDS)
+if settings.CART_HOLDS_ENABLED:
+    register_job("release_cart_holds", cart.sweep_expired_holds, settings.CART_HOLD_SWEEP_INTERVAL_SECONDS)
+
 # Database lifecycle events
 @app.on_event("startup")
 async def startup():
     await database.connect()
+    if settings.BACKGROUND_JOBS_ENABLED:
+        start_jobs()
 
 @app.on_event("shutdown")
 async def shutdown():
+    await stop_jobs()
+    await close_http_client()
     await database.disconnect()
 
 app.add_middleware(
@@ -43,6 +62,7 @@ app.include_router(orders.router, prefix="/orders", tags=["orders"])
 app.include_router(debug_auth.router, prefix="/debug", tags=["debug"])
 app.include_router(owner_meals_router.router, prefix="/owner/meals", tags=["owner-meals"])
 app.include_router(restaurant.router, prefix="/owner/restaurant", tags=["owner-restaurant"])
+app.include_router(owner_analytics.router, prefix="/owner/analytics", tags=["owner-analytics"])
 app.include_router(s3.router)
 app.include_router(spotify_router)
 app.include_router(recsys_router)
\ No newline at end of file
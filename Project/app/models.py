@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Integer, Numeric, Boolean, Text, ForeignKey, Enum, TIMESTAMP, JSON, Float
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, BigInteger, Numeric, Boolean, Text, ForeignKey, Enum, TIMESTAMP, JSON, Float, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 import enum
 
 Base = declarative_base()
@@ -39,18 +39,34 @@ class Restaurant(Base):
 
 class Meal(Base):
     __tablename__ = "meals"
+    __table_args__ = (
+        Index("ix_meals_tags_gin", "tags", postgresql_using="gin"),
+        Index("ix_meals_calories", "calories"),
+        UniqueConstraint("restaurant_id", "name", name="uq_meals_restaurant_name"),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
     restaurant_id = Column(UUID(as_uuid=True), ForeignKey("restaurants.id"), nullable=False)
     name = Column(Text, nullable=False)
-    tags = Column(Text)
+    tags = Column(ARRAY(Text))
     base_price = Column(Numeric, nullable=False)
     quantity = Column(Integer)
     surplus_price = Column(Numeric)
-    allergens = Column(Text)
+    allergens = Column(ARRAY(Text))
     calories = Column(Integer)
     created_at = Column(TIMESTAMP, server_default=func.now())
     image_link = Column(String)
 
+class MealPriceSchedule(Base):
+    __tablename__ = "meal_price_schedules"
+    meal_id = Column(UUID(as_uuid=True), ForeignKey("meals.id", ondelete="CASCADE"), primary_key=True)
+    start_price = Column(Numeric, nullable=False)
+    step_percent = Column(Numeric, nullable=False)
+    step_minutes = Column(Integer, nullable=False)
+    floor_price = Column(Numeric, nullable=False)
+    starts_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    ends_at = Column(TIMESTAMP(timezone=True))
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
 class Address(Base):
     __tablename__ = "addresses"
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
@@ -78,6 +94,20 @@ class CartItem(Base):
     qty = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
 
+class CartHold(Base):
+    __tablename__ = "cart_holds"
+    __table_args__ = (
+        UniqueConstraint("cart_id", "meal_id", name="uq_cart_holds_cart_meal"),
+        Index("ix_cart_holds_meal_expires", "meal_id", "expires_at"),
+        Index("ix_cart_holds_expires", "expires_at"),
+    )
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
+    cart_id = Column(UUID(as_uuid=True), ForeignKey("carts.id", ondelete="CASCADE"), nullable=False)
+    meal_id = Column(UUID(as_uuid=True), ForeignKey("meals.id", ondelete="CASCADE"), nullable=False)
+    qty = Column(Integer, nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
 class Order(Base):
     __tablename__ = "orders"
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
@@ -110,12 +140,46 @@ class RestaurantStaff(Base):
 
 class Mood(Base):
     __tablename__ = "moods"
+    __table_args__ = (
+        # one maintained profile row per user (see Mood2FoodRecSys/mood_profile.py)
+        Index("uq_moods_profile_user", "user_id", unique=True, postgresql_where=text("source = 'profile'")),
+    )
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     label = Column(Text)
     vector = Column(JSON)
     source = Column(Text)
     created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP(timezone=True))
+
+class MoodAnalysisCache(Base):
+    __tablename__ = "mood_analysis_cache"
+    cache_key = Column(Text, primary_key=True)
+    result = Column(JSON, nullable=False)
+    expires_at = Column(TIMESTAMP, nullable=False, index=True)
+
+class TrackMood(Base):
+    __tablename__ = "track_moods"
+    track_key = Column(Text, primary_key=True)
+    track_name = Column(Text)
+    artists = Column(Text)
+    label = Column(JSON, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+class ListeningHistory(Base):
+    __tablename__ = "listening_history"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    played_at = Column(TIMESTAMP(timezone=True), primary_key=True)
+    track_id = Column(Text)
+    track_name = Column(Text, nullable=False)
+    artists = Column(Text)
+
+class ListeningHistoryCursor(Base):
+    __tablename__ = "listening_history_cursors"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    # Spotify `after` cursor (unix ms of the newest play already stored)
+    after_ms = Column(BigInteger)
+    synced_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
 class UserPreference(Base):
     __tablename__ = "users_preferences"
@@ -128,16 +192,49 @@ class UserPreference(Base):
 class UserSpotifyAuthToken(Base):
     __tablename__ = "users_spotify_auth_tokens"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, unique=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
     access_token = Column(String)
     refresh_token = Column(String)
     expires_at = Column(Integer)
+    refreshing_until = Column(TIMESTAMP(timezone=True))
 
 class SustainabilityMetric(Base):
     __tablename__ = "sustainability_metrics"
     id = Column(UUID(as_uuid=True), primary_key=True, server_default=func.gen_random_uuid())
-    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id"), nullable=False)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id"), nullable=False, unique=True)
     food_saved_kg = Column(Numeric)
     co2_saved_kg = Column(Numeric)
     money_saved = Column(Numeric)
+
+class UserImpact(Base):
+    __tablename__ = "user_impact"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    orders_count = Column(Integer, nullable=False, server_default="0")
+    meals_saved = Column(Integer, nullable=False, server_default="0")
+    food_saved_kg = Column(Numeric, nullable=False, server_default="0")
+    co2_saved_kg = Column(Numeric, nullable=False, server_default="0")
+    money_saved = Column(Numeric, nullable=False, server_default="0")
+    updated_at = Column(TIMESTAMP, server_default=func.now())
+
+class RestaurantImpact(Base):
+    __tablename__ = "restaurant_impact"
+    restaurant_id = Column(UUID(as_uuid=True), ForeignKey("restaurants.id"), primary_key=True)
+    orders_count = Column(Integer, nullable=False, server_default="0")
+    meals_saved = Column(Integer, nullable=False, server_default="0")
+    food_saved_kg = Column(Numeric, nullable=False, server_default="0")
+    co2_saved_kg = Column(Numeric, nullable=False, server_default="0")
+    money_saved = Column(Numeric, nullable=False, server_default="0")
+    updated_at = Column(TIMESTAMP, server_default=func.now())
+
+class RestaurantSalesHourly(Base):
+    __tablename__ = "restaurant_sales_hourly"
+    restaurant_id = Column(UUID(as_uuid=True), ForeignKey("restaurants.id"), primary_key=True)
+    # no FK: sales history stays when a meal is deleted
+    meal_id = Column(UUID(as_uuid=True), primary_key=True)
+    bucket_start = Column(TIMESTAMP, primary_key=True)
+    meal_name = Column(String)
+    orders_count = Column(Integer, nullable=False, server_default="0")
+    units_sold = Column(Integer, nullable=False, server_default="0")
+    revenue = Column(Numeric, nullable=False, server_default="0")
+    base_value = Column(Numeric, nullable=False, server_default="0")
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from .auth import require_owner_restaurant
+from database.database import database
+
+router = APIRouter()
+
+GRANULARITIES = {"hour": "hour", "day": "day"}
+
+
+def _utc_naive(dt: datetime) -> datetime:
+    # rollup buckets are stored as UTC timestamps without time zone
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _window(since: Optional[datetime], until: Optional[datetime], default_days: int = 7):
+    until = _utc_naive(until) if until else datetime.now(timezone.utc).replace(tzinfo=None)
+    since = _utc_naive(since) if since else until - timedelta(days=default_days)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    return since, until
+
+
+def _recovery_rate(revenue, base_value) -> Optional[float]:
+    return round(float(revenue) / float(base_value), 4) if base_value else None
+
+
+@router.get("/sales")
+async def sales_over_time(
+    granularity: str = Query(default="hour", description="one of: hour,day"),
+    since: Optional[datetime] = Query(default=None, description="defaults to 7 days before until"),
+    until: Optional[datetime] = Query(default=None, description="defaults to now"),
+    owner: dict = Depends(require_owner_restaurant),
+):
+    """
+    Units sold and revenue per hour/day for the owner's restaurant,
+    read from the hourly rollup (O(buckets), not O(orders)).
+    revenue_recovered is the share of base_price value actually earned.
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be hour or day")
+    since, until = _window(since, until)
+    restaurant_id = owner["restaurant_id"]
+
+    q = f"""
+        SELECT date_trunc('{GRANULARITIES[granularity]}', bucket_start) AS bucket,
+               SUM(orders_count) AS orders_count,
+               SUM(units_sold) AS units_sold,
+               SUM(revenue) AS revenue,
+               SUM(base_value) AS base_value
+        FROM restaurant_sales_hourly
+        WHERE restaurant_id = :restaurant_id
+          AND bucket_start >= :since AND bucket_start < :until
+        GROUP BY 1
+        ORDER BY 1
+    """
+    rows = await database.fetch_all(q, {"restaurant_id": restaurant_id, "since": since, "until": until})
+    buckets = []
+    for row in rows:
+        r = dict(row)
+        buckets.append({
+            "bucket": r["bucket"],
+            "orders_count": int(r["orders_count"] or 0),
+            "units_sold": int(r["units_sold"] or 0),
+            "revenue": float(r["revenue"] or 0),
+            "base_value": float(r["base_value"] or 0),
+            "revenue_recovered": _recovery_rate(r["revenue"], r["base_value"]),
+        })
+    return {"granularity": granularity, "since": since, "until": until, "buckets": buckets}
+
+
+@router.get("/meals")
+async def meal_performance(
+    since: Optional[datetime] = Query(default=None, description="defaults to 7 days before until"),
+    until: Optional[datetime] = Query(default=None, description="defaults to now"),
+    owner: dict = Depends(require_owner_restaurant),
+):
+    """
+    Per-meal units sold, revenue and sell-through rate
+    (sold / (sold + surplus still listed)) over the window. Deleted meals
+    that sold in the window are listed under their recorded name.
+    """
+    since, until = _window(since, until)
+    restaurant_id = owner["restaurant_id"]
+
+    q = """
+        SELECT COALESCE(m.id, s.meal_id) AS meal_id, COALESCE(m.name, s.meal_name) AS name, m.quantity,
+               COALESCE(s.units_sold, 0) AS units_sold,
+               COALESCE(s.revenue, 0) AS revenue,
+               COALESCE(s.base_value, 0) AS base_value
+        FROM (SELECT id, name, quantity FROM meals WHERE restaurant_id = :restaurant_id) m
+        FULL JOIN (
+            SELECT meal_id, MAX(meal_name) AS meal_name,
+                   SUM(units_sold) AS units_sold, SUM(revenue) AS revenue, SUM(base_value) AS base_value
+            FROM restaurant_sales_hourly
+            WHERE restaurant_id = :restaurant_id
+              AND bucket_start >= :since AND bucket_start < :until
+            GROUP BY meal_id
+        ) s ON s.meal_id = m.id
+        ORDER BY units_sold DESC, name
+    """
+    rows = await database.fetch_all(q, {"restaurant_id": restaurant_id, "since": since, "until": until})
+    meals = []
+    for row in rows:
+        r = dict(row)
+        sold = int(r["units_sold"] or 0)
+        remaining = int(r["quantity"]) if r["quantity"] is not None else None
+        offered = sold + (remaining or 0)
+        meals.append({
+            "meal_id": str(r["meal_id"]),
+            "name": r["name"],
+            "units_sold": sold,
+            "remaining": remaining,
+            "sell_through_rate": round(sold / offered, 4) if remaining is not None and offered else None,
+            "revenue": float(r["revenue"] or 0),
+            "base_value": float(r["base_value"] or 0),
+            "revenue_recovered": _recovery_rate(r["revenue"], r["base_value"]),
+        })
+    return {"since": since, "until": until, "meals": meals}
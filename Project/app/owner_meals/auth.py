@@ -1,13 +1,73 @@
 from fastapi import Depends, HTTPException
 from ..auth import current_user
+from ..config import settings
 from database.database import database
+from collections import OrderedDict
+from typing import Optional
+import time
 
-async def require_owner(user: dict = Depends(current_user)):
-    q = "SELECT role FROM users WHERE id = :user_id"
-    row = await database.fetch_one(q, {"user_id": user["id"]})
+# user_id -> (expires_at, {"role", "restaurant_id"}); owners with a restaurant only, per process, short TTL
+_owner_cache: "OrderedDict[str, tuple]" = OrderedDict()
+OWNER_CACHE_MAX_ENTRIES = 10000
+
+
+def invalidate_owner_context(user_id: Optional[str] = None):
+    """Drop the cached role/restaurant for a user (or everyone) after it changes."""
+    if user_id is None:
+        _owner_cache.clear()
+    else:
+        _owner_cache.pop(str(user_id), None)
 
+
+async def get_owner_context(user_id: str) -> Optional[dict]:
+    """
+    Resolves the user's role and owned restaurant in one query, cached for
+    OWNER_CONTEXT_TTL_SECONDS so bursts of owner requests skip the lookup.
+    Only owners with a restaurant are cached: a restaurant created or
+    reassigned outside the signup flow must not be answered 403/404 from cache.
+    """
+    key = str(user_id)
+    now = time.monotonic()
+    cached = _owner_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    q = """
+        SELECT u.role, r.id AS restaurant_id
+        FROM users u
+        LEFT JOIN restaurants r ON r.owner_id = u.id
+        WHERE u.id = :user_id
+        LIMIT 1
+    """
+    row = await database.fetch_one(q, {"user_id": key})
     row = dict(row) if row else None
 
-    if not row or row["role"] != "owner":
+    ctx = None
+    if row:
+        restaurant_id = row.get("restaurant_id")
+        ctx = {"role": row["role"], "restaurant_id": str(restaurant_id) if restaurant_id else None}
+
+    if not ctx or ctx["role"] != "owner" or not ctx["restaurant_id"]:
+        _owner_cache.pop(key, None)
+        return ctx
+
+    _owner_cache[key] = (now + settings.OWNER_CONTEXT_TTL_SECONDS, ctx)
+    _owner_cache.move_to_end(key)
+    while len(_owner_cache) > OWNER_CACHE_MAX_ENTRIES:
+        _owner_cache.popitem(last=False)
+    return ctx
+
+
+async def require_owner(user: dict = Depends(current_user)):
+    ctx = await get_owner_context(user["id"])
+    if not ctx or ctx["role"] != "owner":
         raise HTTPException(status_code=403, detail="Owner role required")
     return user
+
+
+async def require_owner_restaurant(user: dict = Depends(require_owner)):
+    """Owner dependency that also carries the owner's restaurant_id."""
+    ctx = await get_owner_context(user["id"])
+    if not ctx or not ctx["restaurant_id"]:
+        raise HTTPException(status_code=404, detail="No restaurant found for this owner")
+    return {**user, "restaurant_id": ctx["restaurant_id"]}
@@ -1,18 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
-from .auth import require_owner
+from .auth import require_owner_restaurant
 from database.database import database
 
 router = APIRouter()
 
 @router.get("")
-async def get_my_restaurant(user: dict = Depends(require_owner)):
+async def get_my_restaurant(owner: dict = Depends(require_owner_restaurant)):
     try:
         q = """
             SELECT name, address
             FROM restaurants
-            WHERE owner_id = :user_id
+            WHERE id = :restaurant_id
         """
-        row = await database.fetch_one(q, {"user_id": user["id"]})
+        row = await database.fetch_one(q, {"restaurant_id": owner["restaurant_id"]})
         
         if not row:
             raise HTTPException(status_code=404, detail="No restaurant found for this owner")
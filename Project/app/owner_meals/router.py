@@ -1,39 +1,137 @@
-from fastapi import APIRouter, Depends
-from .schemas import MealCreate, MealUpdate, MealResponse
-from .auth import require_owner
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import ValidationError
+from .schemas import MealCreate, MealUpdate, MealResponse, PriceScheduleCreate, PriceScheduleResponse
+from .auth import require_owner_restaurant
 from . import service
 from typing import List
+import csv
+import io
+import json
 
 router = APIRouter()
 
+MAX_BULK_ROWS = 500
+LIST_FIELDS = ("tags", "allergens")
+
+
+def _csv_rows(body: str) -> List[dict]:
+    """CSV with a header row; empty cells are omitted, list fields split on ';'."""
+    rows = []
+    for raw in csv.DictReader(io.StringIO(body)):
+        row = {}
+        for key, value in raw.items():
+            if key is None or value is None:
+                continue
+            key, value = key.strip(), value.strip()
+            if not value:
+                continue
+            row[key] = [v.strip() for v in value.split(";") if v.strip()] if key in LIST_FIELDS else value
+        rows.append(row)
+    return rows
+
 @router.post("", response_model=MealResponse, status_code=201)
 async def add_meal(
     meal: MealCreate,
-    user: dict = Depends(require_owner)
+    owner: dict = Depends(require_owner_restaurant)
 ):
-    restaurant_id = await service.get_restaurant_by_owner(user["id"])
+    restaurant_id = owner["restaurant_id"]
     return await service.create_meal(restaurant_id, meal)
 
+@router.post("/bulk")
+async def bulk_upsert_meals(
+    request: Request,
+    owner: dict = Depends(require_owner_restaurant)
+):
+    """
+    Create or update many meals at once, matched by name.
+    Body is JSON (a list, or {"meals": [...]}) or CSV (Content-Type: text/csv).
+    Each row is validated with MealCreate; invalid rows are reported and
+    skipped, the rest are written in one transaction.
+    """
+    body = await request.body()
+    try:
+        if "csv" in request.headers.get("content-type", ""):
+            rows = _csv_rows(body.decode("utf-8-sig"))
+        else:
+            data = json.loads(body or b"null")
+            rows = data.get("meals") if isinstance(data, dict) else data
+    except (UnicodeDecodeError, ValueError, csv.Error):
+        raise HTTPException(status_code=400, detail="Could not parse bulk meal payload")
+
+    if not isinstance(rows, list) or not rows:
+        raise HTTPException(status_code=400, detail="Expected a non-empty list of meals")
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ROWS} meals per request")
+
+    results = [None] * len(rows)
+    valid, valid_rows, seen = [], [], set()
+    for i, raw in enumerate(rows):
+        try:
+            meal = MealCreate.model_validate(raw)
+        except ValidationError as e:
+            errors = [f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()]
+            results[i] = {"row": i, "status": "error", "errors": errors}
+            continue
+        if meal.name in seen:
+            results[i] = {"row": i, "name": meal.name, "status": "error", "errors": ["duplicate name in payload"]}
+            continue
+        seen.add(meal.name)
+        valid.append(meal)
+        valid_rows.append(i)
+
+    if valid:
+        restaurant_id = owner["restaurant_id"]
+        written = await service.bulk_upsert_meals(restaurant_id, valid)
+        for i, meal, out in zip(valid_rows, valid, written):
+            results[i] = {"row": i, "name": meal.name, **out}
+
+    statuses = [r["status"] for r in results]
+    return {
+        "created": statuses.count("created"),
+        "updated": statuses.count("updated"),
+        "failed": statuses.count("error"),
+        "results": results,
+    }
+
 @router.put("/{meal_id}", response_model=MealResponse)
 async def modify_meal(
     meal_id: str,
     meal: MealUpdate,
-    user: dict = Depends(require_owner)
+    owner: dict = Depends(require_owner_restaurant)
 ):
-    restaurant_id = await service.get_restaurant_by_owner(user["id"])
+    restaurant_id = owner["restaurant_id"]
     return await service.update_meal(meal_id, restaurant_id, meal)
 
 @router.delete("/{meal_id}", status_code=204)
 async def remove_meal(
     meal_id: str,
-    user: dict = Depends(require_owner)
+    owner: dict = Depends(require_owner_restaurant)
 ):
-    restaurant_id = await service.get_restaurant_by_owner(user["id"])
+    restaurant_id = owner["restaurant_id"]
     await service.delete_meal(meal_id, restaurant_id)
 
+@router.put("/{meal_id}/price-schedule", response_model=PriceScheduleResponse)
+async def set_price_schedule(
+    meal_id: str,
+    schedule: PriceScheduleCreate,
+    owner: dict = Depends(require_owner_restaurant)
+):
+    """
+    Drop the surplus price by step_percent every step_minutes until ends_at,
+    never below floor_price. While attached, the schedule owns surplus_price.
+    """
+    return await service.set_price_schedule(meal_id, owner["restaurant_id"], schedule)
+
+@router.delete("/{meal_id}/price-schedule", status_code=204)
+async def remove_price_schedule(
+    meal_id: str,
+    owner: dict = Depends(require_owner_restaurant)
+):
+    await service.delete_price_schedule(meal_id, owner["restaurant_id"])
+
 @router.get("", response_model=List[MealResponse])
 async def list_my_meals(
-    user: dict = Depends(require_owner)
+    owner: dict = Depends(require_owner_restaurant)
 ):
-    restaurant_id = await service.get_restaurant_by_owner(user["id"])
+    restaurant_id = owner["restaurant_id"]
     return await service.get_restaurant_meals(restaurant_id)
@@ -1,5 +1,17 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Optional, List
+from datetime import datetime
+
+def _normalize_labels(values: Optional[List[str]]) -> Optional[List[str]]:
+    # tags/allergens are matched exactly by the catalog filters, so store them trimmed, lowercase, once each
+    if values is None:
+        return None
+    out = []
+    for v in values:
+        v = v.strip().lower()
+        if v and v not in out:
+            out.append(v)
+    return out
 
 class MealCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=200)
@@ -11,6 +23,8 @@ class MealCreate(BaseModel):
     calories: Optional[int] = Field(None, ge=0)
     image_link: Optional[str] = None
 
+    _labels = field_validator("tags", "allergens")(_normalize_labels)
+
 class MealUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=200)
     tags: Optional[List[str]] = None
@@ -21,6 +35,8 @@ class MealUpdate(BaseModel):
     calories: Optional[int] = Field(None, ge=0)
     image_link: Optional[str] = None
 
+    _labels = field_validator("tags", "allergens")(_normalize_labels)
+
 class MealResponse(BaseModel):
     id: str
     restaurant_id: str
@@ -32,3 +48,29 @@ class MealResponse(BaseModel):
     allergens: Optional[List[str]]
     calories: Optional[int]
     image_link: Optional[str]
+
+class PriceScheduleCreate(BaseModel):
+    step_percent: float = Field(..., gt=0, le=100)
+    step_minutes: int = Field(..., gt=0)
+    floor_price: float = Field(..., ge=0)
+    start_price: Optional[float] = Field(None, gt=0)
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def _check_bounds(self):
+        if self.start_price is not None and self.floor_price > self.start_price:
+            raise ValueError("floor_price must not exceed start_price")
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValueError("ends_at must be after starts_at")
+        return self
+
+class PriceScheduleResponse(BaseModel):
+    meal_id: str
+    start_price: float
+    step_percent: float
+    step_minutes: int
+    floor_price: float
+    starts_at: datetime
+    ends_at: Optional[datetime]
+    current_price: float
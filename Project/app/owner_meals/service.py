@@ -1,13 +1,16 @@
+from asyncpg.exceptions import UniqueViolationError
 from fastapi import HTTPException
 from database.database import database
-from .schemas import MealCreate, MealUpdate
+from .schemas import MealCreate, MealUpdate, PriceScheduleCreate
+from app.pricing import scheduled_price
+from Mood2FoodRecSys.mood_cache import invalidate_restaurant
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Tuple
 
-async def get_restaurant_by_owner(user_id: str) -> str:
-    q = "SELECT id FROM restaurants WHERE owner_id = :user_id"
-    row = await database.fetch_one(q, {"user_id": user_id})
-    if not row:
-        raise HTTPException(status_code=404, detail="No restaurant found for this owner")
-    return str(row["id"])
+MEAL_COLUMNS = ("name", "tags", "base_price", "quantity", "surplus_price", "allergens", "calories", "image_link")
+MEAL_RETURNING = "id, restaurant_id, name, tags, base_price, quantity, surplus_price, allergens, calories, image_link"
+DUPLICATE_NAME = "Your restaurant already has a meal with this name"
 
 async def create_meal(restaurant_id: str, meal: MealCreate):
     q = """
@@ -15,81 +18,64 @@ async def create_meal(restaurant_id: str, meal: MealCreate):
         VALUES (:restaurant_id, :name, :tags, :base_price, :quantity, :surplus_price, :allergens, :calories, :image_link)
         RETURNING id, restaurant_id, name, tags, base_price, quantity, surplus_price, allergens, calories, image_link
     """
-    row = await database.fetch_one(q, {
-        "restaurant_id": str(restaurant_id),
-        "name": meal.name,
-        "tags": meal.tags, 
-        "base_price": meal.base_price,
-        "quantity": meal.quantity,
-        "surplus_price": meal.surplus_price,
-        "allergens": meal.allergens,
-        "calories": meal.calories,
-        "image_link": meal.image_link
-    })
+    try:
+        row = await database.fetch_one(q, {
+            "restaurant_id": str(restaurant_id),
+            "name": meal.name,
+            "tags": meal.tags, 
+            "base_price": meal.base_price,
+            "quantity": meal.quantity,
+            "surplus_price": meal.surplus_price,
+            "allergens": meal.allergens,
+            "calories": meal.calories,
+            "image_link": meal.image_link
+        })
+    except UniqueViolationError:
+        raise HTTPException(status_code=409, detail=DUPLICATE_NAME)
+    invalidate_restaurant(restaurant_id)
     result = dict(row)
     result["id"] = str(result["id"])
     result["restaurant_id"] = str(result["restaurant_id"])
     return result
 
+@lru_cache(maxsize=None)
+def _update_statement(fields: Tuple[str, ...]) -> str:
+    # one statement per field mask (at most 2**8), built once and reused
+    return f"""
+        UPDATE meals SET {', '.join(f'{f} = :{f}' for f in fields)}
+        WHERE id = :meal_id AND restaurant_id = :restaurant_id
+        RETURNING {MEAL_RETURNING}
+    """
+
 async def update_meal(meal_id: str, restaurant_id: str, meal: MealUpdate):
-    check = await database.fetch_one(
-        "SELECT id FROM meals WHERE id = :meal_id AND restaurant_id = :restaurant_id",
-        {"meal_id": meal_id, "restaurant_id": restaurant_id}
-    )
-    if not check:
-        raise HTTPException(status_code=404, detail="Meal not found or not owned by your restaurant")
-    
-    updates = []
-    params = {"meal_id": meal_id}
-    
-    if meal.name is not None:
-        updates.append("name = :name")
-        params["name"] = meal.name
-    if meal.tags is not None:
-        updates.append("tags = :tags")
-        params["tags"] = meal.tags
-    if meal.base_price is not None:
-        updates.append("base_price = :base_price")
-        params["base_price"] = meal.base_price
-    if meal.quantity is not None:
-        updates.append("quantity = :quantity")
-        params["quantity"] = meal.quantity
-    if meal.surplus_price is not None:
-        updates.append("surplus_price = :surplus_price")
-        params["surplus_price"] = meal.surplus_price
-    if meal.allergens is not None:
-        updates.append("allergens = :allergens")
-        params["allergens"] = meal.allergens
-    if meal.calories is not None:
-        updates.append("calories = :calories")
-        params["calories"] = meal.calories
-    if meal.image_link is not None:
-        updates.append("image_link = :image_link")
-        params["image_link"] = meal.image_link
-    
-    if not updates:
+    values = meal.model_dump(exclude_none=True)
+    fields = tuple(c for c in MEAL_COLUMNS if c in values)
+    if not fields:
         raise HTTPException(status_code=400, detail="No fields to update")
-    
-    q = f"""
-        UPDATE meals SET {', '.join(updates)}
-        WHERE id = :meal_id
-        RETURNING id, restaurant_id, name, tags, base_price, quantity, surplus_price, allergens, calories, image_link
-    """
-    row = await database.fetch_one(q, params)
+
+    try:
+        row = await database.fetch_one(
+            _update_statement(fields),
+            {**{f: values[f] for f in fields}, "meal_id": meal_id, "restaurant_id": restaurant_id}
+        )
+    except UniqueViolationError:
+        raise HTTPException(status_code=409, detail=DUPLICATE_NAME)
+    if not row:
+        raise HTTPException(status_code=404, detail="Meal not found or not owned by your restaurant")
+    invalidate_restaurant(restaurant_id)
     result = dict(row)
     result["id"] = str(result["id"])
     result["restaurant_id"] = str(result["restaurant_id"])
     return result
 
 async def delete_meal(meal_id: str, restaurant_id: str):
-    check = await database.fetch_one(
-        "SELECT id FROM meals WHERE id = :meal_id AND restaurant_id = :restaurant_id",
+    row = await database.fetch_one(
+        "DELETE FROM meals WHERE id = :meal_id AND restaurant_id = :restaurant_id RETURNING id",
         {"meal_id": meal_id, "restaurant_id": restaurant_id}
     )
-    if not check:
+    if not row:
         raise HTTPException(status_code=404, detail="Meal not found or not owned by your restaurant")
-    
-    await database.execute("DELETE FROM meals WHERE id = :meal_id", {"meal_id": meal_id})
+    invalidate_restaurant(restaurant_id)
 
 async def get_restaurant_meals(restaurant_id: str):
     q = """
@@ -100,3 +86,112 @@ async def get_restaurant_meals(restaurant_id: str):
     """
     rows = await database.fetch_all(q, {"restaurant_id": restaurant_id})
     return [{**dict(row), "id": str(row["id"]), "restaurant_id": str(row["restaurant_id"])} for row in rows]
+
+async def bulk_upsert_meals(restaurant_id: str, meals: List[MealCreate]):
+    """
+    Upserts meals by name for one restaurant in one multi-row
+    INSERT ... ON CONFLICT (restaurant_id, name) DO UPDATE, so concurrent
+    imports of the same names update one row instead of duplicating it.
+    Returns the written rows in input order with status created/updated.
+    """
+    if not meals:
+        return []
+
+    values = []
+    params = {"restaurant_id": restaurant_id}
+    for i, meal in enumerate(meals):
+        values.append(f"(:restaurant_id, {', '.join(f':{c}_{i}' for c in MEAL_COLUMNS)})")
+        for c in MEAL_COLUMNS:
+            params[f"{c}_{i}"] = getattr(meal, c)
+
+    # xmax is 0 only on a freshly inserted row version
+    q = f"""
+        INSERT INTO meals (restaurant_id, {', '.join(MEAL_COLUMNS)})
+        VALUES {', '.join(values)}
+        ON CONFLICT (restaurant_id, name) DO UPDATE
+        SET {', '.join(f'{c} = EXCLUDED.{c}' for c in MEAL_COLUMNS if c != 'name')}
+        RETURNING {MEAL_RETURNING}, (xmax = 0) AS inserted
+    """
+    rows = await database.fetch_all(q, params)
+    invalidate_restaurant(restaurant_id)
+
+    by_name = {row["name"]: dict(row) for row in rows}
+    results = []
+    for meal in meals:
+        row = by_name[meal.name]
+        inserted = row.pop("inserted")
+        results.append({
+            "status": "created" if inserted else "updated",
+            "meal": {**row, "id": str(row["id"]), "restaurant_id": str(row["restaurant_id"])},
+        })
+    return results
+
+async def set_price_schedule(meal_id: str, restaurant_id: str, schedule: PriceScheduleCreate):
+    """
+    Attaches (or replaces) a decay schedule on one of the restaurant's meals.
+    start_price defaults to the meal's current surplus_price (else base_price);
+    a floor above the resolved start_price is rejected with 422, since it would
+    raise the price instead of marking it down.
+    """
+    q = """
+        INSERT INTO meal_price_schedules
+            (meal_id, start_price, step_percent, step_minutes, floor_price, starts_at, ends_at)
+        SELECT m.id, COALESCE(:start_price, m.surplus_price, m.base_price), :step_percent, :step_minutes,
+               :floor_price, COALESCE(:starts_at, now()), :ends_at
+        FROM meals m
+        WHERE m.id = :meal_id AND m.restaurant_id = :restaurant_id
+          AND :floor_price <= COALESCE(:start_price, m.surplus_price, m.base_price)
+        ON CONFLICT (meal_id) DO UPDATE SET
+            start_price = EXCLUDED.start_price,
+            step_percent = EXCLUDED.step_percent,
+            step_minutes = EXCLUDED.step_minutes,
+            floor_price = EXCLUDED.floor_price,
+            starts_at = EXCLUDED.starts_at,
+            ends_at = EXCLUDED.ends_at
+        RETURNING meal_id, start_price, step_percent, step_minutes, floor_price, starts_at, ends_at
+    """
+    row = await database.fetch_one(q, {
+        "meal_id": meal_id,
+        "restaurant_id": restaurant_id,
+        "start_price": schedule.start_price,
+        "step_percent": schedule.step_percent,
+        "step_minutes": schedule.step_minutes,
+        "floor_price": schedule.floor_price,
+        "starts_at": schedule.starts_at,
+        "ends_at": schedule.ends_at,
+    })
+    if not row:
+        meal = await database.fetch_one(
+            """
+            SELECT COALESCE(surplus_price, base_price) AS price
+            FROM meals
+            WHERE id = :meal_id AND restaurant_id = :restaurant_id
+            """,
+            {"meal_id": meal_id, "restaurant_id": restaurant_id}
+        )
+        if not meal:
+            raise HTTPException(status_code=404, detail="Meal not found or not owned by your restaurant")
+        raise HTTPException(
+            status_code=422,
+            detail=f"floor_price must not exceed the schedule's start price ({meal['price']})"
+        )
+    result = dict(row)
+    result["meal_id"] = str(result["meal_id"])
+    result["current_price"] = scheduled_price(
+        result["start_price"], result["step_percent"], result["step_minutes"], result["floor_price"],
+        result["starts_at"], result["ends_at"], datetime.now(timezone.utc)
+    )
+    return result
+
+async def delete_price_schedule(meal_id: str, restaurant_id: str):
+    row = await database.fetch_one(
+        """
+        DELETE FROM meal_price_schedules ps
+        USING meals m
+        WHERE ps.meal_id = m.id AND m.id = :meal_id AND m.restaurant_id = :restaurant_id
+        RETURNING ps.meal_id
+        """,
+        {"meal_id": meal_id, "restaurant_id": restaurant_id}
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="No price schedule for this meal")
@@ -0,0 +1,85 @@
+# app/pricing.py
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text
+from .db import SessionLocal
+from .config import settings
+
+# Join this next to `meals m` wherever a price is shown or charged.
+PRICE_SCHEDULE_JOIN = "left join meal_price_schedules ps on ps.meal_id = m.id"
+
+
+def effective_price_sql(m: str = "m", ps: str = "ps") -> str:
+    """
+    SQL expression for a meal's current surplus price: the decayed schedule
+    price when a schedule is attached, otherwise meals.surplus_price.
+    Price drops step_percent (compounding) every step_minutes from starts_at,
+    stops dropping at ends_at, and never goes below floor_price.
+    """
+    return f"""(case when {ps}.meal_id is null then {m}.surplus_price
+        else greatest(
+            {ps}.floor_price,
+            round({ps}.start_price * power(
+                1 - {ps}.step_percent / 100.0,
+                greatest(0, floor(
+                    extract(epoch from (least(now(), coalesce({ps}.ends_at, now())) - {ps}.starts_at))
+                    / ({ps}.step_minutes * 60)
+                ))
+            ), 2)
+        ) end)"""
+
+
+def scheduled_price(
+    start_price: float,
+    step_percent: float,
+    step_minutes: int,
+    floor_price: float,
+    starts_at: datetime,
+    ends_at: Optional[datetime],
+    now: datetime,
+) -> float:
+    """Python twin of effective_price_sql for a single schedule."""
+    end = min(now, ends_at) if ends_at else now
+    steps = max(0, int((end - starts_at).total_seconds() // (step_minutes * 60)))
+    return max(float(floor_price), round(float(start_price) * (1 - float(step_percent) / 100) ** steps, 2))
+
+
+async def materialize_scheduled_prices(db: AsyncSession, batch_size: int) -> int:
+    """
+    Writes the current schedule price into meals.surplus_price for up to
+    `batch_size` meals whose stored price is stale, skipping meals another
+    worker (or a checkout) has locked.
+    """
+    price = effective_price_sql()
+    q = text(f"""
+        with due as (
+            select m.id, {price} as price
+            from meal_price_schedules ps
+            join meals m on m.id = ps.meal_id
+            where {price} is distinct from m.surplus_price
+            order by m.id
+            limit :batch
+            for update of m skip locked
+        )
+        update meals m
+        set surplus_price = due.price
+        from due
+        where m.id = due.id
+        returning m.id
+    """)
+    rows = (await db.execute(q, {"batch": batch_size})).all()
+    await db.commit()
+    return len(rows)
+
+
+async def sweep_scheduled_prices() -> int:
+    """Background job: materialize decayed prices batch by batch."""
+    total = 0
+    async with SessionLocal() as db:
+        while True:
+            n = await materialize_scheduled_prices(db, settings.PRICE_SCHEDULE_BATCH_SIZE)
+            total += n
+            if n < settings.PRICE_SCHEDULE_BATCH_SIZE:
+                break
+    return total
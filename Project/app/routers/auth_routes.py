@@ -9,6 +9,7 @@ from typing import Optional
 from ..config import settings
 from ..db import get_db
 from ..auth import current_user  # validate JWT & provide user dict
+from ..owner_meals.auth import invalidate_owner_context
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -229,6 +230,7 @@ async def owner_signup(payload: OwnerSignupRequest, db: AsyncSession = Depends(g
         await db.execute(ins_staff, {"restaurant_id": restaurant_id, "user_id": user_id})
         
         await db.commit()
+        invalidate_owner_context(user_id)
         
         return {
             "id": user_id,
@@ -371,6 +373,7 @@ async def delete_me(
     try:
         await db.execute(text("delete from users where id = :uid"), {"uid": uid})
         await db.commit()
+        invalidate_owner_context(uid)
     except Exception:
         # don't block admin delete if local delete fails
         await db.rollback()
@@ -3,8 +3,10 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Path
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import Dict, Any
-from ..db import get_db
+from ..db import get_db, SessionLocal
 from ..auth import current_user
+from ..config import settings
+from ..pricing import effective_price_sql, PRICE_SCHEDULE_JOIN
 
 router = APIRouter(prefix="/cart", tags=["cart"])
 
@@ -25,12 +27,97 @@ async def _get_or_create_cart_id(db: AsyncSession, user_id: str) -> str:
     return cart_id
 
 
+async def _held_by_others(db: AsyncSession, meal_id: str, cart_id: str) -> int:
+    """Quantity of a meal currently reserved by other carts' unexpired holds."""
+    q = text("""
+        select coalesce(sum(qty), 0) as held
+        from cart_holds
+        where meal_id = :mid and cart_id <> :cid and expires_at > now()
+    """)
+    return int((await db.execute(q, {"mid": meal_id, "cid": cart_id})).scalar() or 0)
+
+
+async def _check_and_hold(db: AsyncSession, cart_id: str, meal_id: str, qty: int):
+    """
+    Soft-reserve `qty` of a surplus meal for this cart for CART_HOLD_MINUTES.
+    The meal row is locked so two carts can't both claim the last units;
+    regular (non-surplus) meals have no quantity and are never held.
+    """
+    meal_q = text("select quantity from meals where id = :mid for update")
+    meal = (await db.execute(meal_q, {"mid": meal_id})).mappings().first()
+    if not meal:
+        raise HTTPException(status_code=404, detail="meal not found")
+    if meal["quantity"] is None:
+        return
+
+    available = int(meal["quantity"]) - await _held_by_others(db, meal_id, cart_id)
+    if qty > available:
+        raise HTTPException(status_code=409, detail=f"only {max(available, 0)} left for this item")
+
+    upsert = text("""
+        insert into cart_holds (cart_id, meal_id, qty, expires_at)
+        values (:cid, :mid, :qty, now() + make_interval(mins => :ttl))
+        on conflict (cart_id, meal_id)
+        do update set qty = excluded.qty, expires_at = excluded.expires_at
+    """)
+    await db.execute(upsert, {"cid": cart_id, "mid": meal_id, "qty": qty, "ttl": settings.CART_HOLD_MINUTES})
+
+
+async def release_expired_holds(db: AsyncSession, batch_size: int) -> int:
+    """
+    Deletes up to `batch_size` expired holds. Availability queries already
+    ignore expired holds, so this is garbage collection, not correctness.
+    """
+    q = text("""
+        delete from cart_holds
+        where id in (
+            select id from cart_holds
+            where expires_at <= now()
+            order by expires_at
+            limit :batch
+            for update skip locked
+        )
+        returning id
+    """)
+    rows = (await db.execute(q, {"batch": batch_size})).all()
+    await db.commit()
+    return len(rows)
+
+
+async def sweep_expired_holds() -> int:
+    """Background job: release expired cart holds batch by batch."""
+    total = 0
+    async with SessionLocal() as db:
+        while True:
+            n = await release_expired_holds(db, settings.CART_HOLD_SWEEP_BATCH_SIZE)
+            total += n
+            if n < settings.CART_HOLD_SWEEP_BATCH_SIZE:
+                break
+    return total
+
+
 async def _get_cart_payload(db: AsyncSession, cart_id: str) -> Dict[str, Any]:
     """
-    Returns items with CURRENT pricing (reads meals.surplus_price each time).
+    Returns items with CURRENT pricing (surplus_price, or its scheduled decay, each time).
     NOTE: pricing/availability is volatile until checkout; no locks here.
+    With cart holds enabled, surplus_left excludes units held by other carts.
     """
-    q = text("""
+    hold_cols = ""
+    hold_joins = ""
+    if settings.CART_HOLDS_ENABLED:
+        hold_cols = """,
+          coalesce(oh.held, 0) as held_by_others,
+          h.expires_at as hold_expires_at"""
+        hold_joins = """
+        left join lateral (
+          select sum(x.qty) as held
+          from cart_holds x
+          where x.meal_id = ci.meal_id and x.cart_id <> ci.cart_id and x.expires_at > now()
+        ) oh on true
+        left join cart_holds h
+          on h.cart_id = ci.cart_id and h.meal_id = ci.meal_id and h.expires_at > now()"""
+
+    q = text(f"""
         select
           ci.id as item_id,
           ci.meal_id,
@@ -38,10 +125,11 @@ async def _get_cart_payload(db: AsyncSession, cart_id: str) -> Dict[str, Any]:
           m.name as meal_name,
           m.restaurant_id,
           m.quantity,
-          m.surplus_price,
-          m.base_price
+          {effective_price_sql()} as surplus_price,
+          m.base_price{hold_cols}
         from cart_items ci
         join meals m on m.id = ci.meal_id
+        {PRICE_SCHEDULE_JOIN}{hold_joins}
         where ci.cart_id = :cid
         order by ci.created_at
     """)
@@ -54,7 +142,8 @@ async def _get_cart_payload(db: AsyncSession, cart_id: str) -> Dict[str, Any]:
         qty = int(r["qty"])
         line_total = unit_price * qty
         total += line_total
-        items.append({
+        surplus_left = int(r["quantity"]) if r["quantity"] is not None else 0
+        item = {
             "item_id": r["item_id"],
             "meal_id": r["meal_id"],
             "meal_name": r["meal_name"],
@@ -62,8 +151,12 @@ async def _get_cart_payload(db: AsyncSession, cart_id: str) -> Dict[str, Any]:
             "qty": qty,
             "unit_price": unit_price,
             "line_total": line_total,
-            "surplus_left": int(r["quantity"]) if r["quantity"] is not None else 0,
-        })
+            "surplus_left": surplus_left,
+        }
+        if settings.CART_HOLDS_ENABLED:
+            item["surplus_left"] = max(surplus_left - int(r["held_by_others"] or 0), 0)
+            item["hold_expires_at"] = r["hold_expires_at"]
+        items.append(item)
     return {"cart_id": cart_id, "items": items, "cart_total": total}
 
 
@@ -87,7 +180,8 @@ async def add_item(
     """
     payload: { "meal_id": "...", "qty": 1 }
     If item exists: increments qty.
-    Enforces qty <= meals.quantity (optimistic check).
+    Enforces qty <= meals.quantity (optimistic check), or, with cart holds
+    enabled, reserves the quantity for CART_HOLD_MINUTES.
     """
     meal_id = payload.get("meal_id")
     add_qty = int(payload.get("qty") or 0)
@@ -114,7 +208,9 @@ async def add_item(
     current_qty = int(cur["qty"]) if cur else 0
     new_qty = current_qty + add_qty
 
-    if meal["quantity"] is not None and new_qty > int(meal["quantity"]):
+    if settings.CART_HOLDS_ENABLED:
+        await _check_and_hold(db, cart_id, meal_id, new_qty)
+    elif meal["quantity"] is not None and new_qty > int(meal["quantity"]):
         raise HTTPException(status_code=409, detail=f"only {meal['quantity']} left for this item")
 
     if cur:
@@ -144,7 +240,10 @@ async def update_item_qty(
 ):
     """
     Set exact qty for a cart item; qty>0.
-    Enforces qty <= meals.quantity (optimistic check).
+    Enforces qty <= meals.quantity (optimistic check), or, with cart holds
+    enabled, locks the meal and checks qty against the units not held by
+    other carts, then resets this cart's hold to qty for CART_HOLD_MINUTES
+    (lowering qty releases the difference to other carts).
     """
     cart_id = await _get_or_create_cart_id(db, user["id"])
 
@@ -158,7 +257,9 @@ async def update_item_qty(
     if not own:
         raise HTTPException(status_code=404, detail="item not found")
 
-    if own["quantity"] is not None and qty > int(own["quantity"]):
+    if settings.CART_HOLDS_ENABLED:
+        await _check_and_hold(db, cart_id, own["meal_id"], qty)
+    elif own["quantity"] is not None and qty > int(own["quantity"]):
         raise HTTPException(status_code=409, detail=f"only {own['quantity']} left for this item")
 
     upd = text("update cart_items set qty=:q where id=:iid")
@@ -174,8 +275,11 @@ async def remove_item(
     user=Depends(current_user),
 ):
     cart_id = await _get_or_create_cart_id(db, user["id"])
-    delq = text("delete from cart_items where id=:iid and cart_id=:cid")
-    await db.execute(delq, {"iid": item_id, "cid": cart_id})
+    delq = text("delete from cart_items where id=:iid and cart_id=:cid returning meal_id")
+    removed = (await db.execute(delq, {"iid": item_id, "cid": cart_id})).mappings().first()
+    if settings.CART_HOLDS_ENABLED and removed:
+        release = text("delete from cart_holds where cart_id=:cid and meal_id=:mid")
+        await db.execute(release, {"cid": cart_id, "mid": removed["meal_id"]})
     await db.commit()
     return await _get_cart_payload(db, cart_id)
 
@@ -188,6 +292,8 @@ async def clear_cart(
     cart_id = await _get_or_create_cart_id(db, user["id"])
     dq = text("delete from cart_items where cart_id=:cid")
     await db.execute(dq, {"cid": cart_id})
+    if settings.CART_HOLDS_ENABLED:
+        await db.execute(text("delete from cart_holds where cart_id=:cid"), {"cid": cart_id})
     await db.commit()
     return await _get_cart_payload(db, cart_id)
 
@@ -204,7 +310,9 @@ async def checkout_cart(
       3) create order + order_items (price = surplus_price for surplus meals, base_price for regular meals)
       4) decrement meals.quantity (only for surplus meals)
       5) write initial order_status_events('pending')
-      6) clear cart
+      6) clear cart (and release its holds)
+
+    With cart holds enabled, units held by other carts are not available.
     
     Supports both surplus and regular meals in the same cart.
     """
@@ -212,11 +320,12 @@ async def checkout_cart(
     cart_id = await _get_or_create_cart_id(db, uid)
 
     try:
-        items_q = text("""
+        items_q = text(f"""
             select ci.id as item_id, ci.meal_id, ci.qty,
-                   m.quantity, m.surplus_price, m.base_price, m.restaurant_id
+                   m.quantity, {effective_price_sql()} as surplus_price, m.base_price, m.restaurant_id
             from cart_items ci
             join meals m on m.id = ci.meal_id
+            {PRICE_SCHEDULE_JOIN}
             where ci.cart_id = :cid
             for update of m
         """)
@@ -236,7 +345,10 @@ async def checkout_cart(
             
             if is_surplus:
                 # For surplus meals, check availability and use surplus_price
-                if int(r["quantity"]) < int(r["qty"]):
+                available = int(r["quantity"])
+                if settings.CART_HOLDS_ENABLED:
+                    available -= await _held_by_others(db, r["meal_id"], cart_id)
+                if available < int(r["qty"]):
                     raise HTTPException(status_code=400, detail=f"not enough surplus for meal {r['meal_id']}")
                 price_per_item = float(r["surplus_price"])
             else:
@@ -296,6 +408,8 @@ async def checkout_cart(
 
         clr = text("delete from cart_items where cart_id=:cid")
         await db.execute(clr, {"cid": cart_id})
+        if settings.CART_HOLDS_ENABLED:
+            await db.execute(text("delete from cart_holds where cart_id=:cid"), {"cid": cart_id})
 
         await db.commit()
         return {"order_id": order_id, "status": "pending", "total": total}
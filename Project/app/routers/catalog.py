@@ -1,12 +1,60 @@
 # app/routers/catalog.py
-from fastapi import APIRouter, Depends, Query
+import base64
+import json
+import math
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from typing import Optional
+from typing import Optional, List
 from ..db import get_db
+from ..pricing import effective_price_sql, PRICE_SCHEDULE_JOIN
 
 router = APIRouter()
 
+# upper edges of the search price facet buckets: <5, 5-10, 10-15, 15-20, 20+
+PRICE_BUCKETS = (5, 10, 15, 20)
+SEARCH_TAG_FACETS = 20
+# sort -> (output column, direction, keyset comparison)
+SEARCH_SORTS = {
+    "price_asc": ("price", "asc", ">"),
+    "price_desc": ("price", "desc", "<"),
+    "distance": ("distance_km", "asc", ">"),
+}
+KM_PER_DEGREE = 111.045
+
+
+def _labels(values: Optional[List[str]]) -> List[str]:
+    # accept ?include_tags=a&include_tags=b as well as ?include_tags=a,b
+    out = []
+    for v in values or []:
+        out.extend(x.strip().lower() for x in v.split(",") if x.strip())
+    return list(dict.fromkeys(out))
+
+
+def meal_tag_conditions(
+    include_tags: Optional[List[str]],
+    exclude_allergens: Optional[List[str]],
+    params: dict,
+    alias: str = "m",
+) -> List[str]:
+    """
+    WHERE conditions for tag/allergen filters on meals (text[] columns).
+    include_tags uses array containment so it can be served by the GIN index
+    on tags; exclude_allergens is a negated overlap, which no index can serve,
+    so it only filters rows the other conditions already found.
+    """
+    conds = []
+    tags = _labels(include_tags)
+    if tags:
+        conds.append(f"{alias}.tags @> cast(:include_tags as text[])")
+        params["include_tags"] = tags
+    allergens = _labels(exclude_allergens)
+    if allergens:
+        conds.append(f"({alias}.allergens is null or not {alias}.allergens && cast(:exclude_allergens as text[]))")
+        params["exclude_allergens"] = allergens
+    return conds
+
+
 @router.get("/restaurants")
 async def list_restaurants(
     db: AsyncSession = Depends(get_db),
@@ -62,6 +110,8 @@ async def list_meals_for_restaurant(
     db: AsyncSession = Depends(get_db),
     surplus_only: bool = Query(default=False, description="Only show meals with surplus available"),
     search: Optional[str] = Query(default=None, description="Search substring for meal name"),
+    include_tags: Optional[List[str]] = Query(default=None, description="Meals must have all these tags"),
+    exclude_allergens: Optional[List[str]] = Query(default=None, description="Meals must have none of these allergens"),
     limit: int = Query(default=20, le=100),
     offset: int = Query(default=0, ge=0),
     sort: str = Query(
@@ -73,15 +123,17 @@ async def list_meals_for_restaurant(
     Browse meals from one restaurant with:
     - surplus_only (filter meals with quantity > 0)
     - search (on meal name)
+    - include_tags / exclude_allergens (e.g. include_tags=vegan&exclude_allergens=nuts)
     - pagination (limit, offset)
     - sort (name or surplus_price)
     """
 
+    price = effective_price_sql()
     sort_map = {
         "name_asc": "m.name asc",
         "name_desc": "m.name desc",
-        "price_asc": "m.surplus_price asc nulls last",
-        "price_desc": "m.surplus_price desc nulls last",
+        "price_asc": f"{price} asc nulls last",
+        "price_desc": f"{price} desc nulls last",
     }
     orderby = sort_map.get(sort, "m.name asc")
 
@@ -99,6 +151,8 @@ async def list_meals_for_restaurant(
         conds.append("lower(m.name) like :q")
         params["q"] = f"%{search.lower()}%"
 
+    conds.extend(meal_tag_conditions(include_tags, exclude_allergens, params))
+
     where_clause = " where " + " and ".join(conds)
 
     q = text(f"""
@@ -109,11 +163,12 @@ async def list_meals_for_restaurant(
             m.tags,
             m.base_price,
             m.quantity,
-            m.surplus_price,
+            {price} as surplus_price,
             m.allergens,
             m.calories,
             m.image_link
         from meals m
+        {PRICE_SCHEDULE_JOIN}
         {where_clause}
         order by {orderby}
         limit :limit
@@ -122,3 +177,206 @@ async def list_meals_for_restaurant(
 
     rows = (await db.execute(q, params)).mappings().all()
     return [dict(r) for r in rows]
+
+
+def _bucket_label(i: int) -> str:
+    if i == 0:
+        return f"<{PRICE_BUCKETS[0]}"
+    if i == len(PRICE_BUCKETS):
+        return f"{PRICE_BUCKETS[-1]}+"
+    return f"{PRICE_BUCKETS[i - 1]}-{PRICE_BUCKETS[i]}"
+
+
+def _encode_cursor(key, meal_id) -> str:
+    raw = json.dumps([float(key), str(meal_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, meal_id = json.loads(raw)
+        return float(key), str(meal_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _json(value):
+    # asyncpg hands json columns back decoded; other drivers return text
+    return json.loads(value) if isinstance(value, str) else value
+
+
+@router.get("/meals/search")
+async def search_meals(
+    db: AsyncSession = Depends(get_db),
+    q: Optional[str] = Query(default=None, description="Search substring for meal name"),
+    include_tags: Optional[List[str]] = Query(default=None, description="Meals must have all these tags"),
+    exclude_allergens: Optional[List[str]] = Query(default=None, description="Meals must have none of these allergens"),
+    min_price: Optional[float] = Query(default=None, ge=0),
+    max_price: Optional[float] = Query(default=None, ge=0),
+    min_calories: Optional[int] = Query(default=None, ge=0),
+    max_calories: Optional[int] = Query(default=None, ge=0),
+    lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    lng: Optional[float] = Query(default=None, ge=-180, le=180),
+    radius_km: float = Query(default=5, gt=0, le=50),
+    surplus_only: bool = Query(default=False, description="Only show meals with surplus available"),
+    sort: str = Query(default="price_asc", description="one of: price_asc,price_desc,distance"),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="next_cursor from the previous page"),
+):
+    """
+    Search meals across all restaurants with:
+    - q (on meal name), include_tags / exclude_allergens
+    - price range (current price: scheduled/surplus price, else base price)
+    - calories range
+    - proximity (lat, lng, radius_km); adds distance_km to each meal
+    - keyset pagination (pass next_cursor back as cursor)
+
+    The page query applies the cursor and the limit itself, so later pages
+    cost the same as the first. total and facets (tag counts and price
+    buckets) cover every match and are only computed for the first page
+    (no cursor); later pages return them as null.
+    """
+    near = lat is not None and lng is not None
+    if sort not in SEARCH_SORTS:
+        raise HTTPException(status_code=422, detail=f"sort must be one of: {','.join(SEARCH_SORTS)}")
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat and lng must be given together")
+    if sort == "distance" and not near:
+        raise HTTPException(status_code=400, detail="sort=distance needs lat and lng")
+
+    price = f"coalesce({effective_price_sql()}, m.base_price)"
+    conds = []
+    params = {}
+
+    if q:
+        conds.append("lower(m.name) like :q")
+        params["q"] = f"%{q.lower()}%"
+    conds.extend(meal_tag_conditions(include_tags, exclude_allergens, params))
+    if surplus_only:
+        conds.append("m.quantity > 0")
+    if min_price is not None:
+        conds.append(f"{price} >= :min_price")
+        params["min_price"] = min_price
+    if max_price is not None:
+        conds.append(f"{price} <= :max_price")
+        params["max_price"] = max_price
+    if min_calories is not None:
+        conds.append("m.calories >= :min_cal")
+        params["min_cal"] = min_calories
+    if max_calories is not None:
+        conds.append("m.calories <= :max_cal")
+        params["max_cal"] = max_calories
+
+    distance = "null::float8"
+    join = ""
+    if near:
+        distance = """(2 * 6371 * asin(sqrt(
+            power(sin(radians(r.latitude - cast(:lat as float8)) / 2), 2)
+            + cos(radians(cast(:lat as float8))) * cos(radians(r.latitude))
+            * power(sin(radians(r.longitude - cast(:lng as float8)) / 2), 2))))"""
+        join = "join restaurants r on r.id = m.restaurant_id"
+        # bounding box first so the restaurant lookup can use an index;
+        # the bounds are computed here so no bind parameter meets another in SQL arithmetic
+        dlat = radius_km / KM_PER_DEGREE
+        dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        conds.append("r.latitude between :lat_min and :lat_max")
+        conds.append("r.longitude between :lng_min and :lng_max")
+        conds.append(f"{distance} <= :radius")
+        params.update({
+            "lat": lat,
+            "lng": lng,
+            "radius": radius_km,
+            "lat_min": lat - dlat,
+            "lat_max": lat + dlat,
+            "lng_min": lng - dlng,
+            "lng_max": lng + dlng,
+        })
+
+    key, direction, op = SEARCH_SORTS[sort]
+    key_sql = f"{price}::float8" if key == "price" else distance
+    page_conds = list(conds)
+    page_params = {**params, "limit": limit + 1}
+    if cursor:
+        page_params["ck"], page_params["cid"] = _decode_cursor(cursor)
+        page_conds.append(f"({key_sql}, m.id) {op} (cast(:ck as float8), cast(:cid as uuid))")
+    page_where = (" where " + " and ".join(page_conds)) if page_conds else ""
+
+    page_stmt = text(f"""
+        select coalesce(json_agg(p order by p.{key} {direction}, p.id {direction}), '[]') as items
+        from (
+            select
+                m.id,
+                m.restaurant_id,
+                m.name,
+                m.tags,
+                m.base_price,
+                m.quantity,
+                {effective_price_sql()} as surplus_price,
+                m.allergens,
+                m.calories,
+                m.image_link,
+                {price}::float8 as price,
+                {distance} as distance_km
+            from meals m
+            {PRICE_SCHEDULE_JOIN}
+            {join}
+            {page_where}
+            order by {key_sql} {direction}, m.id {direction}
+            limit :limit
+        ) p
+    """)
+    row = (await db.execute(page_stmt, page_params)).mappings().first()
+    items = _json(row["items"]) or []
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = _encode_cursor(last[key], last["id"])
+
+    if cursor:
+        return {"items": items, "total": None, "next_cursor": next_cursor, "facets": None}
+
+    where_clause = (" where " + " and ".join(conds)) if conds else ""
+    facet_stmt = text(f"""
+        with filtered as materialized (
+            select m.tags, {price}::float8 as price
+            from meals m
+            {PRICE_SCHEDULE_JOIN}
+            {join}
+            {where_clause}
+        ),
+        tag_facets as (
+            select t.tag, count(*) as n
+            from filtered f, unnest(f.tags) as t(tag)
+            group by t.tag
+            order by n desc, t.tag
+            limit :facet_limit
+        ),
+        price_facets as (
+            select width_bucket(f.price, cast(:buckets as float8[])) as bucket, count(*) as n
+            from filtered f
+            group by 1
+        )
+        select
+            (select count(*) from filtered) as total,
+            (select coalesce(json_agg(json_build_object('tag', tag, 'count', n) order by n desc, tag), '[]')
+             from tag_facets) as tags,
+            (select coalesce(json_agg(json_build_object('bucket', bucket, 'count', n) order by bucket), '[]')
+             from price_facets) as prices
+    """)
+    facet_params = {**params, "buckets": list(PRICE_BUCKETS), "facet_limit": SEARCH_TAG_FACETS}
+    row = (await db.execute(facet_stmt, facet_params)).mappings().first()
+
+    return {
+        "items": items,
+        "total": row["total"],
+        "next_cursor": next_cursor,
+        "facets": {
+            "tags": _json(row["tags"]) or [],
+            "price": [
+                {"bucket": _bucket_label(b["bucket"]), "count": b["count"]}
+                for b in _json(row["prices"]) or []
+            ],
+        },
+    }
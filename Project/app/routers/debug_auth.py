@@ -1,9 +1,21 @@
 # app/routers/debug_auth.py
 from fastapi import APIRouter, Depends
 from ..auth import current_user
+from ..background import job_stats
+from Mood2FoodRecSys import llm
 
 router = APIRouter()
 
 @router.get("/me")
 async def whoami(user=Depends(current_user)):
     return user
+
+
+@router.get("/jobs")
+async def background_jobs(user=Depends(current_user)):
+    return job_stats()
+
+
+@router.get("/llm")
+async def llm_calls(user=Depends(current_user)):
+    return llm.stats()
@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from ..db import get_db
 from ..auth import current_user
+from ..impact import get_user_impact
 
 router=APIRouter(prefix="/me",tags=["me"])
 
@@ -30,3 +31,9 @@ async def patch_me(payload: dict, db: AsyncSession = Depends(get_db), user=Depen
     row = res.mappings().first()
     await db.commit()
     return dict(row)
+
+
+@router.get("/impact")
+async def get_my_impact(db: AsyncSession = Depends(get_db), user=Depends(current_user)):
+    """Food/CO2/money saved across completed orders, from the precomputed rollup."""
+    return await get_user_impact(db, user["id"])
@@ -2,26 +2,37 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List
 from ..db import get_db
+from .catalog import meal_tag_conditions
+from ..pricing import effective_price_sql, PRICE_SCHEDULE_JOIN
 
 router = APIRouter()
 
 @router.get("")
 async def list_meals(
     surplus_only: bool = Query(default=True),
+    include_tags: Optional[List[str]] = Query(default=None, description="Meals must have all these tags"),
+    exclude_allergens: Optional[List[str]] = Query(default=None, description="Meals must have none of these allergens"),
     limit: int = Query(default=50, le=100),
     db: AsyncSession = Depends(get_db),
 ):
     try:
         q = """
-          select id, restaurant_id, name, tags, base_price, quantity, surplus_price, allergens, calories, image_link
-          from meals
+          select m.id, m.restaurant_id, m.name, m.tags, m.base_price, m.quantity,
+                 {price} as surplus_price, m.allergens, m.calories, m.image_link
+          from meals m
+          {join}
           {where_clause}
-          order by created_at desc
+          order by m.created_at desc
           limit :limit
         """
-        where = "where quantity > 0" if surplus_only else ""
-        result = await db.execute(text(q.format(where_clause=where)), {"limit": limit})
+        params = {"limit": limit}
+        conds = ["m.quantity > 0"] if surplus_only else []
+        conds.extend(meal_tag_conditions(include_tags, exclude_allergens, params))
+        where = ("where " + " and ".join(conds)) if conds else ""
+        q = q.format(price=effective_price_sql(), join=PRICE_SCHEDULE_JOIN, where_clause=where)
+        result = await db.execute(text(q), params)
         rows = result.mappings().all()
         return [dict(r) for r in rows]
     except Exception as e:
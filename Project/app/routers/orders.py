@@ -3,8 +3,12 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import List, Dict, Any
-from ..db import get_db
+from ..db import get_db, SessionLocal
 from ..auth import current_user
+from ..config import settings
+from ..impact import record_order_impact
+from ..analytics import record_order_sales
+from ..pricing import effective_price_sql, PRICE_SCHEDULE_JOIN
 
 router = APIRouter()
 
@@ -66,6 +70,66 @@ async def _transition_order(db: AsyncSession, order_id: str, target: str):
     await _append_status_event(db, order_id, target)
     return dict(new_row)
 
+async def expire_stale_orders(db: AsyncSession, max_age_minutes: int, batch_size: int) -> int:
+    """
+    Cancels up to `batch_size` pending orders older than `max_age_minutes`
+    in a single statement: restores meal surplus and logs a 'cancelled'
+    status event for each. Rows locked by another worker (or by a user
+    cancelling right now) are skipped, so concurrent sweeps never restore
+    the same surplus twice.
+    """
+    q = text("""
+        with stale as (
+            select id
+            from orders
+            where status = 'pending'
+              and created_at < now() - make_interval(mins => :age)
+            order by created_at
+            limit :batch
+            for update skip locked
+        ),
+        restored as (
+            update meals m
+            set quantity = m.quantity + x.qty
+            from (
+                select oi.meal_id, sum(oi.qty) as qty
+                from order_items oi
+                join stale s on s.id = oi.order_id
+                group by oi.meal_id
+            ) x
+            where m.id = x.meal_id
+        ),
+        cancelled as (
+            update orders o
+            set status = 'cancelled'
+            from stale s
+            where o.id = s.id
+            returning o.id
+        )
+        insert into order_status_events (order_id, status)
+        select id, cast('cancelled' as order_status) from cancelled
+        returning order_id
+    """)
+    rows = (await db.execute(q, {"age": max_age_minutes, "batch": batch_size})).all()
+    await db.commit()
+    return len(rows)
+
+async def sweep_stale_orders() -> int:
+    """
+    Background job: expire stale pending orders batch by batch until a
+    short batch says we've caught up.
+    """
+    total = 0
+    async with SessionLocal() as db:
+        while True:
+            n = await expire_stale_orders(
+                db, settings.PENDING_ORDER_TTL_MINUTES, settings.ORDER_SWEEP_BATCH_SIZE
+            )
+            total += n
+            if n < settings.ORDER_SWEEP_BATCH_SIZE:
+                break
+    return total
+
 
 
 # ---- routes ----------------------------------------------------------------
@@ -127,11 +191,12 @@ async def create_order(
             )
 
         # lock row to keep surplus consistent
-        meal_q = text("""
-            select id, quantity, surplus_price, base_price
-            from meals
-            where id = :mid
-            for update
+        meal_q = text(f"""
+            select m.id, m.quantity, {effective_price_sql()} as surplus_price, m.base_price
+            from meals m
+            {PRICE_SCHEDULE_JOIN}
+            where m.id = :mid
+            for update of m
         """)
         meal_res = await db.execute(meal_q, {"mid": meal_id})
         meal = meal_res.mappings().first()
@@ -379,5 +444,7 @@ async def complete_order(
     if not await _is_user_staff_for_order(db, str(user["id"]).strip(), order_id):
         raise HTTPException(status_code=403, detail="not allowed")
     out = await _transition_order(db, order_id, "completed")
+    await record_order_impact(db, order_id)
+    await record_order_sales(db, order_id)
     await db.commit()
     return out
\ No newline at end of file
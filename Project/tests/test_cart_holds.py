@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+
+with patch('sqlalchemy.ext.asyncio.create_async_engine'), patch('sqlalchemy.ext.asyncio.async_sessionmaker'):
+    from app.routers import cart
+
+
+def _result(row=None, scalar=None, rows=None):
+    res = MagicMock()
+    res.mappings = MagicMock(return_value=MagicMock(
+        first=MagicMock(return_value=row),
+        all=MagicMock(return_value=rows or []),
+    ))
+    res.scalar = MagicMock(return_value=scalar)
+    res.all = MagicMock(return_value=rows or [])
+    return res
+
+
+@pytest.mark.asyncio
+async def test_check_and_hold_rejects_units_held_by_other_carts():
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[_result(row={"quantity": 5}), _result(scalar=4)])
+    with pytest.raises(HTTPException) as exc:
+        await cart._check_and_hold(db, "cart-1", "meal-1", 2)
+    assert exc.value.status_code == 409
+    assert "only 1 left" in exc.value.detail
+
+
+@pytest.mark.asyncio
+async def test_check_and_hold_upserts_hold():
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=[_result(row={"quantity": 5}), _result(scalar=1), _result()])
+    with patch.object(cart.settings, "CART_HOLD_MINUTES", 7):
+        await cart._check_and_hold(db, "cart-1", "meal-1", 4)
+    upsert_sql, params = db.execute.call_args[0]
+    assert "on conflict (cart_id, meal_id)" in str(upsert_sql)
+    assert params == {"cid": "cart-1", "mid": "meal-1", "qty": 4, "ttl": 7}
+
+
+@pytest.mark.asyncio
+async def test_check_and_hold_skips_regular_meals():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=_result(row={"quantity": None}))
+    await cart._check_and_hold(db, "cart-1", "meal-1", 50)
+    assert db.execute.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_cart_payload_subtracts_other_holds():
+    row = {
+        "item_id": "i1", "meal_id": "m1", "qty": 1, "meal_name": "Croissant",
+        "restaurant_id": "r1", "quantity": 6, "surplus_price": 2.0, "base_price": 4.0,
+        "held_by_others": 4, "hold_expires_at": "2026-01-01T12:10:00Z",
+    }
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=_result(rows=[row]))
+    with patch.object(cart.settings, "CART_HOLDS_ENABLED", True):
+        payload = await cart._get_cart_payload(db, "cart-1")
+    item = payload["items"][0]
+    assert item["surplus_left"] == 2
+    assert item["hold_expires_at"] == "2026-01-01T12:10:00Z"
+    assert "cart_holds" in str(db.execute.call_args[0][0])
+
+
+@pytest.mark.asyncio
+async def test_release_expired_holds_batches():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=_result(rows=[("h1",), ("h2",)]))
+    db.commit = AsyncMock()
+    n = await cart.release_expired_holds(db, batch_size=2)
+    assert n == 2
+    assert "skip locked" in str(db.execute.call_args[0][0])
+    db.commit.assert_awaited_once()
@@ -0,0 +1,140 @@
+import math
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+with patch('sqlalchemy.ext.asyncio.create_async_engine'), patch('sqlalchemy.ext.asyncio.async_sessionmaker'):
+    from app.routers import catalog, meals
+
+
+def _db():
+    res = MagicMock()
+    res.mappings = MagicMock(return_value=MagicMock(all=MagicMock(return_value=[])))
+    res.scalar = MagicMock(return_value=0)
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=res)
+    return db
+
+
+def test_meal_tag_conditions_use_array_operators():
+    params = {}
+    conds = catalog.meal_tag_conditions([" Vegan,GF", "gf"], ["Nuts"], params)
+    assert conds[0] == "m.tags @> cast(:include_tags as text[])"
+    assert "m.allergens && cast(:exclude_allergens as text[])" in conds[1]
+    assert params == {"include_tags": ["vegan", "gf"], "exclude_allergens": ["nuts"]}
+
+
+def test_meal_tag_conditions_empty():
+    params = {}
+    assert catalog.meal_tag_conditions(None, ["", " "], params) == []
+    assert params == {}
+
+
+@pytest.mark.asyncio
+async def test_restaurant_meals_filters_by_tags():
+    db = _db()
+    await catalog.list_meals_for_restaurant(
+        "r1", db=db, surplus_only=False, search=None,
+        include_tags=["vegan"], exclude_allergens=["nuts"], limit=20, offset=0, sort="name",
+    )
+    sql, params = db.execute.call_args_list[0][0]
+    assert "m.tags @>" in str(sql)
+    assert params["include_tags"] == ["vegan"]
+    assert params["exclude_allergens"] == ["nuts"]
+
+
+@pytest.mark.asyncio
+async def test_list_meals_filters_by_tags():
+    db = _db()
+    await meals.list_meals(
+        surplus_only=False, include_tags=None, exclude_allergens=["dairy"], limit=10, db=db,
+    )
+    sql, params = db.execute.call_args[0]
+    assert "where (m.allergens is null" in str(sql)
+    assert params == {"limit": 10, "exclude_allergens": ["dairy"]}
+
+
+def _search_db(items, total=None, tags=None, prices=None):
+    row = {
+        "total": total if total is not None else len(items),
+        "items": items,
+        "tags": tags or [],
+        "prices": prices or [],
+    }
+    res = MagicMock()
+    res.mappings = MagicMock(return_value=MagicMock(first=MagicMock(return_value=row)))
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=res)
+    return db
+
+
+SEARCH_DEFAULTS = dict(
+    q=None, include_tags=None, exclude_allergens=None, min_price=None, max_price=None,
+    min_calories=None, max_calories=None, lat=None, lng=None, radius_km=5,
+    surplus_only=False, sort="price_asc", limit=2, cursor=None,
+)
+
+
+@pytest.mark.asyncio
+async def test_search_meals_first_page_with_facets():
+    items = [{"id": "a", "price": 3.0}, {"id": "b", "price": 4.5}, {"id": "c", "price": 6.0}]
+    db = _search_db(
+        items, total=40,
+        tags=[{"tag": "vegan", "count": 12}],
+        prices=[{"bucket": 0, "count": 10}, {"bucket": 1, "count": 25}, {"bucket": 4, "count": 5}],
+    )
+    out = await catalog.search_meals(db=db, **{**SEARCH_DEFAULTS, "q": "Curry", "max_calories": 800})
+    assert db.execute.await_count == 2
+    (page_sql, page_params), (facet_sql, facet_params) = (c[0] for c in db.execute.call_args_list)
+    # the page is limited in the main query, not cut from a materialized match set
+    assert "materialized" not in str(page_sql) and "limit :limit" in str(page_sql)
+    assert page_params["q"] == "%curry%" and page_params["max_cal"] == 800 and page_params["limit"] == 3
+    assert "filtered as materialized" in str(facet_sql)
+    assert facet_params["q"] == "%curry%" and "limit" not in facet_params
+    assert [i["id"] for i in out["items"]] == ["a", "b"]
+    assert out["total"] == 40
+    assert out["facets"]["tags"] == [{"tag": "vegan", "count": 12}]
+    assert [b["bucket"] for b in out["facets"]["price"]] == ["<5", "5-10", "20+"]
+    assert catalog._decode_cursor(out["next_cursor"]) == (4.5, "b")
+
+
+@pytest.mark.asyncio
+async def test_search_meals_keyset_and_proximity():
+    cursor = catalog._encode_cursor(1.25, "m9")
+    db = _search_db([{"id": "x", "distance_km": 2.0}])
+    out = await catalog.search_meals(db=db, **{
+        **SEARCH_DEFAULTS, "lat": 35.78, "lng": -78.64, "radius_km": 3, "sort": "distance", "cursor": cursor,
+    })
+    # later pages skip total and facets
+    assert db.execute.await_count == 1
+    assert out["total"] is None and out["facets"] is None
+    sql, params = db.execute.call_args[0]
+    assert "materialized" not in str(sql)
+    assert ", m.id) > (cast(:ck as float8), cast(:cid as uuid))" in str(sql)
+    assert str(sql).index("cast(:ck") < str(sql).index("limit :limit")
+    assert "join restaurants r" in str(sql)
+    assert (params["ck"], params["cid"]) == (1.25, "m9")
+    assert "r.latitude between :lat_min and :lat_max" in str(sql)
+    assert "r.longitude between :lng_min and :lng_max" in str(sql)
+    # bind parameters never meet each other in arithmetic (unknown - unknown fails to prepare)
+    assert ":lat -" not in str(sql) and ":lng -" not in str(sql) and ":lat +" not in str(sql)
+    dlat = 3 / catalog.KM_PER_DEGREE
+    assert params["lat_min"] == pytest.approx(35.78 - dlat)
+    assert params["lat_max"] == pytest.approx(35.78 + dlat)
+    dlng = 3 / (catalog.KM_PER_DEGREE * math.cos(math.radians(35.78)))
+    assert params["lng_min"] == pytest.approx(-78.64 - dlng)
+    assert params["lng_max"] == pytest.approx(-78.64 + dlng)
+    assert out["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_search_meals_rejects_bad_input():
+    from fastapi import HTTPException
+    with pytest.raises(HTTPException) as exc:
+        await catalog.search_meals(db=_search_db([]), **{**SEARCH_DEFAULTS, "sort": "distance"})
+    assert exc.value.status_code == 400
+    with pytest.raises(HTTPException) as exc:
+        await catalog.search_meals(db=_search_db([]), **{**SEARCH_DEFAULTS, "cursor": "not-a-cursor"})
+    assert exc.value.detail == "Invalid cursor"
+    with pytest.raises(HTTPException) as exc:
+        await catalog.search_meals(db=_search_db([]), **{**SEARCH_DEFAULTS, "sort": "rating"})
+    assert exc.value.status_code == 422
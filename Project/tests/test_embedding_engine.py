@@ -0,0 +1,69 @@
+import pytest
+import asyncio
+import numpy as np
+from unittest.mock import patch
+
+from Mood2FoodRecSys import embedding_engine, mood_cache, RecSysFunctions
+from Mood2FoodRecSys.RecSysFunctions import recommend_food_based_on_mood
+
+MENU = [
+    {"id": "soup", "name": "Tomato Soup", "tags": ["warm", "comfort"]},
+    {"id": "salad", "name": "Garden Salad", "tags": ["fresh", "light"]},
+    {"id": "cake", "name": "Chocolate Lava Cake", "tags": ["dessert", "sweet"]},
+    {"id": "wings", "name": "Buffalo Wings", "tags": ["spicy", "hot"]},
+]
+
+
+def _top(moods, menu=MENU, preference=None):
+    return embedding_engine.rank_meals(moods, preference, menu)["Suggested_food"][0]["id"]
+
+
+def test_embed_is_deterministic_and_normalized():
+    a = embedding_engine.embed("Spicy Chicken Wrap")
+    assert np.allclose(a, embedding_engine.embed("spicy chicken wrap"))
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert not np.any(embedding_engine.embed(""))
+
+
+@pytest.mark.parametrize("mood,expected", [
+    ("sad", "soup"),
+    ("happy", "cake"),
+    ("angry", "wings"),
+    ("relaxed", "salad"),
+])
+def test_rank_meals_follows_mood(mood, expected):
+    assert _top([(mood, 1.0)]) == expected
+
+
+def test_rank_meals_weights_and_preferences():
+    assert _top([("sad", 0.2), ("angry", 0.8)]) == "wings"
+    assert _top([("curious", 1.0)], preference={"food_preferences": ["salad"]}) == "salad"
+
+
+def test_rank_meals_output_shape():
+    out = embedding_engine.rank_meals([("calm", 1.0)], None, MENU + [{"name": "no id"}], top_k=2)
+    assert len(out["Suggested_food"]) == 2
+    assert set(out["Suggested_food"][0]) == {"id", "name", "tags"}
+    assert embedding_engine.rank_meals([], None, MENU) == {"Suggested_food": []}
+
+
+@pytest.mark.asyncio
+async def test_local_engine_skips_llm(llm_stub):
+    out = await recommend_food_based_on_mood([("sad", 1.0)], {}, MENU, engine="local")
+    assert llm_stub.calls == 0
+    assert out["Suggested_food"][0]["id"] == "soup"
+
+
+@pytest.mark.asyncio
+async def test_slow_llm_falls_back_to_local_ranking(llm_stub):
+    llm_stub.delay = 1
+    with patch.object(RecSysFunctions, "RECSYS_LLM_TIMEOUT_SECONDS", 0.05):
+        out = await recommend_food_based_on_mood([("happy", 1.0)], {}, MENU, restaurant_id="r1")
+    assert out["Suggested_food"][0]["id"] == "cake"
+    # the shielded LLM call outlives the fallback; stop it before the loop closes
+    pending = list(mood_cache._rec_inflight.values())
+    assert pending and not any(p.done() for p in pending)
+    for p in pending:
+        p.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    assert not mood_cache._rec_inflight
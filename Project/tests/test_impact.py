@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+with patch('sqlalchemy.ext.asyncio.create_async_engine'), patch('sqlalchemy.ext.asyncio.async_sessionmaker'):
+    from app import impact
+
+
+@pytest.mark.asyncio
+async def test_record_order_impact_single_statement():
+    db = MagicMock()
+    db.execute = AsyncMock()
+    with patch.object(impact.settings, "MEAL_PORTION_KG", 0.5), \
+         patch.object(impact.settings, "CO2_KG_PER_FOOD_KG", 2.0):
+        await impact.record_order_impact(db, "order-1")
+    assert db.execute.await_count == 1
+    sql, params = db.execute.call_args[0]
+    sql = str(sql)
+    assert "insert into sustainability_metrics" in sql
+    assert "on conflict (order_id) do nothing" in sql
+    assert "user_impact" in sql and "restaurant_impact" in sql
+    assert params == {"oid": "order-1", "portion_kg": 0.5, "co2_factor": 2.0}
+
+
+@pytest.mark.asyncio
+async def test_get_user_impact_reads_rollup_row():
+    row = {"orders_count": 3, "meals_saved": 5, "food_saved_kg": 2.0,
+           "co2_saved_kg": 5.0, "money_saved": 12.5, "updated_at": "2026-01-01"}
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(
+        mappings=MagicMock(return_value=MagicMock(first=MagicMock(return_value=row)))
+    ))
+    assert await impact.get_user_impact(db, "user-1") == row
+
+
+@pytest.mark.asyncio
+async def test_get_user_impact_defaults_to_zero():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(
+        mappings=MagicMock(return_value=MagicMock(first=MagicMock(return_value=None)))
+    ))
+    result = await impact.get_user_impact(db, "user-1")
+    assert result["orders_count"] == 0
+    assert result["money_saved"] == 0
+    assert result["updated_at"] is None
+
+
+@pytest.mark.asyncio
+async def test_record_order_sales_upserts_hourly_bucket():
+    from app.analytics import record_order_sales
+    db = MagicMock()
+    db.execute = AsyncMock()
+    await record_order_sales(db, "order-1")
+    sql = str(db.execute.call_args[0][0])
+    assert "restaurant_sales_hourly" in sql
+    # bucketed by completion, not by when the order was placed
+    assert "date_trunc('hour', now() at time zone 'utc')" in sql
+    assert "o.created_at" not in sql
+    assert "m.name" in sql and "meal_name = excluded.meal_name" in sql
+    assert "on conflict (restaurant_id, meal_id, bucket_start)" in sql
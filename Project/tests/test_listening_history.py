@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+
+from Mood2FoodRecSys import listening_history
+from Mood2FoodRecSys.RecSysFunctions import get_user_profile_and_recent_tracks
+
+
+def _item(name, played_at):
+    return {"track": {"id": name.lower(), "name": name, "artists": [{"name": "Artist"}]}, "played_at": played_at}
+
+
+def _page(items, after=None):
+    return {"items": items, "cursors": {"after": str(after)} if after else None}
+
+
+@pytest.mark.asyncio
+async def test_stored_history_skips_live_spotify_call():
+    rows = [
+        {"track_name": "Newest", "artists": "A", "played_at": datetime(2026, 1, 1, 12, 5, tzinfo=timezone.utc)},
+        {"track_name": "Older", "artists": "B", "played_at": datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)},
+    ]
+    with patch.object(listening_history, "database") as mock_db, \
+         patch.object(listening_history, "refresh_in_background") as mock_refresh, \
+         patch("Mood2FoodRecSys.RecSysFunctions.get_spotify_client") as mock_client:
+        mock_db.fetch_all = AsyncMock(return_value=rows)
+        songs = await get_user_profile_and_recent_tracks("user123")
+
+    assert [s["track_name"] for s in songs] == ["Newest", "Older"]
+    assert songs[0]["index"] == 1
+    assert songs[0]["time_stamp"] - songs[1]["time_stamp"] == 300
+    mock_refresh.assert_called_once_with("user123")
+    mock_client.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_first_request_records_live_plays_and_cursor():
+    with patch.object(listening_history, "recent_tracks", AsyncMock(return_value=[])), \
+         patch.object(listening_history, "record", AsyncMock()) as mock_record, \
+         patch("Mood2FoodRecSys.RecSysFunctions.get_spotify_client") as mock_client:
+        sp = MagicMock()
+        sp.current_user_recently_played = AsyncMock(return_value=_page(
+            [_item("Song", "2026-01-01T12:00:00Z")], after=1767268800000))
+        mock_client.return_value = sp
+        songs = await get_user_profile_and_recent_tracks("user123")
+
+    assert songs[0]["track_name"] == "Song"
+    user_id, plays, cursor = mock_record.call_args[0]
+    assert plays[0]["track_id"] == "song"
+    assert cursor == 1767268800000
+
+
+@pytest.mark.asyncio
+async def test_sync_pages_from_stored_cursor():
+    full = [_item(f"S{i}", "2026-01-01T12:00:00Z") for i in range(listening_history.SPOTIFY_PAGE_SIZE)]
+    sp = MagicMock()
+    sp.current_user_recently_played = AsyncMock(side_effect=[_page(full, after=200), _page([], after=None)])
+
+    with patch.object(listening_history, "database") as mock_db, \
+         patch.object(listening_history.spotify_tokens, "access_token", AsyncMock(return_value="tok")), \
+         patch.object(listening_history, "SpotifyClient", return_value=sp), \
+         patch.object(listening_history, "record", AsyncMock()) as mock_record:
+        mock_db.fetch_one = AsyncMock(return_value={"after_ms": 100})
+        fetched = await listening_history.sync("user123")
+
+    assert fetched == listening_history.SPOTIFY_PAGE_SIZE
+    afters = [c.kwargs["after"] for c in sp.current_user_recently_played.call_args_list]
+    assert afters == [100, 200]
+    # an empty page has no cursor; keep the last one
+    assert mock_record.call_args[0][2] == 200
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_is_single_flight_and_throttled():
+    gate = asyncio.Event()
+
+    async def slow_sync(user_id):
+        await gate.wait()
+        listening_history._recently_synced.set(user_id, True)
+        return 0
+
+    with patch.object(listening_history, "sync", AsyncMock(side_effect=slow_sync)) as mock_sync:
+        for _ in range(5):
+            listening_history.refresh_in_background("user123")
+        gate.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        listening_history.refresh_in_background("user123")
+
+    mock_sync.assert_awaited_once_with("user123")
+
+
+@pytest.mark.asyncio
+async def test_failed_sync_backs_off():
+    sync = AsyncMock(side_effect=HTTPException(status_code=401, detail="revoked"))
+    with patch.object(listening_history, "sync", sync), \
+         patch.object(listening_history.time, "time", return_value=1000):
+        listening_history.refresh_in_background("user123")
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        listening_history.refresh_in_background("user123")
+    sync.assert_awaited_once_with("user123")
+    expires_at, _ = listening_history._recently_synced._data["user123"]
+    assert expires_at == 1000 + listening_history.LISTENING_HISTORY_FAILURE_BACKOFF_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_record_is_best_effort():
+    play = {"track_id": "x", "track_name": "X", "artists": "A",
+            "played_at": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+    with patch.object(listening_history, "database") as mock_db:
+        mock_db.execute = AsyncMock(side_effect=Exception("db down"))
+        await listening_history.record("user123", [play], 1)
+    assert listening_history._recently_synced.get("user123") is True
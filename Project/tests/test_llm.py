@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from Mood2FoodRecSys import llm
+from Mood2FoodRecSys.RecSys_Prompts import FoodSuggestions, MoodAnalysis
+from Mood2FoodRecSys.RecSysFunctions import analyze_mood_with_groq, recommend_food_based_on_mood
+
+MESSAGES = [{"role": "system", "content": "sys"}, {"role": "user", "content": "[]"}]
+
+
+class _Provider:
+    """Answers after the given delays, one per call; records peak concurrency."""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def complete(self, messages, model, temperature):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.active -= 1
+        return llm.Completion(f"answer after {delay}", prompt_tokens=10, completion_tokens=2)
+
+
+@pytest.mark.asyncio
+async def test_complete_records_tokens_and_latency():
+    content = await llm.complete("site", MESSAGES, _Provider(0))
+    assert content == "answer after 0"
+    stats = llm.stats()["site"]
+    assert stats["calls"] == 1 and stats["failures"] == 0
+    assert stats["prompt_tokens"] == 10 and stats["completion_tokens"] == 2
+    assert stats["max_latency_ms"] >= stats["avg_latency_ms"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_complete_enforces_deadline():
+    with pytest.raises(asyncio.TimeoutError):
+        await llm.complete("slow", MESSAGES, _Provider(1), deadline=0.05)
+    assert llm.stats()["slow"]["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_complete_counts_provider_failures():
+    provider = MagicMock()
+    provider.complete = AsyncMock(side_effect=RuntimeError("rate limited"))
+    with pytest.raises(RuntimeError):
+        await llm.complete("broken", MESSAGES, provider)
+    assert llm.stats()["broken"]["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_when_first_is_slow():
+    provider = _Provider(1, 0)
+    start = asyncio.get_event_loop().time()
+    content = await llm.complete("hedged", MESSAGES, provider, hedge_after=0.05)
+    assert asyncio.get_event_loop().time() - start < 0.5
+    assert content == "answer after 0"
+    stats = llm.stats()["hedged"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    await asyncio.sleep(0)
+    assert provider.active == 0  # the slow original was cancelled
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_into_full_semaphore():
+    provider = _Provider(0.1)
+    with patch.object(llm, "_semaphore", asyncio.Semaphore(1)):
+        await llm.complete("busy", MESSAGES, provider, hedge_after=0.01)
+    assert provider.calls == 1
+    assert llm.stats()["busy"]["hedges"] == 0
+
+
+@pytest.mark.asyncio
+async def test_semaphore_bounds_concurrency():
+    provider = _Provider(0.02)
+    with patch.object(llm, "_semaphore", asyncio.Semaphore(2)):
+        await asyncio.gather(*(llm.complete("fanout", MESSAGES, provider) for _ in range(6)))
+    assert provider.calls == 6
+    assert provider.peak == 2
+
+
+@pytest.mark.asyncio
+async def test_groq_provider_ignores_missing_usage():
+    response = MagicMock()
+    response.choices[0].message.content = "{}"
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(return_value=response)
+    result = await llm.GroqProvider(client).complete(MESSAGES, "m", 0.5)
+    assert result == llm.Completion("{}", 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_stub_provider_is_deterministic_offline():
+    tracks = [{"index": 1, "track_name": "Song A", "artists": "X", "time_stamp": 1000},
+              {"index": 2, "track_name": "Song B", "artists": "Y", "time_stamp": 900}]
+    with patch.object(llm, "LLM_PROVIDER", "stub"), \
+         patch.object(llm, "groq_client") as groq_client, \
+         patch("Mood2FoodRecSys.mood_cache.database") as db:
+        db.fetch_all = AsyncMock(return_value=[])
+        db.execute = AsyncMock()
+        first = await analyze_mood_with_groq(tracks)
+        again = await llm.stub.complete([{"role": "user", "content": str(tracks)}], "m", 0.5)
+        foods = await recommend_food_based_on_mood(
+            [("happy", 1.0)], {}, [{"id": "a", "name": "Soup", "tags": []}, {"id": "b", "name": "Pie", "tags": []}]
+        )
+    groq_client.assert_not_called()
+    assert [r["song name"] for r in first] == ["Song A", "Song B"]
+    assert first == json.loads(again.content)
+    assert all(r["mood"] and r["genre"] for r in first)
+    assert [f["id"] for f in foods["Suggested_food"]] == ["a", "b"]
+
+
+class _Replies:
+    """Returns the given answers in order."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.sent = []
+
+    async def complete(self, messages, model, temperature):
+        self.sent.append(messages)
+        return llm.Completion(self.answers[len(self.sent) - 1])
+
+
+def test_extract_json_strips_fences_and_prose():
+    assert llm.extract_json('```json\n{"Suggested_food": [1]}\n```') == {"Suggested_food": [1]}
+    assert llm.extract_json('Sure! [note] Here you go: [{"mood": ["calm"]}] Enjoy.') == [{"mood": ["calm"]}]
+    with pytest.raises(ValueError):
+        llm.extract_json("no json here")
+
+
+def test_parse_json_validates_and_keeps_sent_fields():
+    assert llm.parse_json('[{"mood": "happy"}]', MoodAnalysis) == [{"mood": ["happy"]}]
+    assert llm.parse_json('{"Suggested_food": [2, "3"]}', FoodSuggestions) == {"Suggested_food": [2, "3"]}
+    with pytest.raises(ValueError):
+        llm.parse_json('{"foods": [1]}', FoodSuggestions)
+
+
+@pytest.mark.asyncio
+async def test_complete_json_no_repair_for_fenced_output():
+    provider = _Replies('```\n{"Suggested_food": [1]}\n```')
+    assert await llm.complete_json("food", MESSAGES, provider, FoodSuggestions) == {"Suggested_food": [1]}
+    assert len(provider.sent) == 1
+    assert llm.stats()["food"]["repairs"] == 0
+
+
+@pytest.mark.asyncio
+async def test_complete_json_repairs_once():
+    provider = _Replies('{"Suggested_food": [1, 2,', '{"Suggested_food": [1, 2]}')
+    assert await llm.complete_json("food", MESSAGES, provider, FoodSuggestions) == {"Suggested_food": [1, 2]}
+    repair = provider.sent[1]
+    # only the broken answer goes back, not the original prompt
+    assert '{"Suggested_food": [1, 2,' in repair[1]["content"]
+    assert "Suggested_food" in repair[0]["content"]
+    stats = llm.stats()
+    assert stats["food"]["repairs"] == 1 and stats["food"]["repair_failures"] == 0
+    assert stats["food.repair"]["calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_complete_json_gives_up_after_one_repair():
+    provider = _Replies("not json", "still not json")
+    with pytest.raises(llm.StructuredOutputError):
+        await llm.complete_json("food", MESSAGES, provider, FoodSuggestions)
+    assert len(provider.sent) == 2
+    assert llm.stats()["food"]["repair_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_analyze_mood_accepts_fenced_answer(llm_stub):
+    llm_stub.reply = '```json\n[{"song name": "Song A", "mood": ["calm"]}]\n```'
+    with patch("Mood2FoodRecSys.mood_cache.database") as db:
+        db.fetch_all = AsyncMock(return_value=[])
+        db.execute = AsyncMock()
+        result = await analyze_mood_with_groq([{"track_name": "Song A", "artists": "X"}])
+    assert result == [{"song name": "Song A", "mood": ["calm"]}]
+    assert llm_stub.calls == 1
+
+
+def test_groq_client_is_built_on_first_use():
+    with patch.object(llm, "_groq_client", None), patch("groq.AsyncGroq") as async_groq:
+        assert llm.GroqProvider().client is None
+        assert llm.groq_client() is llm.groq_client()
+    async_groq.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_stub_reply_scripts_answers():
+    provider = llm.StubProvider(reply=lambda messages: messages[-1]["content"].upper())
+    assert (await provider.complete(MESSAGES, "m", 0.5)).content == "[]"
+    provider.reply = RuntimeError("down")
+    with pytest.raises(RuntimeError):
+        await provider.complete(MESSAGES, "m", 0.5)
+    assert provider.calls == 2 and provider.last_messages == MESSAGES
+
+
+def test_stub_import_needs_no_groq_key():
+    env = {k: v for k, v in os.environ.items() if k != "GROQ_API_KEY"}
+    env["RECSYS_LLM_PROVIDER"] = "stub"
+    done = subprocess.run(
+        [sys.executable, "-c", "import Mood2FoodRecSys.RecSysFunctions"],
+        cwd=pathlib.Path(__file__).resolve().parents[1], env=env, capture_output=True, text=True,
+    )
+    assert done.returncode == 0, done.stderr
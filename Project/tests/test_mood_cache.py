@@ -0,0 +1,176 @@
+import asyncio
+import pytest
+import time
+from unittest.mock import AsyncMock, patch
+
+from Mood2FoodRecSys import mood_cache
+from Mood2FoodRecSys.RecSysFunctions import analyze_mood_with_groq
+
+
+def _tracks(*names, played_at="2026-01-01 12:00:00"):
+    return [
+        {"index": i, "track_name": n, "artists": "Artist", "played_at": played_at, "time_stamp": 1000 + i}
+        for i, n in enumerate(names, start=1)
+    ]
+
+
+@pytest.fixture
+def no_db():
+    with patch.object(mood_cache, "database") as db:
+        db.fetch_all = AsyncMock(return_value=[])
+        db.execute = AsyncMock()
+        yield db
+
+
+def test_tracklist_key_ignores_play_times_and_case():
+    a = _tracks("Song A", "Song B")
+    b = _tracks("song a ", "SONG B", played_at="2026-02-02 08:00:00")
+    assert mood_cache.tracklist_key(a) == mood_cache.tracklist_key(b)
+    assert mood_cache.tracklist_key(a) != mood_cache.tracklist_key(a[::-1])
+
+
+def test_ttl_cache_expires_and_evicts():
+    cache = mood_cache.TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2, expires_at=time.time() - 1)
+    assert cache.get("b") is None
+    cache.set("c", 3)
+    cache.set("d", 4)
+    assert len(cache) == 2 and cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_repeat_history_skips_llm(no_db, llm_stub):
+    labels = '[{"song name": "Song A", "mood": ["calm"]}, {"song name": "Song B", "mood": ["happy"]}]'
+    llm_stub.reply = labels
+    first = await analyze_mood_with_groq(_tracks("Song A", "Song B"))
+    second = await analyze_mood_with_groq(_tracks("Song A", "Song B", played_at="2026-01-02 09:00:00"))
+    assert first == second
+    assert llm_stub.calls == 1
+    # the list entry plus one track_moods row per song
+    assert no_db.execute.await_count == 2
+    assert no_db.execute.call_args.kwargs["values"]["keys"] == ["song a|artist", "song b|artist"]
+
+
+@pytest.mark.asyncio
+async def test_overlapping_history_reuses_track_labels(no_db, llm_stub):
+    llm_stub.reply = '[{"mood": ["calm"]}, {"mood": ["happy"]}, {"mood": ["sad"]}]'
+    await analyze_mood_with_groq(_tracks("Song A", "Song B", "Song C"))
+    result = await analyze_mood_with_groq(_tracks("Song C", "Song A"))
+    assert result == [{"mood": ["sad"]}, {"mood": ["calm"]}]
+    assert llm_stub.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_survives_restart_via_db(no_db, llm_stub):
+    tracks = _tracks("Song A")
+    no_db.fetch_all.side_effect = [
+        [{"cache_key": mood_cache.tracklist_key(tracks), "result": '[{"mood": ["calm"]}]', "expires_at": time.time() + 60}],
+        [],
+    ]
+    assert await analyze_mood_with_groq(tracks) == [{"mood": ["calm"]}]
+    assert llm_stub.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_only_unseen_tracks_are_sent(no_db, llm_stub):
+    no_db.fetch_all.side_effect = [[], [{"track_key": "song b|artist", "label": '{"mood": ["happy"]}'}]]
+    llm_stub.reply = '[{"mood": ["calm"]}, {"mood": ["sad"]}]'
+    result = await analyze_mood_with_groq(_tracks("Song A", "Song B", "Song C", "Song A"))
+    sent = llm_stub.last_messages[1]["content"]
+    assert "Song A" in sent and "Song C" in sent and "Song B" not in sent
+    assert [r["mood"] for r in result] == [["calm"], ["happy"], ["sad"], ["calm"]]
+
+
+@pytest.mark.asyncio
+async def test_misaligned_answer_matched_by_song_name(no_db, llm_stub):
+    track_cache_hit = {"mood": ["happy"]}
+    mood_cache.track_cache.set("song b|artist", track_cache_hit)
+    llm_stub.reply = '[{"song name": "song c", "mood": ["sad"]}]'
+    result = await analyze_mood_with_groq(_tracks("Song A", "Song B", "Song C"))
+    assert result == [
+        {"song name": "Song A", "genre": [], "mood": []},
+        {"mood": ["happy"]},
+        {"song name": "song c", "mood": ["sad"]},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cache_db_errors_are_ignored(no_db, llm_stub):
+    no_db.fetch_all.side_effect = RuntimeError("db down")
+    no_db.execute.side_effect = RuntimeError("db down")
+    llm_stub.reply = '[{"mood": ["calm"]}]'
+    assert await analyze_mood_with_groq(_tracks("Song A")) == [{"mood": ["calm"]}]
+
+
+@pytest.mark.asyncio
+async def test_purge_expired_drains_batches(no_db):
+    no_db.fetch_all.side_effect = [[{"cache_key": "a"}, {"cache_key": "b"}], [{"cache_key": "c"}]]
+    assert await mood_cache.purge_expired(batch_size=2) == 3
+    assert "expires_at <= now()" in no_db.fetch_all.call_args.kwargs["query"]
+
+
+MENU = [{"id": "m1", "name": "Paneer Tikka", "tags": ["spicy"]}, {"id": "m2", "name": "Salad", "tags": ["fresh"]}]
+PREFS = {"food_preferences": ["indian"], "other_preferences": []}
+
+
+def test_quantize_moods_is_canonical():
+    a = mood_cache.quantize_moods([("Happy", 0.52), ("calm", 0.31), ("sad", 0.17)])
+    b = mood_cache.quantize_moods([("happy", 0.49), ("calm", 0.33), ("sad", 0.18)])
+    assert a == b == [("happy", 0.5), ("calm", 0.3), ("sad", 0.2)]
+    # tiny weights round away, but a lone mood survives
+    assert mood_cache.quantize_moods([("dreamy", 0.01)]) == [("dreamy", 1.0)]
+
+
+def test_rec_key_tracks_menu_and_preferences():
+    moods = mood_cache.quantize_moods([("happy", 1.0)])
+    key = mood_cache.rec_key("r1", moods, PREFS, MENU)
+    assert key == mood_cache.rec_key("r1", moods, dict(PREFS), list(reversed(MENU)))
+    assert key != mood_cache.rec_key("r1", moods, {"food_preferences": ["thai"]}, MENU)
+    renamed = [{**MENU[0], "name": "Paneer Wrap"}, MENU[1]]
+    assert key != mood_cache.rec_key("r1", moods, PREFS, renamed)
+
+
+@pytest.mark.asyncio
+async def test_similar_moods_share_one_llm_call(llm_stub):
+    import asyncio
+    from Mood2FoodRecSys.RecSysFunctions import recommend_food_based_on_mood
+    llm_stub.reply = '{"Suggested_food": [1]}'
+    results = await asyncio.gather(*[
+        recommend_food_based_on_mood([("happy", 0.7 + i / 100), ("calm", 0.3 - i / 100)], PREFS, MENU, restaurant_id="r1")
+        for i in range(5)
+    ])
+    await recommend_food_based_on_mood([("happy", 0.7), ("calm", 0.3)], PREFS, MENU, restaurant_id="r1")
+    assert all([f["id"] for f in r["Suggested_food"]] == ["m1"] for r in results)
+    assert llm_stub.calls == 1
+    # the prompt carries the canonical distribution the result is cached under
+    prompt = llm_stub.last_messages[1]["content"]
+    assert '["happy",0.7]' in prompt
+
+
+@pytest.mark.asyncio
+async def test_invalidate_restaurant_forces_fresh_call(llm_stub):
+    from Mood2FoodRecSys.RecSysFunctions import recommend_food_based_on_mood
+    llm_stub.reply = '{"Suggested_food": []}'
+    await recommend_food_based_on_mood([("happy", 1.0)], PREFS, MENU, restaurant_id="r1")
+    mood_cache.invalidate_restaurant("r2")
+    await recommend_food_based_on_mood([("happy", 1.0)], PREFS, MENU, restaurant_id="r1")
+    mood_cache.invalidate_restaurant("r1")
+    await recommend_food_based_on_mood([("happy", 1.0)], PREFS, MENU, restaurant_id="r1")
+    assert llm_stub.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_abandoned_failing_compute_is_logged(caplog):
+    async def compute():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("llm down")
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(mood_cache.memoize_recommendation(("r1",), compute), timeout=0.01)
+    pending = mood_cache._rec_inflight[("r1",)]
+    await asyncio.wait([pending])
+    # the done-callback retrieved the exception for the caller that gave up
+    assert not pending._log_traceback
+    assert "llm down" in caplog.text
+    assert ("r1",) not in mood_cache._rec_inflight
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from Mood2FoodRecSys import mood_profile
+from Mood2FoodRecSys.RecSys import get_recommendations, RecommendationRequest
+
+HALF_LIFE = mood_profile.MOOD_PROFILE_HALF_LIFE_MINUTES * 60
+
+
+def _song(t):
+    return {"track_name": f"s{t}", "time_stamp": t}
+
+
+def test_fold_decays_older_plays():
+    songs = [_song(HALF_LIFE), _song(0)]
+    analysis = [{"mood": ["Happy"]}, {"mood": ["sad"]}]
+    masses, as_of = mood_profile.fold_songs({}, -1, songs, analysis)
+    assert as_of == HALF_LIFE
+    assert masses["happy"] == pytest.approx(1.0)
+    # one half-life older -> half the pull
+    assert masses["sad"] == pytest.approx(0.5)
+    assert mood_profile.distribution(masses) == [("happy", pytest.approx(2 / 3)), ("sad", pytest.approx(1 / 3))]
+
+
+def test_incremental_fold_matches_batch():
+    songs = [_song(600), _song(300), _song(100)]
+    analysis = [{"mood": ["calm"]}, {"mood": ["happy", "calm"]}, {"mood": ["sad"]}]
+
+    batch, _ = mood_profile.fold_songs({}, -1, songs, analysis)
+    first, as_of = mood_profile.fold_songs({}, -1, songs[1:], analysis[1:])
+    # the second pass only sees the history again; already-folded plays are skipped
+    second, _ = mood_profile.fold_songs(first, as_of, songs, analysis)
+
+    assert second.keys() == batch.keys()
+    for mood in batch:
+        assert second[mood] == pytest.approx(batch[mood])
+
+
+def test_fold_without_new_plays_keeps_profile():
+    masses = {"happy": 1.0}
+    assert mood_profile.fold_songs(masses, 500, [_song(400)], [{"mood": ["sad"]}]) == (masses, 500)
+
+
+@pytest.mark.asyncio
+async def test_fresh_profile_skips_history_and_mood_llm():
+    with patch.object(mood_profile, "current", AsyncMock(return_value=[("happy", 1.0)])), \
+         patch.object(mood_profile, "refresh_in_background") as mock_refresh, \
+         patch('Mood2FoodRecSys.RecSys.get_user_profile_and_recent_tracks') as mock_tracks, \
+         patch('Mood2FoodRecSys.RecSys.analyze_mood_with_groq') as mock_mood, \
+         patch('Mood2FoodRecSys.RecSys.fetch_data_from_db', AsyncMock(return_value=[{"id": "1", "name": "pizza"}])), \
+         patch('Mood2FoodRecSys.RecSys.fetch_preferences_from_db', AsyncMock(return_value={})), \
+         patch('Mood2FoodRecSys.RecSys.recommend_food_based_on_mood',
+               AsyncMock(return_value={"Suggested_food": [{"id": "1"}]})) as mock_rec:
+        result = await get_recommendations(RecommendationRequest(restaurant_id="r1"), {"id": "user123"})
+
+    assert [f["id"] for f in result["recommended_foods"]] == ["1"]
+    mock_tracks.assert_not_called()
+    mock_mood.assert_not_called()
+    assert mock_rec.call_args[0][0] == [("happy", 1.0)]
+    assert mock_refresh.call_args[0][0] == "user123"
+
+
+@pytest.mark.asyncio
+async def test_stale_profile_folds_request_analysis():
+    tracks = [{"index": 1, "track_name": "t", "time_stamp": 100}]
+    analysis = [{"mood": ["happy"]}]
+    with patch.object(mood_profile, "current", AsyncMock(return_value=None)), \
+         patch.object(mood_profile, "fold_in_background") as mock_fold, \
+         patch('Mood2FoodRecSys.RecSys.get_user_profile_and_recent_tracks', AsyncMock(return_value=tracks)), \
+         patch('Mood2FoodRecSys.RecSys.analyze_mood_with_groq', AsyncMock(return_value=analysis)), \
+         patch('Mood2FoodRecSys.RecSys.fetch_data_from_db', AsyncMock(return_value=[{"id": "1", "name": "pizza"}])), \
+         patch('Mood2FoodRecSys.RecSys.fetch_preferences_from_db', AsyncMock(return_value={})), \
+         patch('Mood2FoodRecSys.RecSys.recommend_food_based_on_mood',
+               AsyncMock(return_value={"Suggested_food": [{"id": "1"}]})):
+        await get_recommendations(RecommendationRequest(restaurant_id="r1"), {"id": "user123"})
+
+    mock_fold.assert_called_once_with("user123", tracks, analysis)
+
+
+@pytest.mark.asyncio
+async def test_refresh_in_background_is_single_flight_and_throttled():
+    gate = asyncio.Event()
+
+    async def run(user_id):
+        await gate.wait()
+        mood_profile._refreshed.set(user_id, True)
+
+    refresh = AsyncMock(side_effect=run)
+    for _ in range(5):
+        mood_profile.refresh_in_background("user123", refresh)
+    gate.set()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    mood_profile.refresh_in_background("user123", refresh)
+    refresh.assert_awaited_once_with("user123")
+
+
+@pytest.mark.asyncio
+async def test_clear_cancels_pending_background_work():
+    gate = asyncio.Event()
+    mood_profile.refresh_in_background("user123", AsyncMock(side_effect=lambda user_id: gate.wait()))
+    task = mood_profile._inflight["user123"]
+    mood_profile.clear()
+    assert not mood_profile._inflight
+    await asyncio.sleep(0)
+    assert task.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_fold_upserts_profile_row():
+    transaction = MagicMock()
+    transaction.__aenter__ = AsyncMock()
+    transaction.__aexit__ = AsyncMock(return_value=False)
+    with patch.object(mood_profile, "database") as mock_db:
+        mock_db.transaction = MagicMock(return_value=transaction)
+        mock_db.fetch_one = AsyncMock(return_value={"vector": '{"moods": {"calm": 2.0}, "as_of": 100}'})
+        mock_db.execute = AsyncMock()
+        await mood_profile.fold("user123", [_song(100 + HALF_LIFE)], [{"mood": ["happy"]}])
+
+    sql = mock_db.execute.call_args[1]["query"]
+    values = mock_db.execute.call_args[1]["values"]
+    assert "ON CONFLICT (user_id) WHERE source = 'profile'" in sql
+    assert values["label"] == "calm"
+    assert '"calm": 1.0' in values["vector"] and '"happy": 1.0' in values["vector"]
+    assert mood_profile._refreshed.get("user123") is True
@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+with patch('sqlalchemy.ext.asyncio.create_async_engine'), patch('sqlalchemy.ext.asyncio.async_sessionmaker'):
+    from app.routers import orders
+    from app.background import PeriodicJob
+
+
+def _db_returning(*batches):
+    db = MagicMock()
+    results = []
+    for n in batches:
+        res = MagicMock()
+        res.all = MagicMock(return_value=[("order-id",)] * n)
+        results.append(res)
+    db.execute = AsyncMock(side_effect=results)
+    db.commit = AsyncMock()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_expire_stale_orders_single_statement():
+    db = _db_returning(3)
+    n = await orders.expire_stale_orders(db, max_age_minutes=30, batch_size=100)
+    assert n == 3
+    assert db.execute.await_count == 1
+    sql = str(db.execute.call_args[0][0])
+    assert "for update skip locked" in sql
+    assert "insert into order_status_events" in sql
+    assert db.execute.call_args[0][1] == {"age": 30, "batch": 100}
+    db.commit.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_sweep_stale_orders_drains_full_batches():
+    db = _db_returning(2, 2, 1)
+    session_cm = MagicMock()
+    session_cm.__aenter__ = AsyncMock(return_value=db)
+    session_cm.__aexit__ = AsyncMock(return_value=False)
+    with patch.object(orders, "SessionLocal", MagicMock(return_value=session_cm)), \
+         patch.object(orders.settings, "ORDER_SWEEP_BATCH_SIZE", 2):
+        total = await orders.sweep_stale_orders()
+    assert total == 5
+    assert db.execute.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_periodic_job_records_metrics():
+    job = PeriodicJob("test", AsyncMock(return_value=4), interval=60)
+    await job.run_once()
+    stats = job.stats()
+    assert stats["runs"] == 1
+    assert stats["last_batch_size"] == 4
+    assert stats["total_processed"] == 4
+    assert stats["errors"] == 0
+    assert stats["running"] is False
+
+
+@pytest.mark.asyncio
+async def test_periodic_job_survives_errors():
+    job = PeriodicJob("failing", AsyncMock(side_effect=RuntimeError("db down")), interval=60)
+    assert await job.run_once() == 0
+    assert job.stats()["errors"] == 1
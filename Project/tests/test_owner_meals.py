@@ -3,10 +3,17 @@ from unittest.mock import AsyncMock, patch, MagicMock
 from fastapi import HTTPException
 from app.owner_meals import service
 from app.owner_meals.schemas import MealCreate, MealUpdate
-from app.owner_meals.auth import require_owner
+from app.owner_meals.auth import require_owner, require_owner_restaurant, invalidate_owner_context
 from app.owner_meals.router import router
 
 
+@pytest.fixture(autouse=True)
+def clear_owner_cache():
+    invalidate_owner_context()
+    yield
+    invalidate_owner_context()
+
+
 @pytest.fixture
 def sample_meal_create():
     return MealCreate(
@@ -35,22 +42,9 @@ def mock_owner_user():
     return {"id": "owner-uuid-123", "email": "owner@test.com", "role": "owner"}
 
 
-@pytest.mark.asyncio
-async def test_get_restaurant_by_owner_success():
-    with patch('app.owner_meals.service.database') as mock_db:
-        mock_db.fetch_one = AsyncMock(return_value={"id": "restaurant-uuid-123"})
-        result = await service.get_restaurant_by_owner("owner-uuid-123")
-        assert result == "restaurant-uuid-123"
-        mock_db.fetch_one.assert_called_once()
-
-
-@pytest.mark.asyncio
-async def test_get_restaurant_by_owner_not_found():
-    with patch('app.owner_meals.service.database') as mock_db:
-        mock_db.fetch_one = AsyncMock(return_value=None)
-        with pytest.raises(HTTPException) as exc:
-            await service.get_restaurant_by_owner("owner-uuid-123")
-        assert exc.value.status_code == 404
+@pytest.fixture
+def mock_owner():
+    return {"id": "owner-uuid-123", "email": "owner@test.com", "role": "owner", "restaurant_id": "restaurant-uuid-123"}
 
 
 @pytest.mark.asyncio
@@ -78,7 +72,6 @@ async def test_create_meal_success(sample_meal_create):
 async def test_update_meal_success(sample_meal_update):
     with patch('app.owner_meals.service.database') as mock_db:
         mock_db.fetch_one = AsyncMock(side_effect=[
-            {"id": "meal-uuid-123"},
             {
                 "id": "meal-uuid-123",
                 "restaurant_id": "restaurant-uuid-123",
@@ -92,9 +85,11 @@ async def test_update_meal_success(sample_meal_update):
                 "image_link": "http://example.com/image.jpg"
             }
         ])
-        result = await service.update_meal("meal-uuid-123", "restaurant-uuid-123", sample_meal_update)
+        with patch('app.owner_meals.service.invalidate_restaurant') as invalidate:
+            result = await service.update_meal("meal-uuid-123", "restaurant-uuid-123", sample_meal_update)
         assert result["name"] == "Updated Meal"
         assert result["quantity"] == 15
+        invalidate.assert_called_once_with("restaurant-uuid-123")
 
 
 @pytest.mark.asyncio
@@ -122,7 +117,30 @@ async def test_delete_meal_success():
         mock_db.fetch_one = AsyncMock(return_value={"id": "meal-uuid-123"})
         mock_db.execute = AsyncMock()
         await service.delete_meal("meal-uuid-123", "restaurant-uuid-123")
-        mock_db.execute.assert_called_once()
+        mock_db.fetch_one.assert_called_once()
+        mock_db.execute.assert_not_called()
+        sql, params = mock_db.fetch_one.call_args[0]
+        assert "restaurant_id = :restaurant_id RETURNING id" in sql
+        assert params == {"meal_id": "meal-uuid-123", "restaurant_id": "restaurant-uuid-123"}
+
+
+@pytest.mark.asyncio
+async def test_update_meal_single_statement_reuses_cached_sql():
+    row = {"id": "meal-uuid-123", "restaurant_id": "restaurant-uuid-123", "name": "Meal", "tags": None,
+           "base_price": 10.0, "quantity": 3, "surplus_price": 2.0, "allergens": None, "calories": None,
+           "image_link": None}
+    with patch('app.owner_meals.service.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(return_value=row)
+        await service.update_meal("meal-uuid-123", "restaurant-uuid-123", MealUpdate(quantity=3, surplus_price=2.0))
+        await service.update_meal("meal-uuid-456", "restaurant-uuid-123", MealUpdate(surplus_price=2.0, quantity=3))
+        assert mock_db.fetch_one.call_count == 2
+        first_sql, params = mock_db.fetch_one.call_args_list[0][0]
+        second_sql, _ = mock_db.fetch_one.call_args_list[1][0]
+        assert first_sql is second_sql
+        assert "quantity = :quantity, surplus_price = :surplus_price" in first_sql
+        assert "AND restaurant_id = :restaurant_id" in first_sql
+        assert params == {"quantity": 3, "surplus_price": 2.0,
+                          "meal_id": "meal-uuid-123", "restaurant_id": "restaurant-uuid-123"}
 
 
 @pytest.mark.asyncio
@@ -207,6 +225,60 @@ async def test_require_owner_user_not_found():
         assert exc.value.status_code == 403
 
 
+@pytest.mark.asyncio
+async def test_owner_context_cached_single_query():
+    with patch('app.owner_meals.auth.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(return_value={"role": "owner", "restaurant_id": "restaurant-uuid-123"})
+        mock_user = {"id": "user-uuid-123", "email": "owner@test.com"}
+        first = await require_owner_restaurant(await require_owner(mock_user))
+        second = await require_owner_restaurant(await require_owner(mock_user))
+        assert first["restaurant_id"] == second["restaurant_id"] == "restaurant-uuid-123"
+        mock_db.fetch_one.assert_called_once()
+        assert "LEFT JOIN restaurants" in mock_db.fetch_one.call_args[0][0]
+
+
+@pytest.mark.asyncio
+async def test_owner_context_invalidation_refetches():
+    with patch('app.owner_meals.auth.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(side_effect=[
+            {"role": "owner", "restaurant_id": "restaurant-uuid-123"},
+            {"role": "owner", "restaurant_id": "restaurant-uuid-456"},
+        ])
+        mock_user = {"id": "user-uuid-123", "email": "owner@test.com"}
+        assert (await require_owner_restaurant(mock_user))["restaurant_id"] == "restaurant-uuid-123"
+        invalidate_owner_context("user-uuid-123")
+        assert (await require_owner_restaurant(mock_user))["restaurant_id"] == "restaurant-uuid-456"
+
+
+@pytest.mark.asyncio
+async def test_owner_context_negative_results_not_cached():
+    # a restaurant created or reassigned outside signup is seen on the next request
+    with patch('app.owner_meals.auth.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(side_effect=[
+            {"role": "customer", "restaurant_id": None},
+            {"role": "owner", "restaurant_id": None},
+            {"role": "owner", "restaurant_id": "restaurant-uuid-123"},
+        ])
+        mock_user = {"id": "user-uuid-123", "email": "owner@test.com"}
+        with pytest.raises(HTTPException) as exc:
+            await require_owner(mock_user)
+        assert exc.value.status_code == 403
+        with pytest.raises(HTTPException) as exc:
+            await require_owner_restaurant(mock_user)
+        assert exc.value.status_code == 404
+        assert (await require_owner_restaurant(mock_user))["restaurant_id"] == "restaurant-uuid-123"
+
+
+@pytest.mark.asyncio
+async def test_owner_without_restaurant_gets_404():
+    with patch('app.owner_meals.auth.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(return_value={"role": "owner", "restaurant_id": None})
+        mock_user = {"id": "user-uuid-123", "email": "owner@test.com"}
+        with pytest.raises(HTTPException) as exc:
+            await require_owner_restaurant(mock_user)
+        assert exc.value.status_code == 404
+
+
 # Additional service tests
 @pytest.mark.asyncio
 async def test_create_meal_with_minimal_fields():
@@ -246,7 +318,6 @@ async def test_update_meal_all_fields():
             image_link="http://new.com/img.jpg"
         )
         mock_db.fetch_one = AsyncMock(side_effect=[
-            {"id": "meal-uuid-123"},
             {
                 "id": "meal-uuid-123",
                 "restaurant_id": "restaurant-uuid-123",
@@ -271,7 +342,6 @@ async def test_update_meal_single_field():
     with patch('app.owner_meals.service.database') as mock_db:
         single_update = MealUpdate(quantity=50)
         mock_db.fetch_one = AsyncMock(side_effect=[
-            {"id": "meal-uuid-123"},
             {
                 "id": "meal-uuid-123",
                 "restaurant_id": "restaurant-uuid-123",
@@ -320,7 +390,6 @@ async def test_update_meal_with_zero_values():
     with patch('app.owner_meals.service.database') as mock_db:
         zero_update = MealUpdate(quantity=0, calories=0)
         mock_db.fetch_one = AsyncMock(side_effect=[
-            {"id": "meal-uuid-123"},
             {
                 "id": "meal-uuid-123",
                 "restaurant_id": "restaurant-uuid-123",
@@ -370,3 +439,112 @@ async def test_get_restaurant_meals_with_nulls():
         assert len(result) == 1
         assert result[0]["tags"] is None
         assert result[0]["surplus_price"] is None
+
+
+@pytest.mark.asyncio
+async def test_analytics_sales_daily_buckets(mock_owner):
+    from app.owner_meals import analytics
+    with patch('app.owner_meals.analytics.database') as mock_db:
+        mock_db.fetch_all = AsyncMock(return_value=[
+            {"bucket": "2026-01-01", "orders_count": 4, "units_sold": 10, "revenue": 40.0, "base_value": 80.0}
+        ])
+        result = await analytics.sales_over_time(granularity="day", since=None, until=None, owner=mock_owner)
+        assert result["buckets"][0]["units_sold"] == 10
+        assert result["buckets"][0]["revenue_recovered"] == 0.5
+        sql = mock_db.fetch_all.call_args[0][0]
+        assert "date_trunc('day'" in sql
+        assert "restaurant_sales_hourly" in sql
+
+
+@pytest.mark.asyncio
+async def test_analytics_sales_rejects_bad_granularity(mock_owner):
+    from app.owner_meals import analytics
+    with pytest.raises(HTTPException) as exc:
+        await analytics.sales_over_time(granularity="week", since=None, until=None, owner=mock_owner)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_analytics_meal_sell_through(mock_owner):
+    from app.owner_meals import analytics
+    with patch('app.owner_meals.analytics.database') as mock_db:
+        mock_db.fetch_all = AsyncMock(return_value=[
+            {"meal_id": "meal-1", "name": "Croissant", "quantity": 2, "units_sold": 6, "revenue": 12.0, "base_value": 24.0},
+            {"meal_id": "meal-2", "name": "Regular Pasta", "quantity": None, "units_sold": 1, "revenue": 9.0, "base_value": 9.0},
+        ])
+        result = await analytics.meal_performance(since=None, until=None, owner=mock_owner)
+        assert result["meals"][0]["sell_through_rate"] == 0.75
+        assert result["meals"][1]["sell_through_rate"] is None
+        assert result["meals"][1]["revenue_recovered"] == 1.0
+        # sales of deleted meals stay listed under the recorded name
+        sql = mock_db.fetch_all.call_args[0][0]
+        assert "FULL JOIN" in sql and "COALESCE(m.name, s.meal_name)" in sql
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_meals_single_multirow_statement():
+    meals = [
+        MealCreate(name="Croissant", base_price=4.0, quantity=12, surplus_price=1.5),
+        MealCreate(name="Bagel", base_price=3.0, quantity=5, surplus_price=1.0),
+    ]
+    with patch('app.owner_meals.service.database') as mock_db:
+        mock_db.fetch_all = AsyncMock(return_value=[
+            {"id": "meal-2", "restaurant_id": "rest-1", "name": "Bagel", "tags": None, "base_price": 3.0,
+             "quantity": 5, "surplus_price": 1.0, "allergens": None, "calories": None, "image_link": None,
+             "inserted": True},
+            {"id": "meal-1", "restaurant_id": "rest-1", "name": "Croissant", "tags": None, "base_price": 4.0,
+             "quantity": 12, "surplus_price": 1.5, "allergens": None, "calories": None, "image_link": None,
+             "inserted": False},
+        ])
+        results = await service.bulk_upsert_meals("rest-1", meals)
+
+    assert [r["status"] for r in results] == ["updated", "created"]
+    assert [r["meal"]["id"] for r in results] == ["meal-1", "meal-2"]
+    assert "inserted" not in results[0]["meal"]
+    # no lookup first: the unique (restaurant_id, name) index does the matching
+    assert mock_db.fetch_all.await_count == 1
+    upsert_sql, params = mock_db.fetch_all.call_args[0]
+    assert "ON CONFLICT (restaurant_id, name) DO UPDATE" in upsert_sql
+    assert "name = EXCLUDED.name" not in upsert_sql
+    assert params["name_0"] == "Croissant" and params["name_1"] == "Bagel"
+    assert params["restaurant_id"] == "rest-1"
+
+
+@pytest.mark.asyncio
+async def test_create_meal_duplicate_name_conflict():
+    from asyncpg.exceptions import UniqueViolationError
+    with patch('app.owner_meals.service.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(side_effect=UniqueViolationError("duplicate key"))
+        with pytest.raises(HTTPException) as exc:
+            await service.create_meal("rest-1", MealCreate(name="Croissant", base_price=4.0))
+    assert exc.value.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_csv_reports_per_row(mock_owner):
+    from app.owner_meals.router import bulk_upsert_meals
+    body = "name,base_price,quantity,surplus_price,tags\nCroissant,4,12,1.5,bakery;vegetarian\n,3,1,1,\nCroissant,4,1,1,\n"
+    request = MagicMock()
+    request.headers = {"content-type": "text/csv"}
+    request.body = AsyncMock(return_value=body.encode())
+    with patch('app.owner_meals.router.service') as mock_service:
+        mock_service.bulk_upsert_meals = AsyncMock(return_value=[{"status": "created", "meal": {"id": "meal-1"}}])
+        result = await bulk_upsert_meals(request, mock_owner)
+
+    written = mock_service.bulk_upsert_meals.call_args[0][1]
+    assert len(written) == 1
+    assert written[0].tags == ["bakery", "vegetarian"]
+    assert result["created"] == 1
+    assert result["failed"] == 2
+    assert result["results"][2]["errors"] == ["duplicate name in payload"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_endpoint_rejects_bad_json(mock_owner):
+    from app.owner_meals.router import bulk_upsert_meals
+    request = MagicMock()
+    request.headers = {"content-type": "application/json"}
+    request.body = AsyncMock(return_value=b"{not json")
+    with pytest.raises(HTTPException) as exc:
+        await bulk_upsert_meals(request, mock_owner)
+    assert exc.value.status_code == 400
@@ -2,6 +2,8 @@ import pytest
 import time
 import asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
+import json
+import os
 import sys
 import pathlib
 
@@ -9,9 +11,10 @@ ROOT = pathlib.Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from Mood2FoodRecSys.RecSysFunctions import (
-    compute_time_weights, compute_mood_distribution,
+    compute_time_weights, compute_mood_distribution, compute_mood_distributions,
     get_user_profile_and_recent_tracks, analyze_mood_with_groq
 )
+from Mood2FoodRecSys import llm
 
 
 def test_compute_time_weights_performance():
@@ -317,4 +320,239 @@ def test_json_processing_performance():
     # Should complete within reasonable time
     assert serialize_time < 1.0  # Less than 1 second
     assert deserialize_time < 1.0  # Less than 1 second
-    assert len(parsed_payload["tracks"]) == 1000
\ No newline at end of file
+    assert len(parsed_payload["tracks"]) == 1000
+
+
+def _reference_mood_pipeline(tracks, analysis):
+    """The per-item loops compute_time_weights / compute_mood_distribution used to run."""
+    from collections import defaultdict
+    import numpy as np
+
+    items = {t["index"]: t for t in tracks}
+    times = [v["time_stamp"] for v in items.values()]
+    most_recent = max(times)
+    weights = np.array([1 / (1 + (most_recent - t) / 60) for t in times])
+    weights /= np.sum(weights)
+
+    mood_weights = defaultdict(float)
+    for i, song in enumerate(analysis):
+        for mood in song["mood"]:
+            mood_weights[mood.lower()] += weights[i]
+    total = sum(mood_weights.values())
+    return weights, sorted(((m, w / total) for m, w in mood_weights.items()), key=lambda x: x[1], reverse=True)
+
+
+def _synthetic_history(size, vocab_size=200, seed=7):
+    import random
+    rng = random.Random(seed)
+    moods = [f"Mood_{i}" for i in range(vocab_size)]
+    tracks = [{"index": i, "time_stamp": 1_700_000_000 + rng.random() * 86400} for i in range(size)]
+    analysis = [{"mood": rng.sample(moods, 4)} for _ in range(size)]
+    return tracks, analysis
+
+
+@pytest.mark.parametrize("size,budget", [(10_000, 0.5), (100_000, 3.0)])
+def test_vectorized_mood_pipeline_benchmark(size, budget):
+    """Time weights + mood distribution at 10k/100k songs against the old per-item loops"""
+    tracks, analysis = _synthetic_history(size)
+
+    start = time.perf_counter()
+    ref_weights, ref_dist = _reference_mood_pipeline(tracks, analysis)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    weights = compute_time_weights(tracks)
+    dist = compute_mood_distribution(analysis, weights)
+    vectorized_time = time.perf_counter() - start
+
+    print(f"{size} songs: loops {reference_time * 1000:.1f} ms -> vectorized {vectorized_time * 1000:.1f} ms")
+    assert vectorized_time < budget
+    assert weights == pytest.approx(ref_weights)
+    assert [m for m, _ in dist] == [m for m, _ in ref_dist]
+    assert [w for _, w in dist] == pytest.approx([w for _, w in ref_dist])
+
+
+def test_batched_mood_distributions_benchmark():
+    """1,000 users x 100 songs in one batched call vs one call per user"""
+    tracks, analysis = _synthetic_history(100_000)
+    weights = compute_time_weights(tracks)
+    batch = [(analysis[u * 100:(u + 1) * 100], weights[u * 100:(u + 1) * 100]) for u in range(1000)]
+
+    start = time.perf_counter()
+    one_by_one = [compute_mood_distribution(a, w) for a, w in batch]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = compute_mood_distributions(batch)
+    batch_time = time.perf_counter() - start
+
+    print(f"1000 users: per-user {loop_time * 1000:.1f} ms -> batched {batch_time * 1000:.1f} ms")
+    assert batch_time < 3.0
+    assert len(batched) == len(one_by_one)
+    for single, many in zip(one_by_one, batched):
+        assert dict(many) == pytest.approx(dict(single))
+
+
+BENCH_DATABASE_URL = os.getenv("BENCH_DATABASE_URL")
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not BENCH_DATABASE_URL, reason="set BENCH_DATABASE_URL to a scratch Postgres to run")
+async def test_meal_search_benchmark_1m():
+    """Benchmark /catalog/meals/search against 1M synthetic meals in a scratch schema"""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+    with patch('sqlalchemy.ext.asyncio.create_async_engine'), patch('sqlalchemy.ext.asyncio.async_sessionmaker'):
+        from app.routers import catalog
+
+    url = BENCH_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
+    engine = create_async_engine(url, connect_args={"server_settings": {"search_path": "bench_search,public"}})
+    setup = [
+        "drop schema if exists bench_search cascade",
+        "create schema bench_search",
+        "create extension if not exists pg_trgm",
+        """create table bench_search.restaurants (
+               id uuid primary key default gen_random_uuid(), name text,
+               latitude float8, longitude float8)""",
+        """create table bench_search.meals (
+               id uuid primary key default gen_random_uuid(), restaurant_id uuid not null,
+               name text not null, tags text[], base_price numeric not null, quantity int,
+               surplus_price numeric, allergens text[], calories int, image_link text,
+               created_at timestamp default now())""",
+        """create table bench_search.meal_price_schedules (
+               meal_id uuid primary key, start_price numeric, floor_price numeric,
+               step_percent numeric, step_minutes int, starts_at timestamp, ends_at timestamp)""",
+        """insert into bench_search.restaurants (name, latitude, longitude)
+           select 'r' || g, 35.7 + random() * 0.3, -78.8 + random() * 0.3
+           from generate_series(1, 2000) g""",
+        """insert into bench_search.meals
+               (restaurant_id, name, tags, base_price, quantity, surplus_price, allergens, calories)
+           select r.id,
+                  (array['paneer curry','veggie burger','chicken wrap','pasta bake','tofu bowl'])[1 + g % 5] || ' ' || g,
+                  array[(array['vegan','vegetarian','spicy','gf','halal','keto'])[1 + g % 6],
+                        (array['comfort','healthy','quick','sweet'])[1 + g % 4]],
+                  5 + (g % 25),
+                  case when g % 3 = 0 then g % 7 else 0 end,
+                  case when g % 3 = 0 then 2 + (g % 12) end,
+                  case when g % 4 = 0 then array['nuts'] when g % 5 = 0 then array['dairy'] else '{}' end,
+                  200 + (g % 900)
+           from generate_series(1, 1000000) g
+           join lateral (select id from bench_search.restaurants offset g % 2000 limit 1) r on true""",
+        "create index on bench_search.meals using gin (tags)",
+        "create index on bench_search.meals using gin (lower(name) gin_trgm_ops)",
+        "create index on bench_search.meals (calories)",
+        "create index on bench_search.meals (restaurant_id)",
+        "analyze bench_search.restaurants",
+        "analyze bench_search.meals",
+    ]
+    async with engine.begin() as conn:
+        for stmt in setup:
+            await conn.execute(text(stmt))
+
+    defaults = dict(
+        q=None, include_tags=None, exclude_allergens=None, min_price=None, max_price=None,
+        min_calories=None, max_calories=None, lat=None, lng=None, radius_km=5,
+        surplus_only=False, sort="price_asc", limit=20, cursor=None,
+    )
+    scenarios = {
+        "text": {"q": "paneer 12"},
+        "tags+allergens": {"include_tags": ["vegan"], "exclude_allergens": ["nuts"], "max_price": 10},
+        "calories+surplus": {"min_calories": 300, "max_calories": 400, "surplus_only": True},
+        "nearby": {"lat": 35.85, "lng": -78.65, "radius_km": 2, "sort": "distance", "include_tags": ["spicy"]},
+    }
+    Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    try:
+        async with Session() as db:
+            for label, params in scenarios.items():
+                timings = []
+                out = None
+                for _ in range(5):
+                    start = time.perf_counter()
+                    out = await catalog.search_meals(db=db, **{**defaults, **params})
+                    timings.append(time.perf_counter() - start)
+                # second page through the cursor
+                if out["next_cursor"]:
+                    start = time.perf_counter()
+                    await catalog.search_meals(db=db, **{**defaults, **params, "cursor": out["next_cursor"]})
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                print(f"meal search [{label}]: total={out['total']} "
+                      f"p50={timings[len(timings) // 2] * 1000:.1f}ms max={timings[-1] * 1000:.1f}ms")
+                assert len(out["items"]) <= 20
+                assert timings[len(timings) // 2] < 2.0
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("drop schema if exists bench_search cascade"))
+        await engine.dispose()
+
+
+def test_food_prompt_size_500_items():
+    """Prompt size for a 500-item menu: old repr-with-UUIDs format vs compact aliases"""
+    import uuid
+    import random
+    from Mood2FoodRecSys.RecSys_Prompts import encode_food_prompt, estimate_tokens
+
+    rng = random.Random(3)
+    vocab = ["vegan", "vegetarian", "spicy", "gluten-free", "comfort", "fresh", "sweet", "halal", "surplus"]
+    menu = [
+        {"id": uuid.UUID(int=rng.getrandbits(128)), "name": f"Dish number {i}",
+         "tags": rng.sample(vocab, 3) + ["surplus"]}
+        for i in range(500)
+    ]
+    moods = [("happy", 0.6), ("calm", 0.4)]
+    prefs = {"food_preferences": ["vegan"], "other_preferences": []}
+
+    old_items = [{"id": m["id"], "name": m["name"], "tags": m["tags"]} for m in menu]
+    old_prompt = f"""
+            "moods": {moods},
+            "food_preference": {prefs["food_preferences"]},
+            "other_preferences": {prefs["other_preferences"]}
+            "available_items": {old_items}
+        """
+    compact, aliases = encode_food_prompt(moods, prefs, menu, token_budget=10**9)
+    budgeted, kept = encode_food_prompt(moods, prefs, menu, token_budget=2000)
+
+    old_tokens, compact_tokens, budget_tokens = map(estimate_tokens, (old_prompt, compact, budgeted))
+    print(f"500 items: {old_tokens} -> {compact_tokens} tokens (all items), {budget_tokens} within budget ({len(kept)} items)")
+    assert len(aliases) == 500
+    assert compact_tokens < old_tokens * 0.5
+    assert budget_tokens <= 2000 and len(kept) < 500
+
+
+@pytest.mark.asyncio
+async def test_track_mood_store_token_savings():
+    """Sliding listening history (2 new songs per request) with and without the track store"""
+    from Mood2FoodRecSys import mood_cache
+
+    stream = [
+        {"track_name": f"Track {i}", "artists": f"Artist {i % 7}", "played_at": "2026-01-01 12:00:00",
+         "time_stamp": 1000 + i}
+        for i in range(60)
+    ]
+    windows = [
+        [{**t, "index": n} for n, t in enumerate(stream[start:start + 10], start=1)]
+        for start in range(0, 50, 2)
+    ]
+
+    async def run(keep_labels):
+        stub = llm.StubProvider()
+        mood_cache.clear()
+        llm.clear()
+        with patch.object(llm, "get_provider", return_value=stub), \
+             patch.object(mood_cache, "database") as db:
+            db.fetch_all = AsyncMock(return_value=[])
+            db.execute = AsyncMock()
+            for window in windows:
+                if not keep_labels:
+                    mood_cache.clear()
+                result = await analyze_mood_with_groq(window)
+                assert [r["song name"] for r in result] == [t["track_name"] for t in window]
+        return stub.calls, llm.stats()["mood_analysis"]["prompt_tokens"]
+
+    baseline_calls, baseline_tokens = await run(keep_labels=False)
+    cached_calls, cached_tokens = await run(keep_labels=True)
+
+    print(f"mood analysis: {baseline_tokens} -> {cached_tokens} tokens over {cached_calls} calls")
+    assert cached_calls == baseline_calls == len(windows)
+    # the system prompt is a fixed cost; the song payload shrinks to the 2 new songs
+    assert cached_tokens < baseline_tokens * 0.6
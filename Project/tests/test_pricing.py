@@ -0,0 +1,89 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+
+with patch('sqlalchemy.ext.asyncio.create_async_engine'), patch('sqlalchemy.ext.asyncio.async_sessionmaker'):
+    from app import pricing
+    from app.owner_meals import service
+    from app.owner_meals.schemas import PriceScheduleCreate
+
+START = datetime(2026, 1, 1, 17, 0, tzinfo=timezone.utc)
+
+
+def test_scheduled_price_compounds_per_step():
+    now = START + timedelta(minutes=65)
+    assert pricing.scheduled_price(10.0, 10, 30, 1.0, START, None, now) == 8.1
+
+
+def test_scheduled_price_respects_floor_and_end():
+    late = START + timedelta(hours=10)
+    assert pricing.scheduled_price(10.0, 10, 30, 6.0, START, None, late) == 6.0
+    ends = START + timedelta(minutes=30)
+    assert pricing.scheduled_price(10.0, 10, 30, 1.0, START, ends, late) == 9.0
+
+
+def test_scheduled_price_before_start_is_start_price():
+    assert pricing.scheduled_price(10.0, 10, 30, 1.0, START, None, START - timedelta(hours=1)) == 10.0
+
+
+def test_effective_price_sql_falls_back_to_surplus_price():
+    sql = pricing.effective_price_sql()
+    assert "when ps.meal_id is null then m.surplus_price" in sql
+    assert "greatest(\n            ps.floor_price" in sql
+
+
+@pytest.mark.asyncio
+async def test_materialize_scheduled_prices_skips_locked():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[("m1",), ("m2",)])))
+    db.commit = AsyncMock()
+    assert await pricing.materialize_scheduled_prices(db, batch_size=500) == 2
+    sql = str(db.execute.call_args[0][0])
+    assert "for update of m skip locked" in sql
+    assert "is distinct from m.surplus_price" in sql
+
+
+@pytest.mark.asyncio
+async def test_set_price_schedule_not_owned():
+    with patch('app.owner_meals.service.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(return_value=None)
+        with pytest.raises(HTTPException) as exc:
+            await service.set_price_schedule(
+                "meal-1", "rest-1", PriceScheduleCreate(step_percent=10, step_minutes=30, floor_price=1)
+            )
+        assert exc.value.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_set_price_schedule_returns_current_price():
+    starts_at = datetime.now(timezone.utc) - timedelta(minutes=31)
+    with patch('app.owner_meals.service.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(return_value={
+            "meal_id": "meal-1", "start_price": 10.0, "step_percent": 10.0, "step_minutes": 30,
+            "floor_price": 1.0, "starts_at": starts_at, "ends_at": None,
+        })
+        result = await service.set_price_schedule(
+            "meal-1", "rest-1", PriceScheduleCreate(step_percent=10, step_minutes=30, floor_price=1)
+        )
+    assert result["current_price"] == 9.0
+    assert "m.restaurant_id = :restaurant_id" in mock_db.fetch_one.call_args[0][0]
+
+
+@pytest.mark.asyncio
+async def test_set_price_schedule_rejects_floor_above_current_price():
+    # no start_price: the floor is checked against the meal's price in SQL
+    with patch('app.owner_meals.service.database') as mock_db:
+        mock_db.fetch_one = AsyncMock(side_effect=[None, {"price": 8.0}])
+        with pytest.raises(HTTPException) as exc:
+            await service.set_price_schedule(
+                "meal-1", "rest-1", PriceScheduleCreate(step_percent=10, step_minutes=30, floor_price=9)
+            )
+    assert exc.value.status_code == 422
+    sql = mock_db.fetch_one.call_args_list[0][0][0]
+    assert ":floor_price <= COALESCE(:start_price, m.surplus_price, m.base_price)" in sql
+
+
+def test_price_schedule_rejects_floor_above_start():
+    with pytest.raises(ValueError):
+        PriceScheduleCreate(step_percent=10, step_minutes=30, floor_price=12, start_price=10)
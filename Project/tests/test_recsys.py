@@ -7,8 +7,9 @@ import pathlib
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
-from Mood2FoodRecSys.RecSys import get_recommendations, RecommendationRequest
+from Mood2FoodRecSys.RecSys import get_recommendations, stream_recommendations, RecommendationRequest
 import asyncio
+import json
 
 
 @pytest.mark.asyncio
@@ -184,3 +185,127 @@ async def test_get_recommendations_large_dataset():
         request = RecommendationRequest(restaurant_id="rest456")
         result = await get_recommendations(request, mock_user)
         assert "recommended_foods" in result
+
+
+@pytest.mark.asyncio
+async def test_get_recommendations_overlaps_db_reads_and_sets_server_timing():
+    from fastapi import Response
+
+    async def slow(value, delay):
+        await asyncio.sleep(delay)
+        return value
+
+    async def tracks(**kwargs):
+        return await slow([{"index": 1, "track_name": "test", "time_stamp": 1000}], 0.1)
+
+    async def mood(tracks):
+        return await slow([{"mood": ["happy"]}], 0.1)
+
+    async def menu(**kwargs):
+        return await slow([{"id": "1", "name": "pizza", "tags": ["comfort"]}], 0.15)
+
+    async def prefs(**kwargs):
+        return await slow({}, 0.15)
+
+    with patch('Mood2FoodRecSys.RecSys.get_user_profile_and_recent_tracks', side_effect=tracks), \
+         patch('Mood2FoodRecSys.RecSys.analyze_mood_with_groq', side_effect=mood), \
+         patch('Mood2FoodRecSys.RecSys.fetch_data_from_db', side_effect=menu), \
+         patch('Mood2FoodRecSys.RecSys.fetch_preferences_from_db', side_effect=prefs), \
+         patch('Mood2FoodRecSys.RecSys.recommend_food_based_on_mood',
+               AsyncMock(return_value={"Suggested_food": [{"id": "1"}]})):
+        response = Response()
+        start = asyncio.get_event_loop().time()
+        result = await get_recommendations(RecommendationRequest(restaurant_id="rest456"), {"id": "user123"}, response)
+        elapsed = asyncio.get_event_loop().time() - start
+
+    assert [f["id"] for f in result["recommended_foods"]] == ["1"]
+    # spotify (0.1) -> mood (0.1) with the 0.15s DB reads hidden underneath
+    assert elapsed < 0.3
+    timing = response.headers["Server-Timing"]
+    for stage in ("history", "menu", "preferences", "mood", "recommend", "total"):
+        assert f"{stage};dur=" in timing
+
+
+@pytest.mark.asyncio
+async def test_get_recommendations_cancels_db_reads_when_spotify_fails():
+    started = asyncio.Event()
+    cancelled = []
+
+    async def menu(**kwargs):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def tracks(**kwargs):
+        await started.wait()
+        raise HTTPException(status_code=401, detail="Spotify authentication failed")
+
+    with patch('Mood2FoodRecSys.RecSys.get_user_profile_and_recent_tracks', side_effect=tracks), \
+         patch('Mood2FoodRecSys.RecSys.fetch_data_from_db', side_effect=menu), \
+         patch('Mood2FoodRecSys.RecSys.fetch_preferences_from_db', AsyncMock(return_value={})):
+        with pytest.raises(HTTPException) as exc_info:
+            await get_recommendations(RecommendationRequest(restaurant_id="rest456"), {"id": "user123"})
+    assert exc_info.value.status_code == 401
+    assert cancelled == [True]
+
+
+async def _read_events(response):
+    events = []
+    async for chunk in response.body_iterator:
+        head, data = chunk.strip().split("\n")
+        events.append((head[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_stream_recommendations_sends_fallback_before_moods():
+    gate = asyncio.Event()
+
+    async def tracks(**kwargs):
+        await gate.wait()
+        return [{"index": 1, "track_name": "test", "time_stamp": 1000}]
+
+    async def fallback(restaurant_id):
+        gate.set()
+        return [{"id": "2", "name": "soup"}]
+
+    with patch('Mood2FoodRecSys.RecSys.get_user_profile_and_recent_tracks', side_effect=tracks), \
+         patch('Mood2FoodRecSys.RecSys.fetch_popular_surplus', side_effect=fallback), \
+         patch('Mood2FoodRecSys.RecSys.analyze_mood_with_groq', AsyncMock(return_value=[{"mood": ["happy"]}])), \
+         patch('Mood2FoodRecSys.RecSys.fetch_data_from_db', AsyncMock(return_value=[{"id": "1", "name": "pizza"}])), \
+         patch('Mood2FoodRecSys.RecSys.fetch_preferences_from_db', AsyncMock(return_value={})), \
+         patch('Mood2FoodRecSys.RecSys.recommend_food_based_on_mood',
+               AsyncMock(return_value={"Suggested_food": [{"id": "1"}]})):
+        response = await stream_recommendations(RecommendationRequest(restaurant_id="rest456"), {"id": "user123"})
+        events = await _read_events(response)
+
+    assert response.media_type == "text/event-stream"
+    assert [name for name, _ in events] == ["fallback", "moods", "recommendations"]
+    assert events[0][1] == {"recommended_foods": [{"id": "2", "name": "soup"}]}
+    assert events[1][1] == {"moods": [["happy", 1.0]]}
+    assert [f["id"] for f in events[2][1]["recommended_foods"]] == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_stream_recommendations_reports_errors_as_events():
+    with patch('Mood2FoodRecSys.RecSys.get_user_profile_and_recent_tracks', AsyncMock(return_value=[])), \
+         patch('Mood2FoodRecSys.RecSys.fetch_popular_surplus', AsyncMock(return_value=[])), \
+         patch('Mood2FoodRecSys.RecSys.fetch_data_from_db', AsyncMock(return_value=[])), \
+         patch('Mood2FoodRecSys.RecSys.fetch_preferences_from_db', AsyncMock(return_value={})):
+        response = await stream_recommendations(RecommendationRequest(restaurant_id="rest456"), {"id": "user123"})
+        events = await _read_events(response)
+
+    assert events == [
+        ("fallback", {"recommended_foods": []}),
+        ("error", {"status_code": 404, "detail": "No recent tracks found for user"}),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_recommendations_validates_before_streaming():
+    with pytest.raises(HTTPException) as exc_info:
+        await stream_recommendations(RecommendationRequest(restaurant_id=""), {"id": "user123"})
+    assert exc_info.value.status_code == 400
@@ -11,11 +11,11 @@ sys.path.insert(0, str(ROOT))
 
 from Mood2FoodRecSys.RecSysFunctions import (
     get_spotify_client, get_user_profile_and_recent_tracks, compute_time_weights,
-    analyze_mood_with_groq, compute_mood_distribution, recommend_food_based_on_mood,
+    analyze_mood_with_groq, compute_mood_distribution, compute_mood_distributions, recommend_food_based_on_mood,
     fetch_data_from_db, fetch_preferences_from_db
 )
-import spotipy
-import requests
+from Mood2FoodRecSys.spotify_client import SpotifyError
+import httpx
 import asyncio
 
 
@@ -27,8 +27,8 @@ async def test_get_spotify_client_success():
         "expires_at": 9999999999
     }
     
-    with patch('Mood2FoodRecSys.RecSysFunctions.database') as mock_db, \
-         patch('Mood2FoodRecSys.RecSysFunctions.spotipy.Spotify') as mock_spotify:
+    with patch('Mood2FoodRecSys.spotify_tokens.database') as mock_db, \
+         patch('Mood2FoodRecSys.RecSysFunctions.SpotifyClient') as mock_spotify:
         
         mock_db.fetch_one = AsyncMock(return_value=mock_db_response)
         mock_spotify_instance = MagicMock()
@@ -36,6 +36,7 @@ async def test_get_spotify_client_success():
         
         result = await get_spotify_client("user123")
         assert result == mock_spotify_instance
+        mock_spotify.assert_called_once_with("valid_token")
 
 
 @pytest.mark.asyncio
@@ -47,7 +48,7 @@ async def test_get_spotify_client_missing_user():
 
 @pytest.mark.asyncio
 async def test_get_spotify_client_no_auth_found():
-    with patch('Mood2FoodRecSys.RecSysFunctions.database') as mock_db:
+    with patch('Mood2FoodRecSys.spotify_tokens.database') as mock_db:
         mock_db.fetch_one = AsyncMock(return_value=None)
         
         with pytest.raises(HTTPException) as exc_info:
@@ -69,7 +70,7 @@ async def test_get_user_profile_and_recent_tracks_success():
     
     with patch('Mood2FoodRecSys.RecSysFunctions.get_spotify_client') as mock_client:
         mock_sp = MagicMock()
-        mock_sp.current_user_recently_played.return_value = mock_tracks_data
+        mock_sp.current_user_recently_played = AsyncMock(return_value=mock_tracks_data)
         mock_client.return_value = mock_sp
         
         result = await get_user_profile_and_recent_tracks("user123")
@@ -81,7 +82,7 @@ async def test_get_user_profile_and_recent_tracks_success():
 async def test_get_user_profile_and_recent_tracks_empty():
     with patch('Mood2FoodRecSys.RecSysFunctions.get_spotify_client') as mock_client:
         mock_sp = MagicMock()
-        mock_sp.current_user_recently_played.return_value = {"items": []}
+        mock_sp.current_user_recently_played = AsyncMock(return_value={"items": []})
         mock_client.return_value = mock_sp
         
         result = await get_user_profile_and_recent_tracks("user123")
@@ -105,15 +106,11 @@ def test_compute_time_weights_empty():
 
 
 @pytest.mark.asyncio
-async def test_analyze_mood_with_groq_success():
-    mock_response = MagicMock()
-    mock_response.choices[0].message.content = '[{"mood": ["happy"]}]'
-    
-    with patch('Mood2FoodRecSys.RecSysFunctions.client') as mock_client:
-        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
-        
-        result = await analyze_mood_with_groq([{"track": "test"}])
-        assert result == [{"mood": ["happy"]}]
+async def test_analyze_mood_with_groq_success(llm_stub):
+    llm_stub.reply = '[{"mood": ["happy"]}]'
+
+    result = await analyze_mood_with_groq([{"track": "test"}])
+    assert result == [{"mood": ["happy"]}]
 
 
 @pytest.mark.asyncio
@@ -123,16 +120,12 @@ async def test_analyze_mood_with_groq_empty_input():
 
 
 @pytest.mark.asyncio
-async def test_analyze_mood_with_groq_invalid_json():
-    mock_response = MagicMock()
-    mock_response.choices[0].message.content = 'invalid json'
-    
-    with patch('Mood2FoodRecSys.RecSysFunctions.client') as mock_client:
-        mock_client.chat.completions.create.return_value = mock_response
-        
-        with pytest.raises(HTTPException) as exc_info:
-            await analyze_mood_with_groq([{"track": "test"}])
-        assert exc_info.value.status_code == 500
+async def test_analyze_mood_with_groq_invalid_json(llm_stub):
+    llm_stub.reply = 'invalid json'
+
+    with pytest.raises(HTTPException) as exc_info:
+        await analyze_mood_with_groq([{"track": "test"}])
+    assert exc_info.value.status_code == 500
 
 
 def test_compute_mood_distribution_success():
@@ -149,19 +142,37 @@ def test_compute_mood_distribution_empty():
     assert result == []
 
 
+def test_compute_mood_distribution_counts_case_variants_together():
+    response_json = [{"mood": ["Happy", "calm"]}, {"mood": ["happy"]}, {"mood": ["calm"]}]
+    result = compute_mood_distribution(response_json, np.array([0.5, 0.25, 0.25]))
+    assert dict(result) == pytest.approx({"happy": 0.5, "calm": 0.5})
+    # ties keep first-seen order
+    assert [m for m, _ in result] == ["happy", "calm"]
+
+
+def test_compute_mood_distributions_matches_single_user():
+    batch = [
+        ([{"mood": ["happy", "energetic"]}, {"mood": ["sad"]}], np.array([0.7, 0.3])),
+        ([], np.array([])),
+        ([{"mood": "invalid"}, {"mood": ["Calm"]}], np.array([0.5, 0.5])),
+    ]
+    result = compute_mood_distributions(batch)
+    assert len(result) == 3
+    assert result[1] == []
+    for (response_json, weights), dist in zip(batch, result):
+        assert dist == [(m, pytest.approx(w)) for m, w in compute_mood_distribution(response_json, weights)]
+
+
 @pytest.mark.asyncio
-async def test_recommend_food_based_on_mood_success():
-    mock_response = MagicMock()
-    mock_response.choices[0].message.content = '{"Suggested_food": ["pizza"]}'
+async def test_recommend_food_based_on_mood_success(llm_stub):
+    llm_stub.reply = '{"Suggested_food": [1]}'
+    pizza = {"id": "uuid-pizza", "name": "pizza", "tags": ["italian"]}
     
-    with patch('Mood2FoodRecSys.RecSysFunctions.client') as mock_client, \
-         patch('Mood2FoodRecSys.RecSysFunctions.generate_user_prompt') as mock_prompt:
-        
-        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
-        mock_prompt.return_value = "test prompt"
+    with patch('Mood2FoodRecSys.RecSysFunctions.encode_food_prompt') as mock_prompt:
+        mock_prompt.return_value = ("test prompt", [pizza])
         
-        result = await recommend_food_based_on_mood([("happy", 0.8)], {}, [{"name": "pizza"}])
-        assert result == {"Suggested_food": ["pizza"]}
+        result = await recommend_food_based_on_mood([("happy", 0.8)], {}, [pizza])
+        assert result == {"Suggested_food": [pizza]}
 
 
 @pytest.mark.asyncio
@@ -217,28 +228,26 @@ async def test_get_spotify_client_token_refresh_success():
         "expires_at": 1000  # Expired
     }
     
-    with patch('Mood2FoodRecSys.RecSysFunctions.database') as mock_db, \
-         patch('Mood2FoodRecSys.RecSysFunctions.spotipy.Spotify') as mock_spotify, \
-         patch('Mood2FoodRecSys.RecSysFunctions.requests.post') as mock_post, \
-         patch('Mood2FoodRecSys.RecSysFunctions.time.time', return_value=2000):
+    with patch('Mood2FoodRecSys.spotify_tokens.database') as mock_db, \
+         patch('Mood2FoodRecSys.RecSysFunctions.SpotifyClient') as mock_spotify, \
+         patch('Mood2FoodRecSys.spotify_tokens.request_token') as mock_post, \
+         patch('Mood2FoodRecSys.spotify_tokens.time.time', return_value=2000):
         
         mock_db.fetch_one = AsyncMock(return_value=mock_db_response)
         mock_db.execute = AsyncMock()
         
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_post.return_value = {
             "access_token": "new_token",
             "expires_in": 3600
         }
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
         
         mock_spotify_instance = MagicMock()
         mock_spotify.return_value = mock_spotify_instance
         
         result = await get_spotify_client("user123")
         assert result == mock_spotify_instance
-        mock_post.assert_called_once()
+        mock_post.assert_awaited_once()
+        mock_spotify.assert_called_once_with("new_token")
 
 
 @pytest.mark.asyncio
@@ -250,12 +259,13 @@ async def test_get_spotify_client_refresh_network_error():
         "expires_at": 1000
     }
     
-    with patch('Mood2FoodRecSys.RecSysFunctions.database') as mock_db, \
-         patch('Mood2FoodRecSys.RecSysFunctions.requests.post') as mock_post, \
-         patch('Mood2FoodRecSys.RecSysFunctions.time.time', return_value=2000):
+    with patch('Mood2FoodRecSys.spotify_tokens.database') as mock_db, \
+         patch('Mood2FoodRecSys.spotify_tokens.request_token') as mock_post, \
+         patch('Mood2FoodRecSys.spotify_tokens.time.time', return_value=2000):
         
         mock_db.fetch_one = AsyncMock(return_value=mock_db_response)
-        mock_post.side_effect = requests.RequestException("Network error")
+        mock_db.execute = AsyncMock()
+        mock_post.side_effect = httpx.ConnectError("Network error")
         
         with pytest.raises(HTTPException) as exc_info:
             await get_spotify_client("user123")
@@ -267,7 +277,7 @@ async def test_get_user_profile_spotify_exception():
     """Test Spotify API exception handling"""
     with patch('Mood2FoodRecSys.RecSysFunctions.get_spotify_client') as mock_client:
         mock_sp = MagicMock()
-        mock_sp.current_user_recently_played.side_effect = spotipy.SpotifyException(401, -1, "Unauthorized")
+        mock_sp.current_user_recently_played = AsyncMock(side_effect=SpotifyError(401, "Unauthorized"))
         mock_client.return_value = mock_sp
         
         with pytest.raises(HTTPException) as exc_info:
@@ -303,7 +313,7 @@ async def test_get_user_profile_malformed_track_data():
     
     with patch('Mood2FoodRecSys.RecSysFunctions.get_spotify_client') as mock_client:
         mock_sp = MagicMock()
-        mock_sp.current_user_recently_played.return_value = mock_tracks_data
+        mock_sp.current_user_recently_played = AsyncMock(return_value=mock_tracks_data)
         mock_client.return_value = mock_sp
         
         result = await get_user_profile_and_recent_tracks("user123")
@@ -329,29 +339,36 @@ def test_compute_time_weights_edge_cases():
     assert weights[0] == 1.0
 
 
+def test_compute_time_weights_dedupes_by_index():
+    """A repeated index is one track, weighted by its last entry"""
+    items = [
+        {"index": 1, "time_stamp": 1000},
+        {"index": 2, "time_stamp": 1060},
+        {"index": 1, "time_stamp": 1060},
+    ]
+    weights = compute_time_weights(items)
+    assert len(weights) == 2
+    assert weights == pytest.approx([0.5, 0.5])
+
+
 @pytest.mark.asyncio
-async def test_analyze_mood_groq_timeout():
+async def test_analyze_mood_groq_timeout(llm_stub):
     """Test Groq API timeout handling"""
-    with patch('Mood2FoodRecSys.RecSysFunctions.client') as mock_client:
-        mock_client.chat.completions.create = AsyncMock(side_effect=asyncio.TimeoutError())
-        
-        with pytest.raises(HTTPException) as exc_info:
-            await analyze_mood_with_groq([{"track": "test"}])
-        assert exc_info.value.status_code == 500
+    llm_stub.reply = asyncio.TimeoutError()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await analyze_mood_with_groq([{"track": "test"}])
+    assert exc_info.value.status_code == 500
 
 
 @pytest.mark.asyncio
-async def test_analyze_mood_empty_response():
+async def test_analyze_mood_empty_response(llm_stub):
     """Test empty response from Groq API"""
-    mock_response = MagicMock()
-    mock_response.choices[0].message.content = ""
-    
-    with patch('Mood2FoodRecSys.RecSysFunctions.client') as mock_client:
-        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
-        
-        with pytest.raises(HTTPException) as exc_info:
-            await analyze_mood_with_groq([{"track": "test"}])
-        assert exc_info.value.status_code == 500
+    llm_stub.reply = ""
+
+    with pytest.raises(HTTPException) as exc_info:
+        await analyze_mood_with_groq([{"track": "test"}])
+    assert exc_info.value.status_code == 500
 
 
 def test_compute_mood_distribution_malformed_data():
@@ -380,14 +397,13 @@ def test_compute_mood_distribution_malformed_data():
 
 
 @pytest.mark.asyncio
-async def test_recommend_food_rate_limiting():
+async def test_recommend_food_rate_limiting(llm_stub):
     """Test handling of API rate limiting"""
-    with patch('Mood2FoodRecSys.RecSysFunctions.client') as mock_client:
-        mock_client.chat.completions.create = AsyncMock(side_effect=Exception("Rate limit exceeded"))
-        
-        with pytest.raises(HTTPException) as exc_info:
-            await recommend_food_based_on_mood([("happy", 0.8)], {}, [{"name": "pizza"}])
-        assert exc_info.value.status_code == 500
+    llm_stub.reply = Exception("Rate limit exceeded")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await recommend_food_based_on_mood([("happy", 0.8)], {}, [{"name": "pizza"}])
+    assert exc_info.value.status_code == 500
 
 
 @pytest.mark.asyncio
@@ -75,6 +75,8 @@ def test_generate_user_prompt_exception_handling():
     
     assert "moods" in result
     assert "food_preference" in result
+    # still a JSON payload for the JSON-only food prompt
+    assert json.loads(result)["available_items"] == []
 
 
 def test_generate_user_prompt_unicode_characters():
@@ -182,3 +184,35 @@ def test_generate_user_prompt_nested_data_structures():
     result = generate_user_prompt(top_moods, preference, relevant_food_items)
     assert "happy" in result
     assert "available_items" in result
+
+
+def test_encode_food_prompt_aliases_round_trip():
+    from Mood2FoodRecSys.RecSys_Prompts import encode_food_prompt, decode_suggestions
+    menu = [
+        {"id": "6f1c2d9e-0000-4000-8000-000000000001", "name": "Soup", "tags": ["warm", "Vegan", "warm"]},
+        {"id": "6f1c2d9e-0000-4000-8000-000000000002", "name": "Salad", "tags": ["vegan", "fresh"]},
+    ]
+    prompt, aliases = encode_food_prompt([("calm", 1.0)], None, menu)
+    payload = json.loads(prompt)
+
+    assert "6f1c2d9e" not in prompt
+    assert payload["shared_tags"] == ["vegan"]
+    assert payload["available_items"] == [{"i": 1, "n": "Soup", "t": ["warm"]}, {"i": 2, "n": "Salad", "t": ["fresh"]}]
+
+    decoded = decode_suggestions({"Suggested_food": [2, "1", {"i": 2}, 7, "pizza"]}, aliases)
+    assert [f["id"] for f in decoded["Suggested_food"]] == [menu[1]["id"], menu[0]["id"]]
+
+
+def test_encode_food_prompt_prefilters_to_budget():
+    from Mood2FoodRecSys.RecSys_Prompts import encode_food_prompt, estimate_tokens
+    menu = [{"id": f"id-{i}", "name": f"Plain dish {i}", "tags": ["misc"]} for i in range(200)]
+    menu[150] = {"id": "soup", "name": "Warm comfort soup", "tags": ["soup", "warm"]}
+
+    prompt, aliases = encode_food_prompt([("sad", 1.0)], None, menu, token_budget=300)
+
+    assert estimate_tokens(prompt) <= 300
+    assert 0 < len(aliases) < len(menu)
+    # the cheap local score keeps the item that matches the mood
+    assert "soup" in [a["id"] for a in aliases]
+    # kept items stay in menu order
+    assert [a["id"] for a in aliases] == [m["id"] for m in menu if m in aliases]
@@ -162,6 +162,10 @@ def test_list_meals_surplus_only():
     response = client.get("/catalog/restaurants/r1/meals?surplus_only=true")
     assert response.status_code in [200, 500]
 
+def test_list_meals_for_restaurant_tag_filters():
+    response = client.get("/catalog/restaurants/r1/meals?include_tags=vegan,gf&exclude_allergens=nuts")
+    assert response.status_code in [200, 500]
+
 # ============ Debug Auth Router Tests ============
 
 def test_debug_whoami():
@@ -179,6 +183,10 @@ def test_patch_me():
     response = client.patch("/me", json={"name": "Updated Name"})
     assert response.status_code in [200, 500]
 
+def test_get_my_impact():
+    response = client.get("/me/impact")
+    assert response.status_code in [200, 500]
+
 # ============ Meals Router Tests ============
 
 def test_list_meals():
@@ -189,6 +197,10 @@ def test_list_meals_all():
     response = client.get("/meals?surplus_only=false")
     assert response.status_code in [200, 500]
 
+def test_list_meals_tag_filters():
+    response = client.get("/meals?include_tags=vegan&include_tags=gf&exclude_allergens=dairy")
+    assert response.status_code in [200, 500]
+
 # ============ Orders Router Tests ============
 
 def test_create_order():
@@ -1,5 +1,6 @@
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
+from fastapi import HTTPException
 import sys
 import pathlib
 import json
@@ -134,7 +135,7 @@ async def test_data_exposure_prevention():
 async def test_authentication_token_security():
     """Test security of authentication token handling"""
     
-    with patch('Mood2FoodRecSys.RecSysFunctions.database') as mock_db:
+    with patch('Mood2FoodRecSys.spotify_tokens.database') as mock_db:
         token_scenarios = [
             {
                 "access_token": "valid_token_123",
@@ -157,7 +158,7 @@ async def test_authentication_token_security():
             mock_db.fetch_one = AsyncMock(return_value=scenario)
             
             try:
-                with patch('Mood2FoodRecSys.RecSysFunctions.spotipy.Spotify') as mock_spotify:
+                with patch('Mood2FoodRecSys.RecSysFunctions.SpotifyClient') as mock_spotify:
                     mock_spotify.return_value = MagicMock()
                     result = await get_spotify_client("user123")
                     if scenario["access_token"]:
@@ -309,23 +310,20 @@ def test_input_length_limits():
 
 
 @pytest.mark.asyncio
-async def test_api_key_protection():
+async def test_api_key_protection(llm_stub):
     """Test that API keys are not exposed in logs or responses"""
     
-    with patch('Mood2FoodRecSys.RecSysFunctions.client') as mock_client:
-        mock_response = MagicMock()
-        mock_response.choices[0].message.content = json.dumps({
-            "mood_analysis": "happy",
-            "api_key": "should_not_be_exposed",
-            "internal_token": "secret_token_123"
-        })
-        
-        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
-        
-        from Mood2FoodRecSys.RecSysFunctions import analyze_mood_with_groq
-        
-        result = await analyze_mood_with_groq([{"track": "test"}])
-        
-        result_str = json.dumps(result)
-        
-        assert isinstance(result, (list, dict))
+    llm_stub.reply = json.dumps({
+        "mood_analysis": "happy",
+        "api_key": "should_not_be_exposed",
+        "internal_token": "secret_token_123"
+    })
+
+    from Mood2FoodRecSys.RecSysFunctions import analyze_mood_with_groq
+
+    # not a mood analysis (even after the repair retry), so it is rejected
+    with pytest.raises(HTTPException) as exc_info:
+        await analyze_mood_with_groq([{"track": "test"}])
+
+    assert "should_not_be_exposed" not in str(exc_info.value.detail)
+    assert "secret_token_123" not in str(exc_info.value.detail)
@@ -1,7 +1,8 @@
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import AsyncMock, patch
 from fastapi import HTTPException
 import time
+import httpx
 
 
 @pytest.fixture
@@ -39,19 +40,15 @@ async def test_spotify_callback_success():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_REDIRECT_URI', 'http://localhost/callback'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post, \
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token, \
          patch('Mood2FoodRecSys.Spotify_Auth.database') as mock_db:
         
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_token.return_value = {
             "access_token": "test_access",
             "refresh_token": "test_refresh",
             "expires_in": 3600
         }
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
         
-        mock_db.fetch_val = AsyncMock(return_value=None)
         mock_db.execute = AsyncMock()
         
         from Mood2FoodRecSys.Spotify_Auth import spotify_callback
@@ -85,15 +82,12 @@ async def test_spotify_callback_error_response():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_REDIRECT_URI', 'http://localhost/callback'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post:
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token:
         
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_token.return_value = {
             "error": "invalid_grant",
             "error_description": "Invalid authorization code"
         }
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
         
         from Mood2FoodRecSys.Spotify_Auth import spotify_callback
         
@@ -107,10 +101,9 @@ async def test_spotify_callback_network_error():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_REDIRECT_URI', 'http://localhost/callback'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post:
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token:
         
-        import requests
-        mock_post.side_effect = requests.RequestException("Network error")
+        mock_token.side_effect = httpx.ConnectError("Network error")
         
         from Mood2FoodRecSys.Spotify_Auth import spotify_callback
         
@@ -147,16 +140,13 @@ async def test_spotify_status_not_connected(mock_user):
 async def test_refresh_access_token_success():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post, \
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token, \
          patch('Mood2FoodRecSys.Spotify_Auth.time.time', return_value=1000):
         
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_token.return_value = {
             "access_token": "new_access_token",
             "expires_in": 3600
         }
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
         
         from Mood2FoodRecSys.Spotify_Auth import refresh_access_token
         
@@ -179,15 +169,12 @@ async def test_refresh_access_token_missing_token():
 async def test_refresh_access_token_error():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post:
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token:
         
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_token.return_value = {
             "error": "invalid_grant",
             "error_description": "Invalid refresh token"
         }
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
         
         from Mood2FoodRecSys.Spotify_Auth import refresh_access_token
         
@@ -197,23 +184,19 @@ async def test_refresh_access_token_error():
 
 
 @pytest.mark.asyncio
-async def test_spotify_callback_update_existing_tokens():
+async def test_spotify_callback_upserts_tokens():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_REDIRECT_URI', 'http://localhost/callback'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post, \
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token, \
          patch('Mood2FoodRecSys.Spotify_Auth.database') as mock_db:
         
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_token.return_value = {
             "access_token": "new_access",
             "refresh_token": "new_refresh",
             "expires_in": 3600
         }
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
         
-        mock_db.fetch_val = AsyncMock(return_value=1)
         mock_db.execute = AsyncMock()
         
         from Mood2FoodRecSys.Spotify_Auth import spotify_callback
@@ -223,7 +206,8 @@ async def test_spotify_callback_update_existing_tokens():
         assert result.status_code == 307
         mock_db.execute.assert_called_once()
         call_args = mock_db.execute.call_args
-        assert "UPDATE" in call_args[0][0]
+        assert "ON CONFLICT (user_id) DO UPDATE" in call_args[0][0]
+        mock_db.fetch_val.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -231,14 +215,11 @@ async def test_spotify_callback_invalid_token_response():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_REDIRECT_URI', 'http://localhost/callback'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post:
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token:
         
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_token.return_value = {
             "access_token": "test_access"
         }
-        mock_response.raise_for_status = MagicMock()
-        mock_post.return_value = mock_response
         
         from Mood2FoodRecSys.Spotify_Auth import spotify_callback
         
@@ -251,10 +232,9 @@ async def test_spotify_callback_invalid_token_response():
 async def test_refresh_access_token_network_error():
     with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
          patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
-         patch('Mood2FoodRecSys.Spotify_Auth.requests.post') as mock_post:
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token:
         
-        import requests
-        mock_post.side_effect = requests.RequestException("Network error")
+        mock_token.side_effect = httpx.ConnectError("Network error")
         
         from Mood2FoodRecSys.Spotify_Auth import refresh_access_token
         
@@ -273,3 +253,41 @@ async def test_spotify_status_database_error(mock_user):
         with pytest.raises(HTTPException) as exc:
             await spotify_status(user=mock_user)
         assert exc.value.status_code == 500
+
+
+def _rejected(body):
+    request = httpx.Request("POST", "https://accounts.spotify.com/api/token")
+    response = httpx.Response(400, json=body, request=request)
+    return httpx.HTTPStatusError("400 Bad Request", request=request, response=response)
+
+
+@pytest.mark.asyncio
+async def test_spotify_callback_rejected_code():
+    with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
+         patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
+         patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_REDIRECT_URI', 'http://localhost/callback'), \
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token:
+
+        mock_token.side_effect = _rejected({"error": "invalid_grant", "error_description": "Invalid authorization code"})
+
+        from Mood2FoodRecSys.Spotify_Auth import spotify_callback
+
+        with pytest.raises(HTTPException) as exc:
+            await spotify_callback(code="bad_code", state="user-123")
+        assert exc.value.status_code == 400
+        assert "Invalid authorization code" in exc.value.detail
+
+
+@pytest.mark.asyncio
+async def test_refresh_access_token_rejected():
+    with patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_ID', 'client_id'), \
+         patch('Mood2FoodRecSys.Spotify_Auth.SPOTIFY_CLIENT_SECRET', 'client_secret'), \
+         patch('Mood2FoodRecSys.Spotify_Auth.request_token', new_callable=AsyncMock) as mock_token:
+
+        mock_token.side_effect = _rejected({"error": "invalid_grant", "error_description": "Refresh token revoked"})
+
+        from Mood2FoodRecSys.Spotify_Auth import refresh_access_token
+
+        with pytest.raises(HTTPException) as exc:
+            await refresh_access_token(refresh_token="revoked")
+        assert exc.value.status_code == 401
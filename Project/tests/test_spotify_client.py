@@ -0,0 +1,100 @@
+import pytest
+import asyncio
+import httpx
+from unittest.mock import AsyncMock, patch
+
+from Mood2FoodRecSys import spotify_client
+from Mood2FoodRecSys.spotify_client import SpotifyClient, SpotifyError
+from Mood2FoodRecSys.RecSysFunctions import get_user_profile_and_recent_tracks
+
+RECENT = {
+    "items": [{
+        "track": {"name": "Slow Song", "artists": [{"name": "Stub"}]},
+        "played_at": "2026-01-01T12:00:00Z",
+    }]
+}
+
+
+@pytest.fixture
+def stub_spotify():
+    """Points the shared client at an in-process transport instead of Spotify."""
+    def install(handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return patch.object(spotify_client, "_http_client", client)
+    return install
+
+
+@pytest.mark.asyncio
+async def test_recently_played_request(stub_spotify):
+    seen = {}
+
+    def handler(request):
+        seen["url"] = str(request.url)
+        seen["auth"] = request.headers["Authorization"]
+        return httpx.Response(200, json=RECENT)
+
+    with stub_spotify(handler):
+        data = await SpotifyClient("tok").current_user_recently_played(limit=10, after=123)
+    assert data == RECENT
+    assert seen["url"] == "https://api.spotify.com/v1/me/player/recently-played?limit=10&after=123"
+    assert seen["auth"] == "Bearer tok"
+
+
+@pytest.mark.asyncio
+async def test_spotify_error_status(stub_spotify):
+    def handler(request):
+        return httpx.Response(401, json={"error": {"status": 401, "message": "The access token expired"}})
+
+    with stub_spotify(handler):
+        with pytest.raises(SpotifyError) as exc_info:
+            await SpotifyClient("tok").current_user_recently_played()
+    assert exc_info.value.status == 401
+    assert exc_info.value.message == "The access token expired"
+
+
+@pytest.mark.asyncio
+async def test_slow_spotify_does_not_block_other_requests(stub_spotify):
+    async def slow_handler(request):
+        await asyncio.sleep(0.5)
+        return httpx.Response(200, json=RECENT)
+
+    ticks = 0
+
+    async def other_request():
+        # stands in for unrelated requests served by the same worker
+        nonlocal ticks
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        return asyncio.get_event_loop().time()
+
+    with stub_spotify(slow_handler), \
+         patch("Mood2FoodRecSys.RecSysFunctions.get_spotify_client", AsyncMock(return_value=SpotifyClient("tok"))):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        spotify = asyncio.create_task(get_user_profile_and_recent_tracks("user123"))
+        other_done = await other_request()
+        tracks = await spotify
+
+    assert ticks == 20
+    # the other request finished long before Spotify answered
+    assert other_done - start < 0.4
+    assert tracks[0]["track_name"] == "Slow Song"
+
+
+@pytest.mark.asyncio
+async def test_request_token_uses_client_credentials(stub_spotify):
+    seen = {}
+
+    def handler(request):
+        seen["auth"] = request.headers["Authorization"]
+        seen["body"] = request.content.decode()
+        return httpx.Response(200, json={"access_token": "new", "expires_in": 3600})
+
+    with stub_spotify(handler), \
+         patch.object(spotify_client, "SPOTIFY_CLIENT_ID", "id"), \
+         patch.object(spotify_client, "SPOTIFY_CLIENT_SECRET", "secret"):
+        token = await spotify_client.request_token({"grant_type": "refresh_token", "refresh_token": "r"})
+    assert token["access_token"] == "new"
+    assert seen["auth"] == "Basic aWQ6c2VjcmV0"
+    assert seen["body"] == "grant_type=refresh_token&refresh_token=r"
@@ -0,0 +1,211 @@
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock, patch
+from fastapi import HTTPException
+
+from Mood2FoodRecSys import spotify_tokens
+
+
+def _row(access="old_token", refresh="refresh", expires_at=0):
+    return {"access_token": access, "refresh_token": refresh, "expires_at": expires_at}
+
+
+class _Tokens:
+    """In-memory users_spotify_auth_tokens answering the lease, read and compare-and-set queries."""
+
+    def __init__(self, **rows):
+        self.rows = rows
+        self.leased = set()
+        self.queries = []
+
+    async def fetch_one(self, query, values):
+        self.queries.append(query)
+        row = self.rows.get(values["user_id"])
+        if "SET refreshing_until = now()" in query:
+            if not row or row["expires_at"] > values["horizon"] or values["user_id"] in self.leased:
+                return None
+            self.leased.add(values["user_id"])
+            return dict(row)
+        if "RETURNING user_id" in query:
+            if not row or row["refresh_token"] != values["old_refresh_token"]:
+                return None
+            row.update({k: values[k] for k in ("access_token", "refresh_token", "expires_at")})
+            self.leased.discard(values["user_id"])
+            return {"user_id": values["user_id"]}
+        return dict(row) if row else None
+
+    async def execute(self, query, values):
+        self.queries.append(query)
+        row = self.rows.get(values["user_id"])
+        if row and row["refresh_token"] == values["refresh_token"]:
+            self.leased.discard(values["user_id"])
+
+    async def fetch_all(self, query, values):
+        self.queries.append(query)
+        self.fetch_all_values = values
+        return [{"user_id": user_id} for user_id in self.rows]
+
+
+def _new_token(**extra):
+    return AsyncMock(return_value={"access_token": "new_token", "expires_in": 3600, **extra})
+
+
+@pytest.mark.asyncio
+async def test_cached_token_skips_database():
+    with patch.object(spotify_tokens, "database") as mock_db, \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        mock_db.fetch_one = AsyncMock(return_value=_row(expires_at=99999))
+        assert await spotify_tokens.access_token("u1") == "old_token"
+        assert await spotify_tokens.access_token("u1") == "old_token"
+    mock_db.fetch_one.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_expired_requests_refresh_once():
+    async def slow_token(data):
+        await asyncio.sleep(0.01)
+        return {"access_token": "new_token", "expires_in": 3600}
+
+    table = _Tokens(u1=_row(expires_at=900))
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", AsyncMock(side_effect=slow_token)) as mock_token, \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        spotify_tokens.remember("u1", "old_token", "refresh", 900)
+        tokens = await asyncio.gather(*(spotify_tokens.access_token("u1") for _ in range(20)))
+        assert spotify_tokens.token_cache.get("u1")["expires_at"] == 4600
+
+    assert tokens == ["new_token"] * 20
+    mock_token.assert_awaited_once()
+    assert table.rows["u1"]["access_token"] == "new_token"
+    assert not table.leased
+
+
+@pytest.mark.asyncio
+async def test_token_near_expiry_is_refreshed_ahead():
+    expires_at = 1000 + spotify_tokens.SPOTIFY_REFRESH_AHEAD_SECONDS - 1
+    table = _Tokens(u1=_row(expires_at=expires_at))
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", _new_token(refresh_token="rotated")), \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        spotify_tokens.remember("u1", "old_token", "refresh", expires_at)
+
+        # still valid, so the caller isn't held up by the refresh
+        assert await spotify_tokens.access_token("u1") == "old_token"
+        await asyncio.sleep(0)
+        assert await spotify_tokens.access_token("u1") == "new_token"
+    assert table.rows["u1"]["refresh_token"] == "rotated"
+
+
+@pytest.mark.asyncio
+async def test_spotify_call_holds_lease_not_transaction():
+    table = _Tokens(u1=_row(expires_at=900))
+
+    async def token(data):
+        # the lease is already committed; no transaction is open around the HTTP call
+        assert "u1" in table.leased
+        return {"access_token": "new_token", "expires_in": 3600}
+
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", AsyncMock(side_effect=token)), \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        assert await spotify_tokens.access_token("u1") == "new_token"
+    assert not any("FOR UPDATE" in q for q in table.queries)
+
+
+@pytest.mark.asyncio
+async def test_refresh_uses_refresh_token_from_database():
+    # another worker rotated the refresh token; the cached one is revoked
+    table = _Tokens(u1=_row(refresh="rotated", expires_at=900))
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", _new_token()) as mock_token, \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        spotify_tokens.remember("u1", "old_token", "stale", 900)
+        assert await spotify_tokens.access_token("u1") == "new_token"
+        assert spotify_tokens.token_cache.get("u1")["refresh_token"] == "rotated"
+    assert mock_token.call_args[0][0]["refresh_token"] == "rotated"
+
+
+@pytest.mark.asyncio
+async def test_token_refreshed_elsewhere_is_adopted():
+    table = _Tokens(u1=_row(access="fresh_token", expires_at=4600))
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", AsyncMock()) as mock_token, \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        spotify_tokens.remember("u1", "old_token", "refresh", 900)
+        assert await spotify_tokens.access_token("u1") == "fresh_token"
+    mock_token.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_waits_for_another_workers_lease():
+    table = _Tokens(u1=_row(expires_at=900))
+    table.leased.add("u1")
+
+    async def other_worker():
+        await asyncio.sleep(0.01)
+        table.rows["u1"] = _row(access="their_token", refresh="theirs", expires_at=4600)
+        table.leased.discard("u1")
+
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "_LEASE_POLL_SECONDS", 0.005), \
+         patch.object(spotify_tokens, "request_token", AsyncMock()) as mock_token, \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        spotify_tokens.remember("u1", "old_token", "refresh", 900)
+        token, _ = await asyncio.gather(spotify_tokens.access_token("u1"), other_worker())
+    assert token == "their_token"
+    mock_token.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_lost_compare_and_set_keeps_stored_token():
+    table = _Tokens(u1=_row(expires_at=900))
+
+    async def token(data):
+        # our lease ran out and another worker rotated the row meanwhile
+        table.rows["u1"] = _row(access="their_token", refresh="theirs", expires_at=4600)
+        return {"access_token": "new_token", "expires_in": 3600}
+
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", AsyncMock(side_effect=token)), \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        assert await spotify_tokens.access_token("u1") == "their_token"
+    assert table.rows["u1"]["refresh_token"] == "theirs"
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_drops_cached_token():
+    table = _Tokens(u1=_row(expires_at=900))
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", AsyncMock(side_effect=httpx.ConnectError("down"))), \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        spotify_tokens.remember("u1", "old_token", "refresh", 900)
+        with pytest.raises(HTTPException) as exc:
+            await spotify_tokens.access_token("u1")
+    assert exc.value.status_code == 401
+    assert spotify_tokens.token_cache.get("u1") is None
+    assert not table.leased
+
+
+@pytest.mark.asyncio
+async def test_refresh_expiring_counts_successes():
+    table = _Tokens(**{f"u{i}": _row(expires_at=1100) for i in range(4)})
+    table.rows["u1"]["refresh_token"] = "revoked"
+    table.leased.add("u3")  # being refreshed by another worker
+
+    async def token(data):
+        if data["refresh_token"] == "revoked":
+            raise httpx.ConnectError("revoked")
+        return {"access_token": "new_token", "expires_in": 3600}
+
+    with patch.object(spotify_tokens, "database", table), \
+         patch.object(spotify_tokens, "request_token", AsyncMock(side_effect=token)) as mock_token, \
+         patch.object(spotify_tokens.time, "time", return_value=1000):
+        assert await spotify_tokens.refresh_expiring(batch_size=4) == 2
+        assert spotify_tokens.token_cache.get("u0")["access_token"] == "new_token"
+
+    assert mock_token.await_count == 3
+    assert table.fetch_all_values == {
+        "now": 1000, "horizon": 1000 + spotify_tokens.SPOTIFY_REFRESH_AHEAD_SECONDS, "batch": 4
+    }
+    assert "refreshing_until IS NULL OR refreshing_until < now()" in table.queries[0]